@@ -1,11 +1,15 @@
 import json
+import logging
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from pathlib import Path
 
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+import detection_cache
+import telemetry
+import yolo_rules
 
 try:
     from dotenv import load_dotenv
@@ -15,13 +19,16 @@ except ImportError:
 if load_dotenv is not None:
     load_dotenv()
 
+# Imported after load_dotenv so its GEMINI_* settings see .env
+import gemini_client
+
+log = logging.getLogger(__name__)
+
 # ── Gemini Vision API Configuration ──
 # Set your API key as an environment variable: GEMINI_API_KEY
 # Get a free key at: https://aistudio.google.com/apikey
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
-_gemini_model = None
-
 CIVIC_ISSUE_PROMPT = """You are a highly advanced Senior Urban Planner and AI Infrastructure Specialist.
 Your task is to analyze civic monitoring imagery with extreme precision.
 
@@ -57,37 +64,11 @@ You MUST respond with ONLY a valid JSON object:
 """
 
 
-def _get_gemini_model():
-    """Lazy-load and cache the Gemini model."""
-    global _gemini_model
-    if genai is None:
-        raise RuntimeError("google-generativeai is not installed")
-    if not GEMINI_API_KEY:
-        raise RuntimeError("GEMINI_API_KEY is not configured")
-    if _gemini_model is None:
-        genai.configure(api_key=GEMINI_API_KEY)
-        _gemini_model = genai.GenerativeModel("gemini-2.0-flash")
-    return _gemini_model
-
-
-def _detect_with_gemini(image_path: str):
+def _detect_with_gemini(image_bytes: bytes):
     """Use Gemini Vision API for high-accuracy civic issue detection."""
-    model = _get_gemini_model()
-
-    # Upload image to Gemini
-    img_file = genai.upload_file(image_path)
-
-    # Generate classification
-    response = model.generate_content(
-        [CIVIC_ISSUE_PROMPT, img_file],
-        generation_config=genai.types.GenerationConfig(
-            temperature=0.1,
-            max_output_tokens=500,
-        ),
-    )
+    text = gemini_client.get_client().generate(CIVIC_ISSUE_PROMPT, image_bytes).strip()
 
     # Parse JSON response
-    text = response.text.strip()
     if text.startswith("```"):
         text = text.split("\n", 1)[1]
         text = text.rsplit("```", 1)[0]
@@ -100,13 +81,27 @@ def _detect_with_gemini(image_path: str):
     confidence = result.get("confidence", 0)
     reasoning = result.get("reasoning", "Standard visual analysis applied.")
 
-    print(f"[Best AI - Gemini] {issue_type} ({confidence}% confidence)")
-    print(f"[Reasoning] {reasoning}")
+    log.info("Gemini classification", extra={
+        "issue_type": issue_type, "confidence": confidence, "reasoning": reasoning,
+    })
 
     return issue_type, priority, confidence, reasoning
 
 
 # ── YOLO Fallback ──
+# DETECTOR_BACKEND picks how the local model runs:
+#   torch      yolov8s.pt through ultralytics/PyTorch (default)
+#   onnx       the ONNX export through ONNX Runtime on CPU, no torch import
+#   onnx-int8  the INT8-quantized ONNX export, smallest and usually fastest on CPU
+#   stub       no model: every image yields DETECTOR_STUB_LABELS after
+#              DETECTOR_STUB_MS, for load tests (benchmarks/load_test.py)
+# Create the ONNX models with `python manage.py export-onnx --int8`.
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "torch").lower()
+DETECTOR_STUB_LABELS = [l for l in os.getenv("DETECTOR_STUB_LABELS", "person,car").split(",") if l]
+DETECTOR_STUB_MS = float(os.getenv("DETECTOR_STUB_MS", "0"))
+# Using a slightly larger model for the "best" local detection
+YOLO_MODEL_PATH = Path(__file__).resolve().parent / "yolov8s.pt"
+
 _yolo_model = None
 
 def _load_yolo():
@@ -114,82 +109,258 @@ def _load_yolo():
     global _yolo_model
     if _yolo_model is None:
         from ultralytics import YOLO
-        # Using a slightly larger model for the "best" local detection
-        model_path = Path(__file__).resolve().parent / "yolov8s.pt"
-        _yolo_model = YOLO(str(model_path))
+        _yolo_model = YOLO(str(YOLO_MODEL_PATH))
     return _yolo_model
 
 
-def _detect_with_yolo(image_path: str):
-    """
-    Advanced Fallback: Uses object density and common COCO classes to infer civic issues.
-    """
-    try:
-        import cv2
-        model = _load_yolo()
-    except Exception as e:
-        return "General Civic Issue", "Low", 20, f"AI fallback unavailable: {e}"
-    img = cv2.imread(image_path)
+# ── YOLO Micro-Batching ──
+# Concurrent requests are collected for up to YOLO_BATCH_WINDOW_MS (or until
+# YOLO_MAX_BATCH images are waiting) and run through the model in one call.
+YOLO_BATCH_WINDOW_MS = float(os.getenv("YOLO_BATCH_WINDOW_MS", "10"))
+YOLO_MAX_BATCH = int(os.getenv("YOLO_MAX_BATCH", "16"))
+# A caller gives up on its batch result after this long (batch thread hung or dead)
+YOLO_RESULT_TIMEOUT = float(os.getenv("YOLO_RESULT_TIMEOUT", "60"))
+YOLO_CONFIDENCE = 0.25  # More sensitive for fallback
 
-    if img is None:
-        return "Unknown Issue", "Normal", 0, "Image reading failed."
-
-    results = model(img, conf=0.25, verbose=False) # More sensitive for fallback
-    
-    counts = {}
-    detected_labels = []
-    for r in results:
-        for box in r.boxes:
-            label = model.names[int(box.cls[0])].lower()
-            counts[label] = counts.get(label, 0) + 1
-            detected_labels.append(label)
 
-    # 1. High Priority Safety Hazards
-    if any(k in counts for k in ['cow', 'horse', 'sheep', 'elephant', 'bear']):
-        return "Stray Animal/Cattle", "Critical", 85, f"Detected large animal ({', '.join(detected_labels)}) in transit zone."
-    
-    if counts.get('fire hydrant', 0) > 0:
-        return "Infrastructure Leak/Obstruction", "High", 80, "Fire hydrant detected; possible water leakage or illegal parking."
+def _labels_from_result(model, result):
+    return [model.names[int(box.cls[0])].lower() for box in result.boxes]
 
-    # 2. Traffic & Road Issues
-    if counts.get('truck', 0) > 1 or counts.get('bus', 0) > 1:
-        return "Heavy Vehicle Obstruction", "High", 75, f"Multiple heavy vehicles detected creating congestion."
 
-    if counts.get('car', 0) > 4:
-        return "Unauthorized Parking/Congestion", "Medium", 70, f"Detected clustered vehicles ({counts['car']}) in dense sector."
+def _run_yolo_batch(model, images):
+    """Run one batched forward pass. Returns a list of label lists, one per image."""
+    results = model(images, conf=YOLO_CONFIDENCE, verbose=False)
+    return [_labels_from_result(model, r) for r in results]
 
-    if counts.get('traffic light', 0) > 0 or counts.get('stop sign', 0) > 0:
-        return "Traffic Infrastructure Issue", "Medium", 65, "Detected traffic control elements; signaling check required."
 
-    # 3. Public Space & Sanitation
-    if counts.get('person', 0) > 10:
-        return "Public Gathering/Crowd", "High", 60, f"Unusual density of {counts['person']} persons detected."
+def _load_detector():
+    """A run_batch(images) -> [labels, ...] callable for DETECTOR_BACKEND."""
+    if DETECTOR_BACKEND == "torch":
+        model = _load_yolo()
+        return lambda images: _run_yolo_batch(model, images)
+    if DETECTOR_BACKEND in ("onnx", "onnx-int8"):
+        import onnx_detector
+        path = onnx_detector.ONNX_INT8_MODEL_PATH if DETECTOR_BACKEND == "onnx-int8" else onnx_detector.ONNX_MODEL_PATH
+        return onnx_detector.OnnxYolo(path, confidence=YOLO_CONFIDENCE).labels_batch
+    if DETECTOR_BACKEND == "stub":
+        return _run_stub_batch
+    raise ValueError(f"Unknown DETECTOR_BACKEND {DETECTOR_BACKEND!r} (expected torch, onnx, onnx-int8 or stub)")
+
+
+def _run_stub_batch(images):
+    if DETECTOR_STUB_MS:
+        time.sleep(DETECTOR_STUB_MS / 1000.0)
+    return [list(DETECTOR_STUB_LABELS) for _ in images]
+
+
+class YoloBatcher:
+    """Collects concurrent inference requests and runs them as a single batch."""
+
+    def __init__(self, run_batch, window_ms: float = YOLO_BATCH_WINDOW_MS, max_batch: int = YOLO_MAX_BATCH):
+        self.run_batch = run_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="yolo-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, img) -> Future:
+        future = Future()
+        self._queue.put((img, future))
+        return future
+
+    def labels(self, img, timeout: float = None):
+        """
+        Labels for one image, waiting at most timeout seconds (YOLO_RESULT_TIMEOUT).
+        Raises DetectorUnavailable when the batch does not finish in time.
+        """
+        timeout = YOLO_RESULT_TIMEOUT if timeout is None else timeout
+        future = self.submit(img)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # Still queued: the batch thread skips cancelled futures
+            future.cancel()
+            raise DetectorUnavailable(f"No detector result within {timeout:.0f}s")
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = [(img, f) for img, f in self._collect() if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            images = [img for img, _ in batch]
+            futures = [f for _, f in batch]
+            try:
+                labels = self.run_batch(images)
+            except Exception as e:
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            for f, result in zip(futures, labels):
+                f.set_result(result)
+
+
+_yolo_batcher = None
+_yolo_batcher_lock = threading.Lock()
+
+def _get_yolo_batcher():
+    global _yolo_batcher
+    if _yolo_batcher is None:
+        with _yolo_batcher_lock:
+            if _yolo_batcher is None:
+                _yolo_batcher = YoloBatcher(_load_detector())
+    return _yolo_batcher
+
+
+def _classify_detections(detected_labels):
+    """Map COCO labels detected in one image to a civic issue category (see yolo_rules.json)."""
+    return yolo_rules.get_rules().classify(detected_labels)
+
+
+class DetectorUnavailable(RuntimeError):
+    """The local detector could not be loaded or did not answer in time."""
+
+
+class ImageReadError(ValueError):
+    """The image could not be decoded."""
+
+
+# ── Shared Inference Process ──
+# With INFERENCE_SOCKET set, the model is not loaded in this process. Images are
+# sent to the one inference process listening on that Unix socket (started by
+# gunicorn.conf.py, or by hand with `python inference_server.py`), which batches
+# requests from every web worker together.
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "60"))
+
+_inference_local = threading.local()
+
+
+def _close_inference_connection():
+    conn = getattr(_inference_local, "conn", None)
+    _inference_local.conn = None
+    if conn is not None:
+        conn.close()
+
+
+def _remote_labels(image_bytes: bytes):
+    """yolo_labels() answered by the inference process. One connection per thread."""
+    from multiprocessing.connection import Client
+
+    for attempt in (1, 2):
+        try:
+            if getattr(_inference_local, "conn", None) is None:
+                _inference_local.conn = Client(INFERENCE_SOCKET, family="AF_UNIX")
+            conn = _inference_local.conn
+            conn.send_bytes(image_bytes)
+            if not conn.poll(INFERENCE_TIMEOUT):
+                _close_inference_connection()
+                raise DetectorUnavailable(f"No reply from the inference process within {INFERENCE_TIMEOUT:.0f}s")
+            reply = json.loads(conn.recv_bytes())
+            break
+        except (OSError, EOFError) as e:
+            # The process may have restarted since this thread last connected; retry once
+            _close_inference_connection()
+            if attempt == 2:
+                raise DetectorUnavailable(f"Inference process at {INFERENCE_SOCKET}: {e}") from e
+
+    if "labels" in reply:
+        return reply["labels"]
+    if reply.get("error") == "unreadable":
+        raise ImageReadError("Image could not be decoded")
+    if reply.get("error") == "unavailable":
+        raise DetectorUnavailable(reply.get("detail") or "Inference process busy")
+    raise RuntimeError(reply.get("detail") or "Inference failed")
+
+
+def yolo_labels(image_bytes: bytes):
+    """COCO labels YOLO detects in an encoded image (batched with concurrent callers)."""
+    if INFERENCE_SOCKET:
+        return _remote_labels(image_bytes)
+    if DETECTOR_BACKEND == "stub":
+        # The stub never looks at pixels, so skip decoding (and the OpenCV dependency)
+        return _get_yolo_batcher().labels(image_bytes)
+    try:
+        import cv2
+        import numpy as np
+        batcher = _get_yolo_batcher()
+    except Exception as e:
+        raise DetectorUnavailable(str(e)) from e
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
 
-    if any(k in counts for k in ['bench', 'potted plant', 'bicycle', 'motorcycle']):
-        return "Sidewalk Obstruction", "Low", 55, "Detected objects potentially blocking pedestrian pathways."
+    if img is None:
+        raise ImageReadError("Image could not be decoded")
 
-    if any(k in counts for k in ['bottle', 'cup', 'handbag', 'backpack']):
-        return "Littering/Sanitation Issue", "Medium", 50, "Detected discarded items indicating potential sanitation cleanup."
+    return batcher.labels(img)
 
-    # 4. Final Fallback (If anything at all was found)
-    if counts:
-        main_obj = max(counts, key=counts.get)
-        return "Infrastructure Monitoring", "Low", 45, f"Detected {main_obj} activity requiring standard review."
 
-    return "General Civic Issue", "Low", 30, "No significant urban anomalies detected. Manual review recommended."
+def _detect_with_yolo(image_bytes: bytes):
+    """
+    Advanced Fallback: Uses object density and common COCO classes to infer civic issues.
+    """
+    return _classify_detections(yolo_labels(image_bytes))
 
 
 # ── Main Entry Point ──
-def detect_issue(image_path: str):
+def detect_issue(image, cache_key=None):
     """
     Detect civic issue from image using the 'Best AI' strategy.
+    `image` is either encoded image bytes (preferred, e.g. the ingest inference
+    derivative) or a path to an image file.
+    Results are cached by image content (see detection_cache), except YOLO
+    fallbacks taken because Gemini failed. Pass cache_key when the image was
+    re-derived and its bytes may differ from the ones the key was made from.
     Returns: (type, priority, confidence, reasoning)
+    Raises DetectorUnavailable when neither Gemini nor the local detector answered,
+    so the caller can retry later instead of storing a guess.
     """
+    if isinstance(image, (bytes, bytearray)):
+        image_bytes = bytes(image)
+    else:
+        try:
+            image_bytes = Path(image).read_bytes()
+        except OSError:
+            return "Unknown Issue", "Normal", 0, "Image reading failed."
+
+    cache_key = cache_key or detection_cache.key_for_bytes(image_bytes)
+    cached = detection_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    result = None
     if GEMINI_API_KEY:
         try:
-            return _detect_with_gemini(image_path)
+            with telemetry.span("detect", backend="gemini"):
+                result = _detect_with_gemini(image_bytes)
+        except gemini_client.CircuitOpen:
+            pass
         except Exception as e:
-            print(f"[Gemini AI] Error: {e}. Falling back to Expert YOLO...")
+            log.warning("Gemini failed; falling back to YOLO", extra={"error": str(e)})
+    # Only the primary backend's answer is cached: a YOLO fallback during a Gemini
+    # outage would otherwise stay the answer for this image for good.
+    cacheable = result is not None or not GEMINI_API_KEY
 
-    # Fallback to Advanced YOLO
-    return _detect_with_yolo(image_path)
+    if result is None:
+        # Fallback to Advanced YOLO
+        try:
+            with telemetry.span("detect", backend="yolo"):
+                result = _detect_with_yolo(image_bytes)
+        except ImageReadError:
+            return "Unknown Issue", "Normal", 0, "Image reading failed."
+
+    if cacheable:
+        detection_cache.put(cache_key, result)
+    return result
@@ -0,0 +1,239 @@
+import hashlib
+import json
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.orm import Session
+
+from database import get_db
+import models, crud, blobstore, schemas
+import pages, principals
+
+# ── JSON API v1 ──
+# Read-only endpoints for mobile clients and integrations, authenticated by the
+# same session cookie as the web pages. Like /engineer and /admin they are for
+# engineers and admins; other roles get 403. Every response carries an ETag over its
+# body; clients that send it back in If-None-Match get an empty 304 while nothing
+# has changed. Issue endpoints accept ?fields=a,b,c to return only those fields.
+
+router = APIRouter(prefix="/api/v1")
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+MAP_MAX_RESULTS = 500
+MAP_MAX_RADIUS_M = 100_000
+API_ROLES = ("engineer", "admin")
+
+# Coordinates out of range (or inf/nan) are rejected with 422 before reaching geo.
+# Each parameter needs its own Query(): FastAPI binds a shared one to the first name.
+def _latitude():
+    return Query(ge=-90, le=90)
+
+
+def _longitude():
+    return Query(ge=-180, le=180)
+
+
+def _field_names(model):
+    # pydantic 2 renamed __fields__ to model_fields
+    return tuple(getattr(model, "model_fields", None) or model.__fields__)
+
+
+ISSUE_FIELDS = _field_names(schemas.Issue)
+MAP_FIELDS = _field_names(schemas.MapIssue)
+
+
+def _error(status_code: int, message: str):
+    return JSONResponse(status_code=status_code, content={"error": message})
+
+
+def _unauthorized(user):
+    """Error response unless user is a logged-in principal with an API role."""
+    if user is None:
+        return _error(401, "Not logged in")
+    if user.role not in API_ROLES:
+        return _error(403, "Not allowed for this role")
+    return None
+
+
+def parse_statuses(status: str):
+    """"open" (default) = OPEN + IN_PROGRESS, "all", or a comma-separated list."""
+    if status == "all":
+        return None
+    if status in (None, "", "open"):
+        return crud.OPEN_STATUSES
+    return [s.strip().upper() for s in status.split(",") if s.strip()]
+
+
+def parse_fields(fields: str, allowed):
+    """Set of requested field names, None for all of them. Raises ValueError on unknown names."""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def issue_out(issue) -> schemas.Issue:
+    return schemas.Issue(
+        id=issue.id,
+        issue_type=issue.issue_type,
+        priority=issue.priority,
+        status=issue.status,
+        ward=issue.ward,
+        latitude=issue.latitude,
+        longitude=issue.longitude,
+        ai_confidence=issue.ai_confidence,
+        ai_reasoning=issue.ai_reasoning,
+        classification_status=issue.classification_status,
+        report_count=issue.report_count,
+        before_image_url=blobstore.url_for(issue.before_image) if issue.before_image else None,
+        after_image_url=blobstore.url_for(issue.after_image) if issue.after_image else None,
+        created_at=issue.created_at,
+    )
+
+
+def conditional_json(request: Request, content):
+    """JSON response with a strong ETag over the body; 304 when the client already has it."""
+    body = json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if pages.etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# ── Issues ──
+
+@router.get("/issues", response_model=schemas.IssuePage)
+def api_list_issues(
+    request: Request,
+    status: str = "all",
+    ward: int = None,
+    priority: str = None,
+    cursor: str = None,
+    limit: int = API_PAGE_SIZE,
+    fields: str = None,
+    db: Session = Depends(get_db),
+    user=Depends(principals.current_user),
+):
+    """Issues newest first. Pass next_cursor back as ?cursor= for the following page."""
+    error = _unauthorized(user)
+    if error:
+        return error
+    try:
+        include = parse_fields(fields, ISSUE_FIELDS)
+    except ValueError as e:
+        return _error(400, str(e))
+    if cursor and crud.decode_cursor(cursor) is None:
+        return _error(400, "Malformed cursor")
+
+    limit = max(1, min(limit, API_MAX_PAGE_SIZE))
+    issues, next_cursor = crud.list_issues(
+        db, statuses=parse_statuses(status), ward=ward, priority=priority, cursor=cursor, limit=limit,
+    )
+    return conditional_json(request, {
+        "items": [jsonable_encoder(issue_out(i), include=include) for i in issues],
+        "next_cursor": next_cursor,
+    })
+
+
+@router.get("/issues/bbox", response_model=schemas.MapIssueList)
+def api_issues_in_bbox(
+    request: Request,
+    min_lat: float = _latitude(),
+    min_lon: float = _longitude(),
+    max_lat: float = _latitude(),
+    max_lon: float = _longitude(),
+    status: str = "open",
+    limit: int = MAP_MAX_RESULTS,
+    fields: str = None,
+    db: Session = Depends(get_db),
+    user=Depends(principals.current_user),
+):
+    error = _unauthorized(user)
+    if error:
+        return error
+    if min_lat > max_lat or min_lon > max_lon:
+        return _error(400, "min_lat/min_lon must not exceed max_lat/max_lon")
+    try:
+        include = parse_fields(fields, MAP_FIELDS)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    limit = max(1, min(limit, MAP_MAX_RESULTS))
+    items = crud.issues_in_bbox(db, min_lat, min_lon, max_lat, max_lon, parse_statuses(status), limit)
+    return conditional_json(request, {
+        "items": [jsonable_encoder(schemas.MapIssue(**item), include=include) for item in items],
+        "truncated": len(items) == limit,
+    })
+
+
+@router.get("/issues/nearest", response_model=schemas.MapIssueList)
+def api_nearest_issues(
+    request: Request,
+    lat: float = _latitude(),
+    lon: float = _longitude(),
+    k: int = 10,
+    max_radius_m: float = Query(20000, gt=0, le=MAP_MAX_RADIUS_M),
+    status: str = "open",
+    fields: str = None,
+    db: Session = Depends(get_db),
+    user=Depends(principals.current_user),
+):
+    error = _unauthorized(user)
+    if error:
+        return error
+    try:
+        include = parse_fields(fields, MAP_FIELDS)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    k = max(1, min(k, 100))
+    items = crud.nearest_issues(db, lat, lon, k, parse_statuses(status), max_radius_m)
+    return conditional_json(request, {
+        "items": [jsonable_encoder(schemas.MapIssue(**item), include=include) for item in items],
+    })
+
+
+@router.get("/issues/{issue_id}", response_model=schemas.Issue)
+def api_get_issue(request: Request, issue_id: int, fields: str = None, db: Session = Depends(get_db),
+                  user=Depends(principals.current_user)):
+    error = _unauthorized(user)
+    if error:
+        return error
+    try:
+        include = parse_fields(fields, ISSUE_FIELDS)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    issue = db.get(models.Issue, issue_id)
+    if issue is None:
+        return _error(404, f"Issue #{issue_id} not found")
+    return conditional_json(request, jsonable_encoder(issue_out(issue), include=include))
+
+
+# ── Wards & Stats ──
+# Both are read from the issue_stats rollup, so polling them is cheap.
+
+@router.get("/wards", response_model=schemas.WardList)
+def api_wards(request: Request, db: Session = Depends(get_db), user=Depends(principals.current_user)):
+    error = _unauthorized(user)
+    if error:
+        return error
+    stats = crud.summarize_counts(crud.rollup_counts(db))
+    return conditional_json(request, {"items": stats["ward_stats"]})
+
+
+@router.get("/stats", response_model=schemas.Stats)
+def api_stats(request: Request, db: Session = Depends(get_db), user=Depends(principals.current_user)):
+    error = _unauthorized(user)
+    if error:
+        return error
+    stats = crud.summarize_counts(crud.rollup_counts(db))
+    stats.pop("ward_stats")
+    return conditional_json(request, stats)
@@ -1,19 +1,96 @@
+import asyncio
+import logging
+import os
 import random
 import string
-import smtplib
-import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 import bcrypt
 
+import mailer
+
+log = logging.getLogger(__name__)
+
 # Password hashing (direct bcrypt — avoids passlib + bcrypt 5.x incompatibility)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(plain: str, hashed: str) -> bool:
     return bcrypt.checkpw(plain.encode('utf-8'), hashed.encode('utf-8'))
 
+def needs_rehash(hashed: str) -> bool:
+    """True when a stored hash was made with a different cost than BCRYPT_ROUNDS ($2b$<cost>$...)."""
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+# ── Hashing Pool ──
+# bcrypt runs on a dedicated, size-limited executor so login storms cannot occupy
+# every request thread. bcrypt releases the GIL, so BCRYPT_WORKERS hashes run in
+# parallel; at most BCRYPT_MAX_QUEUE more may wait before callers get HashingBusy.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+
+_hash_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_MAX_QUEUE)
+_hash_stats_lock = threading.Lock()
+_hash_stats = {"queued": 0, "running": 0, "completed": 0, "rejected": 0, "cancelled": 0}
+
+
+class HashingBusy(RuntimeError):
+    """The hashing queue is full; the caller should ask the client to retry."""
+
+
+def _bump(**deltas):
+    with _hash_stats_lock:
+        for name, delta in deltas.items():
+            _hash_stats[name] += delta
+
+
+def _run_counted(fn, *args):
+    _bump(queued=-1, running=1)
+    try:
+        return fn(*args)
+    finally:
+        _bump(running=-1, completed=1)
+        _hash_slots.release()
+
+
+async def _submit(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        _bump(rejected=1)
+        raise HashingBusy("Too many password operations in progress")
+    _bump(queued=1)
+    future = _hash_executor.submit(_run_counted, fn, *args)
+    future.add_done_callback(_release_if_cancelled)
+    return await asyncio.wrap_future(future)
+
+
+def _release_if_cancelled(future):
+    # A caller that goes away (client disconnect, timeout) cancels a job still in
+    # the queue; _run_counted then never runs, so give its slot back here.
+    if future.cancelled():
+        _bump(queued=-1, cancelled=1)
+        _hash_slots.release()
+
+
+async def hash_password_async(password: str) -> str:
+    return await _submit(hash_password, password)
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _submit(verify_password, plain, hashed)
+
+def hashing_stats() -> dict:
+    with _hash_stats_lock:
+        return {**_hash_stats, "workers": BCRYPT_WORKERS, "max_queue": BCRYPT_MAX_QUEUE, "rounds": BCRYPT_ROUNDS}
+
 # OTP
 def generate_otp() -> str:
     return ''.join(random.choices(string.digits, k=6))
@@ -26,45 +103,38 @@ def is_otp_valid(expiry: datetime) -> bool:
         return False
     return datetime.utcnow() <= expiry
 
-# Email sending
-SMTP_EMAIL = os.getenv("SMTP_EMAIL", "")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+# Email sending (delivered asynchronously by mailer)
+def send_otp_email(to_email: str, otp: str):
+    """
+    Queue the OTP email. Returns the mailer message id, or None when email is not
+    configured (the OTP is then only logged, and shown on the verify page).
+    """
+    if not mailer.is_configured():
+        log.warning("Email not configured; OTP shown on the verify page", extra={"email": to_email, "otp": otp})
+        return None
 
-def send_otp_email(to_email: str, otp: str) -> bool:
-    """Send OTP via Gmail SMTP. Returns True if sent, False otherwise."""
-    if not SMTP_EMAIL or not SMTP_PASSWORD:
-        print(f"[OTP] Email not configured. OTP for {to_email}: {otp}")
-        return False
+    msg = MIMEMultipart()
+    msg["From"] = mailer.SMTP_EMAIL
+    msg["To"] = to_email
+    msg["Subject"] = "Civic Monitor — Your Verification Code"
 
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = SMTP_EMAIL
-        msg["To"] = to_email
-        msg["Subject"] = "Civic Monitor — Your Verification Code"
-
-        body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; background: #0d1117; color: #f1f5f9; padding: 40px;">
-            <div style="max-width: 400px; margin: 0 auto; background: rgba(255,255,255,0.05); border-radius: 16px; padding: 40px; border: 1px solid rgba(255,255,255,0.1);">
-                <h2 style="text-align: center; color: #818cf8;">🏛️ Civic Monitor</h2>
-                <p style="text-align: center; color: #94a3b8;">Your verification code is:</p>
-                <div style="text-align: center; font-size: 36px; font-weight: 900; letter-spacing: 12px; color: #6366f1; padding: 20px; background: rgba(99,102,241,0.1); border-radius: 12px; margin: 20px 0;">
-                    {otp}
-                </div>
-                <p style="text-align: center; font-size: 13px; color: #64748b;">This code expires in 5 minutes.</p>
+    body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; background: #0d1117; color: #f1f5f9; padding: 40px;">
+        <div style="max-width: 400px; margin: 0 auto; background: rgba(255,255,255,0.05); border-radius: 16px; padding: 40px; border: 1px solid rgba(255,255,255,0.1);">
+            <h2 style="text-align: center; color: #818cf8;">🏛️ Civic Monitor</h2>
+            <p style="text-align: center; color: #94a3b8;">Your verification code is:</p>
+            <div style="text-align: center; font-size: 36px; font-weight: 900; letter-spacing: 12px; color: #6366f1; padding: 20px; background: rgba(99,102,241,0.1); border-radius: 12px; margin: 20px 0;">
+                {otp}
             </div>
-        </body>
-        </html>
-        """
-        msg.attach(MIMEText(body, "html"))
-
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(SMTP_EMAIL, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        print(f"[OTP] Email sent to {to_email}")
-        return True
-    except Exception as e:
-        print(f"[OTP] Email failed: {e}. OTP for {to_email}: {otp}")
-        return False
+            <p style="text-align: center; font-size: 13px; color: #64748b;">This code expires in 5 minutes.</p>
+        </div>
+    </body>
+    </html>
+    """
+    msg.attach(MIMEText(body, "html"))
+
+    def on_failure(error):
+        log.warning("OTP email failed", extra={"email": to_email, "otp": otp, "error": str(error)})
+
+    return mailer.send(msg, on_failure=on_failure)
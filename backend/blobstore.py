@@ -0,0 +1,166 @@
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import models, crud
+
+# ── Content-Addressed Blob Store ──
+# Images are stored once per distinct content under
+#   BLOB_DIR/<sha[0:2]>/<sha[2:4]>/<sha><ext>
+# and referenced from issues by their key "<sha><ext>". The blobs table keeps a
+# reference count; blobs whose count drops to zero are removed by collect().
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STORAGE_DIR = Path(os.getenv("STORAGE_DIR", str(BASE_DIR / "storage")))
+BLOB_DIR = STORAGE_DIR / "blobs"
+DERIVATIVE_DIR = STORAGE_DIR / "derivatives"
+
+ALLOWED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+_KEY_RE = re.compile(r"^([0-9a-f]{64})(\.(?:jpg|jpeg|png|webp))$")
+
+BLOB_DIR.mkdir(parents=True, exist_ok=True)
+DERIVATIVE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def is_blob_key(name) -> bool:
+    return bool(name) and _KEY_RE.match(name) is not None
+
+
+def digest_of(key: str) -> str:
+    return _KEY_RE.match(key).group(1)
+
+
+def url_for(name):
+    """URL for a stored image: content-addressed blobs, or legacy files under /static/uploads."""
+    if is_blob_key(name):
+        return f"/blobs/{name}"
+    return f"/static/uploads/{name}"
+
+
+def blob_path(key: str) -> Path:
+    digest = digest_of(key)
+    return BLOB_DIR / digest[:2] / digest[2:4] / key
+
+
+def derivative_path(key: str, width: int, fmt: str = "jpg") -> Path:
+    digest = digest_of(key)
+    # "w" marks exact-width derivatives (older "<digest>_<n>" files were max-side
+    # resizes and are no longer served; collect() still removes them)
+    return DERIVATIVE_DIR / digest[:2] / digest[2:4] / f"{digest}_w{width}.{fmt}"
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A unique temp file per call: concurrent writes of the same key (threads of one
+    # process included) each rename a complete file into place.
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def key_for(data: bytes, extension: str) -> str:
+    extension = extension.lower() if extension.lower() in ALLOWED_EXTENSIONS else ".jpg"
+    return hashlib.sha256(data).hexdigest() + extension
+
+
+def write(key: str, data: bytes):
+    """Write the blob file if it is missing (file I/O only; no reference is taken)."""
+    path = blob_path(key)
+    if not path.exists():
+        _write_atomic(path, data)
+
+
+def add_reference(db, key: str, size: int):
+    """Take a reference on a blob (part of the caller's transaction; database only)."""
+    crud.increment(db, models.Blob, {"key": key}, "refcount", 1)
+    db.query(models.Blob).filter(models.Blob.key == key).update(
+        {models.Blob.size: size}, synchronize_session=False
+    )
+
+
+def put(db, data: bytes, extension: str) -> str:
+    """
+    Store bytes (if not already present) and take a reference on them.
+    The reference is part of the caller's transaction.
+
+    Async handlers split this up to keep file I/O off the event loop: write() in
+    the threadpool, add_reference() inside run_sync, then write() again after the
+    commit, which restores the file if a concurrent collect() removed it meanwhile.
+    """
+    key = key_for(data, extension)
+    # Take the row lock before touching the file so a concurrent collect() of the
+    # same key either finishes first (and we rewrite the file) or sees our reference.
+    add_reference(db, key, len(data))
+    write(key, data)
+    return key
+
+
+def put_derivative(key: str, width: int, data: bytes, fmt: str = "jpg") -> Path:
+    path = derivative_path(key, width, fmt)
+    if not path.exists():
+        _write_atomic(path, data)
+    return path
+
+
+def release(db, key):
+    """Drop one reference to a blob (part of the caller's transaction). Legacy names are ignored."""
+    if is_blob_key(key):
+        crud.increment(db, models.Blob, {"key": key}, "refcount", -1)
+
+
+def collect(db, keys=None) -> int:
+    """Delete unreferenced blobs and their derivatives. Returns the number removed."""
+    query = db.query(models.Blob).filter(models.Blob.refcount <= 0)
+    if keys is not None:
+        keys = [k for k in keys if is_blob_key(k)]
+        if not keys:
+            return 0
+        query = query.filter(models.Blob.key.in_(keys))
+
+    removed = 0
+    for blob in query.with_for_update(skip_locked=True).all():
+        blob_path(blob.key).unlink(missing_ok=True)
+        digest = digest_of(blob.key)
+        for derivative in (DERIVATIVE_DIR / digest[:2] / digest[2:4]).glob(f"{digest}_*"):
+            derivative.unlink(missing_ok=True)
+        db.delete(blob)
+        removed += 1
+    db.commit()
+    return removed
+
+
+def discard(key: str):
+    """Remove a file written by write() whose reference was never taken (the request failed).
+
+    A concurrent put() of the same content rewrites the file after its commit, so
+    unlinking here cannot lose a blob that another request has just referenced.
+    """
+    from database import SessionLocal
+
+    if not is_blob_key(key):
+        return
+    db = SessionLocal()
+    try:
+        if db.get(models.Blob, key) is None:
+            blob_path(key).unlink(missing_ok=True)
+    finally:
+        db.close()
+
+
+def collect_keys(keys) -> int:
+    """collect() in a session of its own, for async handlers to run in the threadpool."""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return collect(db, keys)
+    finally:
+        db.close()
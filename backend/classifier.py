@@ -0,0 +1,278 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, and_
+
+from database import SessionLocal
+import models, crud, ingest, dedup, events, telemetry, detection_cache
+from ai_detector import detect_issue, DetectorUnavailable
+
+log = logging.getLogger(__name__)
+
+# ── Background Classification Queue ──
+# Reports are stored immediately with classification_status = PENDING and a row in
+# classification_jobs. A small pool of worker threads per process drains that table,
+# so the queue survives restarts and is shared by every gunicorn worker.
+
+CLASSIFIER_WORKERS = int(os.getenv("CLASSIFIER_WORKERS", "2"))
+CLASSIFIER_POLL_SECONDS = float(os.getenv("CLASSIFIER_POLL_SECONDS", "2"))
+CLASSIFIER_MAX_ATTEMPTS = int(os.getenv("CLASSIFIER_MAX_ATTEMPTS", "3"))
+# A RUNNING job whose worker died is picked up again after this lease expires.
+CLASSIFIER_LEASE_SECONDS = int(os.getenv("CLASSIFIER_LEASE_SECONDS", "300"))
+# No detector reachable (inference process restarting, Gemini down): the job goes
+# back to PENDING without using up an attempt and this worker pauses this long.
+CLASSIFIER_UNAVAILABLE_BACKOFF_SECONDS = float(os.getenv("CLASSIFIER_UNAVAILABLE_BACKOFF_SECONDS", "15"))
+
+PENDING_ISSUE_TYPE = "Pending Classification"
+# Inference derivatives handed over in memory by report_issue, keyed by job id.
+# Jobs claimed by another process (or evicted here) re-derive from the stored file.
+INLINE_IMAGE_LIMIT = 64
+
+_inline_images = {}
+_inline_lock = threading.Lock()
+_wakeup = threading.Event()
+_stop = threading.Event()
+_threads = []
+
+
+def enqueue(db, issue, image_path: str, image_bytes: bytes = None, cache_key: str = None):
+    """
+    Add a classification job for a freshly created issue (caller commits).
+    image_bytes is the inference derivative; pass its detection_cache key too when
+    it is already known, so it is not hashed again here.
+    """
+    issue.classification_status = "PENDING"
+    if cache_key is None and image_bytes is not None:
+        cache_key = detection_cache.key_for_bytes(image_bytes)
+    db.flush()
+    job = models.ClassificationJob(issue_id=issue.id, image_path=image_path, cache_key=cache_key, status="PENDING")
+    db.add(job)
+
+    if image_bytes is not None:
+        db.flush()
+        with _inline_lock:
+            _inline_images[job.id] = image_bytes
+            while len(_inline_images) > INLINE_IMAGE_LIMIT:
+                _inline_images.pop(next(iter(_inline_images)))
+
+
+def enqueue_many(db, entries):
+    """
+    Bulk enqueue: entries are (issue, image_path, image_bytes) for freshly added
+    issues. Flushes twice in total instead of once or twice per issue (caller commits).
+    """
+    for issue, _, _ in entries:
+        issue.classification_status = "PENDING"
+    db.flush()
+    jobs = [
+        models.ClassificationJob(
+            issue_id=issue.id,
+            image_path=image_path,
+            cache_key=detection_cache.key_for_bytes(image_bytes) if image_bytes is not None else None,
+            status="PENDING",
+        )
+        for issue, image_path, image_bytes in entries
+    ]
+    db.add_all(jobs)
+    db.flush()
+    with _inline_lock:
+        for job, (_, _, image_bytes) in zip(jobs, entries):
+            if image_bytes is not None:
+                _inline_images[job.id] = image_bytes
+        while len(_inline_images) > INLINE_IMAGE_LIMIT:
+            _inline_images.pop(next(iter(_inline_images)))
+
+
+def _load_image(job_id: int, image_path: str) -> bytes:
+    with _inline_lock:
+        data = _inline_images.pop(job_id, None)
+    if data is not None:
+        return data
+    with open(image_path, "rb") as f:
+        return ingest.inference_image(f.read())
+
+
+def notify():
+    """Wake idle workers in this process after a commit that added jobs."""
+    _wakeup.set()
+
+
+def _claim_job(db):
+    """Claim the oldest runnable job. Returns (job_id, issue_id, image_path, cache_key) or None."""
+    Job = models.ClassificationJob
+    lease_cutoff = datetime.utcnow() - timedelta(seconds=CLASSIFIER_LEASE_SECONDS)
+
+    job = (
+        db.query(Job)
+        .filter(or_(
+            Job.status == "PENDING",
+            and_(Job.status == "RUNNING", Job.locked_at < lease_cutoff),
+        ))
+        .order_by(Job.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.rollback()
+        return None
+
+    # `attempts` doubles as a version counter so two workers can never claim the
+    # same row, even on backends that ignore FOR UPDATE SKIP LOCKED (SQLite).
+    claimed = (
+        db.query(Job)
+        .filter(Job.id == job.id, Job.attempts == job.attempts)
+        .update({
+            Job.status: "RUNNING",
+            Job.locked_at: datetime.utcnow(),
+            Job.attempts: job.attempts + 1,
+        }, synchronize_session=False)
+    )
+    db.commit()
+    if not claimed:
+        return None
+    return job.id, job.issue_id, job.image_path, job.cache_key
+
+
+def _complete_job(db, job_id: int, issue_id: int, result):
+    issue_type, priority, confidence, reasoning = result
+
+    issue = db.get(models.Issue, issue_id, with_for_update=True)
+    if issue is not None:
+        before = crud.stat_key(issue)
+        issue.issue_type = issue_type
+        issue.priority = priority
+        issue.ai_confidence = confidence
+        issue.ai_reasoning = reasoning
+        issue.classification_status = "DONE"
+
+        canonical = dedup.find_duplicate(
+            db, issue_type, issue.latitude, issue.longitude,
+            reported_at=issue.created_at, before_id=issue.id,
+        )
+        if canonical is not None:
+            # Same problem already reported nearby: keep this one as a corroborating report.
+            dedup.merge_into(db, issue, canonical)
+            crud.record_issue_change(db, before=before)
+            events.publish(db, "deleted", issue, before)
+            events.publish(db, "updated", canonical, crud.stat_key(canonical))
+        else:
+            crud.record_issue_change(db, before, crud.stat_key(issue))
+            events.publish(db, "classified", issue, before)
+
+    job = db.get(models.ClassificationJob, job_id)
+    if job is not None:
+        job.status = "DONE"
+        job.last_error = None
+    db.commit()
+
+
+def _fail_job(db, job_id: int, issue_id: int, error: Exception):
+    job = db.get(models.ClassificationJob, job_id)
+    if job is None:
+        return
+
+    job.last_error = str(error)
+    if job.attempts >= CLASSIFIER_MAX_ATTEMPTS:
+        job.status = "FAILED"
+        issue = db.get(models.Issue, issue_id, with_for_update=True)
+        if issue is not None:
+            before = crud.stat_key(issue)
+            issue.issue_type = "General Civic Issue"
+            issue.priority = "Medium"
+            issue.ai_confidence = 0
+            issue.ai_reasoning = f"Automatic classification failed: {error}"
+            issue.classification_status = "FAILED"
+            crud.record_issue_change(db, before, crud.stat_key(issue))
+    else:
+        job.status = "PENDING"
+    db.commit()
+
+
+def _defer_job(db, job_id: int, error: Exception):
+    """Put a job back in the queue without counting the attempt."""
+    job = db.get(models.ClassificationJob, job_id)
+    if job is None:
+        return
+    job.status = "PENDING"
+    job.attempts = max(0, job.attempts - 1)
+    job.last_error = str(error)
+    db.commit()
+
+
+def run_once():
+    """
+    Process a single job if one is available. Returns True if a job was handled,
+    False if there was none, or "unavailable" if no detector could be reached.
+    """
+    db = SessionLocal()
+    try:
+        claimed = _claim_job(db)
+        if claimed is None:
+            return False
+
+        job_id, issue_id, image_path, cache_key = claimed
+        issue_exists = db.get(models.Issue, issue_id) is not None
+        # End the read transaction so no connection sits idle-in-transaction during inference.
+        db.rollback()
+        if not issue_exists:
+            # Issue was deleted while the job was queued.
+            with _inline_lock:
+                _inline_images.pop(job_id, None)
+            db.query(models.ClassificationJob).filter(models.ClassificationJob.id == job_id).delete()
+            db.commit()
+            return True
+
+        with telemetry.operation("classification job", job_id=job_id, issue_id=issue_id):
+            try:
+                result = detect_issue(_load_image(job_id, image_path), cache_key=cache_key)
+            except DetectorUnavailable as e:
+                db.rollback()
+                log.warning("No detector available; job deferred", extra={"job_id": job_id, "error": str(e)})
+                _defer_job(db, job_id, e)
+                return "unavailable"
+            except Exception as e:
+                db.rollback()
+                log.warning("Classification job failed", extra={"job_id": job_id, "error": str(e)})
+                _fail_job(db, job_id, issue_id, e)
+                return True
+
+            _complete_job(db, job_id, issue_id, result)
+        return True
+    finally:
+        db.close()
+
+
+def _worker_loop():
+    while not _stop.is_set():
+        try:
+            handled = run_once()
+        except Exception:
+            log.exception("Classifier worker error")
+            handled = False
+
+        if handled == "unavailable":
+            _stop.wait(CLASSIFIER_UNAVAILABLE_BACKOFF_SECONDS)
+        elif not handled:
+            _wakeup.wait(CLASSIFIER_POLL_SECONDS)
+            _wakeup.clear()
+
+
+def start_workers():
+    """Start the per-process worker pool (idempotent)."""
+    if _threads:
+        return
+    _stop.clear()
+    for n in range(CLASSIFIER_WORKERS):
+        t = threading.Thread(target=_worker_loop, name=f"classifier-{n}", daemon=True)
+        t.start()
+        _threads.append(t)
+
+
+def stop_workers(timeout: float = 5.0):
+    _stop.set()
+    _wakeup.set()
+    for t in _threads:
+        t.join(timeout)
+    _threads.clear()
@@ -1,7 +1,337 @@
+import base64
+import math
+from datetime import datetime
+
+from sqlalchemy import or_, and_, func, text
+
+import models
+import wards
+import geo
+
+OPEN_STATUSES = ("OPEN", "IN_PROGRESS")
+PRIORITIES = ("Critical", "High", "Medium", "Low")
+CRITICAL_TYPES = ("Stray Cattle", "Open Manhole")
+
+
 def detect_ward(lat, lon):
-    if 22.28 <= lat <= 22.31:
-        return 1
-    elif 22.31 < lat <= 22.34:
-        return 2
+    return wards.detect_ward(lat, lon)
+
+
+def detect_wards(points):
+    """Ward for each (lat, lon) in points, in one pass over the boundary index."""
+    return wards.assign_wards(points)
+
+
+# ── Keyset Pagination ──
+# Cursors are opaque tokens of "<created_at iso>|<id>" for the last row of a page.
+
+def encode_cursor(issue) -> str:
+    raw = f"{issue.created_at.isoformat()}|{issue.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """Return (created_at, id) from a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, issue_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(issue_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def list_issues(db, statuses=None, ward=None, priority=None, cursor=None, limit=25):
+    """
+    One page of issues, newest first.
+    Returns (issues, next_cursor); next_cursor is None on the last page.
+    """
+    Issue = models.Issue
+    query = db.query(Issue)
+
+    if statuses:
+        query = query.filter(Issue.status.in_(statuses))
+    if ward is not None:
+        query = query.filter(Issue.ward == ward)
+    if priority:
+        query = query.filter(Issue.priority == priority)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created_at, issue_id = position
+        query = query.filter(or_(
+            Issue.created_at < created_at,
+            and_(Issue.created_at == created_at, Issue.id < issue_id),
+        ))
+
+    rows = query.order_by(Issue.created_at.desc(), Issue.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+# ── Dashboard Statistics ──
+
+def issue_counts(db):
+    """(ward, issue_type, status, count) groups computed by the database."""
+    Issue = models.Issue
+    return (
+        db.query(Issue.ward, Issue.issue_type, Issue.status, func.count(Issue.id))
+        .group_by(Issue.ward, Issue.issue_type, Issue.status)
+        .all()
+    )
+
+
+def summarize_counts(groups):
+    """Fold (ward, issue_type, status, count) groups into the admin dashboard stats."""
+    total = open_count = closed_count = critical_count = 0
+    wards = {}
+    types = {}
+
+    for ward, issue_type, status, count in groups:
+        total += count
+        if status == "OPEN":
+            open_count += count
+        elif status == "CLOSED":
+            closed_count += count
+        if issue_type in CRITICAL_TYPES:
+            critical_count += count
+
+        w = wards.setdefault(ward, {"ward": ward, "total": 0, "open": 0, "closed": 0})
+        w["total"] += count
+        if status == "OPEN":
+            w["open"] += count
+        elif status == "CLOSED":
+            w["closed"] += count
+
+        types[issue_type] = types.get(issue_type, 0) + count
+
+    return {
+        "total": total,
+        "open_count": open_count,
+        "closed_count": closed_count,
+        "critical_count": critical_count,
+        "ward_stats": sorted(wards.values(), key=lambda w: (w["ward"] is None, w["ward"] or 0)),
+        "type_stats": [{"issue_type": k, "count": v} for k, v in types.items()],
+    }
+
+
+# ── Statistics Rollup ──
+# issue_stats holds counts per (ward, issue_type, status). Every handler that creates,
+# reclassifies, transitions or deletes an issue calls record_issue_change in the same
+# transaction, so the admin dashboard reads O(wards × types) rows.
+
+UNKNOWN_TYPE = "Unknown Issue"
+
+
+def stat_key(issue):
+    """The rollup bucket an issue currently counts towards."""
+    return (issue.ward or 0, issue.issue_type or UNKNOWN_TYPE, issue.status or "OPEN")
+
+
+def increment(db, model, key_values: dict, column: str, delta: int):
+    """Atomically add delta to model.column for the row identified by key_values, creating it if needed."""
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(model).values(**key_values, **{column: delta})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_values),
+            set_={column: getattr(model, column) + delta},
+        )
+        db.execute(stmt)
+        return
+
+    row = db.get(model, tuple(key_values.values()), with_for_update=True)
+    if row is None:
+        db.add(model(**key_values, **{column: delta}))
     else:
-        return 3
+        setattr(row, column, getattr(row, column) + delta)
+
+
+def adjust_issue_stat(db, key, delta: int):
+    ward, issue_type, status = key
+    increment(db, models.IssueStat, {"ward": ward, "issue_type": issue_type, "status": status}, "count", delta)
+
+
+def record_issue_change(db, before=None, after=None):
+    """Move one issue between rollup buckets. Pass None for creation/deletion."""
+    if before == after:
+        return
+    if before is not None:
+        adjust_issue_stat(db, before, -1)
+    if after is not None:
+        adjust_issue_stat(db, after, 1)
+
+
+def rollup_counts(db):
+    """(ward, issue_type, status, count) groups read from the rollup table."""
+    IssueStat = models.IssueStat
+    return (
+        db.query(IssueStat.ward, IssueStat.issue_type, IssueStat.status, IssueStat.count)
+        .filter(IssueStat.count != 0)
+        .all()
+    )
+
+
+def rebuild_issue_stats(db, dry_run=False):
+    """
+    Recompute the rollup from the issues table and repair any drift.
+    Returns a list of (key, rollup_count, actual_count) for buckets that differed.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Block concurrent record_issue_change calls until the rebuild commits.
+        db.execute(text("LOCK TABLE issue_stats IN EXCLUSIVE MODE"))
+
+    actual = {}
+    for ward, issue_type, status, count in issue_counts(db):
+        key = (ward or 0, issue_type or UNKNOWN_TYPE, status or "OPEN")
+        actual[key] = actual.get(key, 0) + count
+
+    current = {
+        (row.ward, row.issue_type, row.status): row
+        for row in db.query(models.IssueStat).all()
+    }
+
+    drift = []
+    for key in set(actual) | set(current):
+        expected = actual.get(key, 0)
+        row = current.get(key)
+        found = row.count if row is not None else 0
+        if expected == found:
+            continue
+        drift.append((key, found, expected))
+        if dry_run:
+            continue
+        if row is None:
+            ward, issue_type, status = key
+            db.add(models.IssueStat(ward=ward, issue_type=issue_type, status=status, count=expected))
+        elif expected == 0:
+            db.delete(row)
+        else:
+            row.count = expected
+
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+    return drift
+
+
+def ensure_issue_stats(db):
+    """Seed the rollup on first start against a database that already has issues."""
+    if db.query(models.IssueStat).first() is None and db.query(models.Issue).first() is not None:
+        rebuild_issue_stats(db)
+
+
+# ── Spatial Queries ──
+
+MAP_COLUMNS = (
+    models.Issue.id,
+    models.Issue.issue_type,
+    models.Issue.priority,
+    models.Issue.status,
+    models.Issue.ward,
+    models.Issue.latitude,
+    models.Issue.longitude,
+)
+
+
+def _map_row(row, distance_m=None):
+    item = {
+        "id": row.id,
+        "issue_type": row.issue_type,
+        "priority": row.priority,
+        "status": row.status,
+        "ward": row.ward,
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+    }
+    if distance_m is not None:
+        item["distance_m"] = round(distance_m, 1)
+    return item
+
+
+def issues_in_bbox(db, min_lat, min_lon, max_lat, max_lon, statuses=None, limit=500):
+    """Issues inside a bounding box, located through the tile index."""
+    Issue = models.Issue
+    x0, x1, y0, y1 = geo.tile_range(min_lat, min_lon, max_lat, max_lon)
+
+    query = db.query(*MAP_COLUMNS).filter(
+        Issue.tile_x.between(x0, x1),
+        Issue.tile_y.between(y0, y1),
+        Issue.latitude.between(min_lat, max_lat),
+        Issue.longitude.between(min_lon, max_lon),
+    )
+    if statuses:
+        query = query.filter(Issue.status.in_(statuses))
+    return [_map_row(row) for row in query.limit(limit).all()]
+
+
+def nearest_issues(db, lat, lon, k=10, statuses=None, max_radius_m=20000):
+    """
+    The k issues closest to a point (within max_radius_m).
+
+    Searches squares of tiles around the point, doubling the ring radius until the
+    k-th candidate is closer than the distance the square is guaranteed to cover.
+    The database ranks candidates with an equirectangular distance, so at most k
+    rows are fetched per ring. The search stops once the square spans every tile.
+    """
+    if not (math.isfinite(lat) and math.isfinite(lon) and math.isfinite(max_radius_m)):
+        raise ValueError("lat, lon and max_radius_m must be finite")
+    Issue = models.Issue
+    cx, cy = geo.tile_for(lat, lon)
+    tile_m = geo.tile_size_m(lat)
+    cos_lat = math.cos(math.radians(lat))
+    approx_distance = (
+        (Issue.latitude - lat) * (Issue.latitude - lat)
+        + (Issue.longitude - lon) * (Issue.longitude - lon) * (cos_lat * cos_lat)
+    )
+
+    ring = 1
+    while True:
+        query = db.query(*MAP_COLUMNS).filter(
+            Issue.tile_x.between(cx - ring, cx + ring),
+            Issue.tile_y.between(cy - ring, cy + ring),
+        )
+        if statuses:
+            query = query.filter(Issue.status.in_(statuses))
+        rows = query.order_by(approx_distance).limit(k).all()
+
+        ranked = sorted(
+            ((geo.haversine_m(lat, lon, row.latitude, row.longitude), row) for row in rows),
+            key=lambda pair: pair[0],
+        )
+        covered_m = ring * tile_m
+        complete = len(ranked) >= k and ranked[-1][0] <= covered_m
+        if complete or covered_m >= max_radius_m or ring >= geo.TILES:
+            return [_map_row(row, d) for d, row in ranked if d <= max_radius_m]
+        ring *= 2
+
+
+def backfill_tiles(db, batch_size=5000):
+    """Fill tile_x/tile_y for issues created before the spatial index existed."""
+    Issue = models.Issue
+    updated = 0
+    last_id = 0
+    while True:
+        # Keyset on id: rows whose coordinates are not finite stay without a tile
+        rows = (
+            db.query(Issue.id, Issue.latitude, Issue.longitude)
+            .filter(Issue.id > last_id, Issue.tile_x.is_(None),
+                    Issue.latitude.isnot(None), Issue.longitude.isnot(None))
+            .order_by(Issue.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+        mappings = [{"id": row.id, **geo.tile_columns(row.latitude, row.longitude)} for row in rows]
+        db.bulk_update_mappings(Issue, mappings)
+        db.commit()
+        updated += sum(1 for m in mappings if m["tile_x"] is not None)
@@ -0,0 +1,92 @@
+import os
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+import models, crud
+import geo
+
+# ── Duplicate Report Clustering ──
+# A report of the same issue_type within DUPLICATE_RADIUS_M of an issue that is
+# still open and was created less than DUPLICATE_WINDOW_MINUTES earlier is kept as
+# a corroborating IssueReport on that issue instead of becoming a new issue.
+#
+# Issue.created_at is filled by the database (func.now()), so the window is
+# measured on the database clock too, never the app server's.
+
+DUPLICATE_RADIUS_M = float(os.getenv("DUPLICATE_RADIUS_M", "30"))
+DUPLICATE_WINDOW_MINUTES = float(os.getenv("DUPLICATE_WINDOW_MINUTES", "120"))
+
+
+def find_duplicate(db, issue_type, lat, lon, reported_at=None, before_id=None):
+    """
+    The nearest matching open issue, locked for update, or None.
+    before_id restricts matches to older issues so two pending reports never merge into each other.
+    """
+    if DUPLICATE_RADIUS_M <= 0 or lat is None or lon is None or not issue_type:
+        return None
+
+    Issue = models.Issue
+    reported_at = reported_at or db.scalar(select(func.now()))
+    min_lat, min_lon, max_lat, max_lon = geo.bbox_around(lat, lon, DUPLICATE_RADIUS_M)
+    x0, x1, y0, y1 = geo.tile_range(min_lat, min_lon, max_lat, max_lon)
+
+    query = db.query(Issue).filter(
+        Issue.tile_x.between(x0, x1),
+        Issue.tile_y.between(y0, y1),
+        Issue.latitude.between(min_lat, max_lat),
+        Issue.longitude.between(min_lon, max_lon),
+        Issue.issue_type == issue_type,
+        Issue.status.in_(crud.OPEN_STATUSES),
+        Issue.created_at >= reported_at - timedelta(minutes=DUPLICATE_WINDOW_MINUTES),
+    )
+    if before_id is not None:
+        query = query.filter(Issue.id < before_id)
+
+    candidates = [
+        (geo.haversine_m(lat, lon, c.latitude, c.longitude), c.id)
+        for c in query.all()
+    ]
+    candidates = [c for c in candidates if c[0] <= DUPLICATE_RADIUS_M]
+    if not candidates:
+        return None
+    _, issue_id = min(candidates)
+    return db.get(Issue, issue_id, with_for_update=True)
+
+
+def attach_report(db, canonical, image, lat, lon, reporter_id=None, merged_from=None, reported_at=None):
+    """Record a corroborating report on an existing issue (caller commits)."""
+    db.add(models.IssueReport(
+        issue_id=canonical.id,
+        merged_from=merged_from,
+        image=image,
+        latitude=lat,
+        longitude=lon,
+        reporter_id=reporter_id,
+        created_at=reported_at or func.now(),
+    ))
+    canonical.report_count = (canonical.report_count or 1) + 1
+
+
+def merge_into(db, issue, canonical):
+    """Fold a freshly classified issue into an existing one and delete it (caller updates the rollup)."""
+    attach_report(
+        db, canonical,
+        image=issue.before_image,
+        lat=issue.latitude,
+        lon=issue.longitude,
+        reporter_id=issue.reporter_id,
+        merged_from=issue.id,
+        reported_at=issue.created_at,
+    )
+    db.delete(issue)
+
+
+def resolve_merged(db, issue_id):
+    """Id of the issue a merged report now belongs to, or None."""
+    report = (
+        db.query(models.IssueReport)
+        .filter(models.IssueReport.merged_from == issue_id)
+        .first()
+    )
+    return report.issue_id if report is not None else None
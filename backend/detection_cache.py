@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from database import SessionLocal
+import models
+
+log = logging.getLogger(__name__)
+
+# ── Detection Result Cache ──
+# Two tiers: a bounded in-process LRU, then the shared detection_cache table so
+# every gunicorn worker benefits from results computed elsewhere.
+#
+# DETECTION_CACHE_MODE:
+#   "sha256" (default) — exact content hash of the image bytes.
+#   "phash"            — 64-bit difference hash, so re-encoded or slightly shifted
+#                        shots of the same scene share a result. Near (non-identical)
+#                        matches are found within DETECTION_CACHE_PHASH_DISTANCE bits in
+#                        the memory tier; the database tier matches exact hashes only.
+
+DETECTION_CACHE_MODE = os.getenv("DETECTION_CACHE_MODE", "sha256").lower()
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "1024"))
+DETECTION_CACHE_PHASH_DISTANCE = int(os.getenv("DETECTION_CACHE_PHASH_DISTANCE", "6"))
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0, "stores": 0}
+
+
+def _sha256_key(data: bytes) -> str:
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def _phash_key(data: bytes):
+    """Difference hash of the image, or None if it cannot be decoded."""
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return None
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return f"phash:{value:016x}"
+
+
+def key_for_bytes(data: bytes) -> str:
+    if DETECTION_CACHE_MODE == "phash":
+        key = _phash_key(data)
+        if key is not None:
+            return key
+    return _sha256_key(data)
+
+
+def _hamming(a: str, b: str) -> int:
+    return bin(int(a[6:], 16) ^ int(b[6:], 16)).count("1")
+
+
+def _memory_get(key: str):
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+
+        if key.startswith("phash:") and DETECTION_CACHE_PHASH_DISTANCE > 0:
+            for other, result in _memory.items():
+                if other.startswith("phash:") and _hamming(key, other) <= DETECTION_CACHE_PHASH_DISTANCE:
+                    _memory.move_to_end(other)
+                    return result
+    return None
+
+
+def _memory_put(key: str, result):
+    with _lock:
+        _memory[key] = result
+        _memory.move_to_end(key)
+        while len(_memory) > DETECTION_CACHE_SIZE:
+            _memory.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def get(key: str):
+    """Return a cached (type, priority, confidence, reasoning) tuple or None."""
+    result = _memory_get(key)
+    if result is not None:
+        with _lock:
+            _stats["memory_hits"] += 1
+        return result
+
+    db = SessionLocal()
+    try:
+        entry = db.get(models.DetectionCacheEntry, key)
+        if entry is not None:
+            entry.hits = (entry.hits or 0) + 1
+            db.commit()
+            result = (entry.issue_type, entry.priority, entry.confidence, entry.reasoning)
+    except Exception as e:
+        db.rollback()
+        log.warning("Detection cache lookup failed", extra={"error": str(e)})
+    finally:
+        db.close()
+
+    with _lock:
+        if result is not None:
+            _stats["db_hits"] += 1
+        else:
+            _stats["misses"] += 1
+    if result is not None:
+        _memory_put(key, result)
+    return result
+
+
+def put(key: str, result):
+    issue_type, priority, confidence, reasoning = result
+    _memory_put(key, result)
+
+    db = SessionLocal()
+    try:
+        db.merge(models.DetectionCacheEntry(
+            key=key,
+            issue_type=issue_type,
+            priority=priority,
+            confidence=confidence,
+            reasoning=reasoning,
+        ))
+        db.commit()
+    except Exception as e:
+        # Another worker may have stored the same key concurrently.
+        db.rollback()
+        log.warning("Detection cache store failed", extra={"error": str(e)})
+    finally:
+        db.close()
+
+    with _lock:
+        _stats["stores"] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        hits = _stats["memory_hits"] + _stats["db_hits"]
+        lookups = hits + _stats["misses"]
+        return {
+            **_stats,
+            "mode": DETECTION_CACHE_MODE,
+            "memory_entries": len(_memory),
+            "memory_capacity": DETECTION_CACHE_SIZE,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
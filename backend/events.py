@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.orm import Session
+
+from database import engine, DATABASE_URL
+import crud
+
+log = logging.getLogger(__name__)
+
+# ── Live Issue Events ──
+# Handlers call publish() inside the transaction that changes an issue. The event
+# is only delivered once that transaction commits:
+#
+#   postgres  pg_notify() runs in the transaction; every worker process LISTENs on
+#             EVENTS_CHANNEL from a background thread, so all workers (including
+#             the publisher) receive it.
+#   memory    events wait on the session and go straight to this process's
+#             subscribers after commit. Single-process deployments only.
+#
+# Subscribers are asyncio queues read by the /events SSE endpoint.
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "auto")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "issue_events")
+# A subscriber this far behind gets a resync event and the page reloads.
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+EVENT_TYPES = ("created", "classified", "updated", "started", "closed", "deleted")
+
+_PENDING = "pending_issue_events"
+
+
+def _use_postgres() -> bool:
+    if EVENTS_BACKEND == "auto":
+        return DATABASE_URL.startswith("postgresql")
+    return EVENTS_BACKEND == "postgres"
+
+
+def issue_event(kind, issue, before=None) -> dict:
+    """Event payload for an issue; before is its previous crud.stat_key, if any."""
+    return {
+        "type": kind,
+        "id": issue.id,
+        "ward": issue.ward,
+        "status": issue.status,
+        "issue_type": issue.issue_type,
+        "priority": issue.priority,
+        "report_count": issue.report_count,
+        "before": list(before) if before is not None else None,
+        "after": list(crud.stat_key(issue)) if kind != "deleted" else None,
+    }
+
+
+def publish(db, kind, issue, before=None):
+    """Queue an event for delivery when db commits. Call after the issue is flushed."""
+    payload = issue_event(kind, issue, before)
+    if _use_postgres():
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": EVENTS_CHANNEL, "payload": json.dumps(payload)},
+        )
+    else:
+        db.info.setdefault(_PENDING, []).append(payload)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _deliver_pending(session):
+    for payload in session.info.pop(_PENDING, ()):
+        broker.dispatch(payload)
+
+
+@sa_event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+
+
+# ── Subscribers ──
+
+class Subscription:
+    def __init__(self, loop, ward=None):
+        self.loop = loop
+        self.ward = ward
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def _put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def wants(self, payload) -> bool:
+        return self.ward is None or payload.get("ward") == self.ward
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._seq = itertools.count(1)
+        self._listener = None
+
+    def subscribe(self, ward=None) -> Subscription:
+        sub = Subscription(asyncio.get_running_loop(), ward)
+        with self._lock:
+            self._subscribers.add(sub)
+        if _use_postgres():
+            self._ensure_listener()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def dispatch(self, payload):
+        """Hand an event to every interested subscriber. Safe from any thread."""
+        payload = dict(payload, seq=next(self._seq))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.wants(payload) and not sub.overflowed:
+                try:
+                    sub.loop.call_soon_threadsafe(sub._put, payload)
+                except RuntimeError:
+                    # Event loop already closed (shutdown)
+                    self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "postgres" if _use_postgres() else "memory",
+                "subscribers": len(self._subscribers),
+                "listening": self._listener is not None and self._listener.is_alive(),
+            }
+
+    # ── Postgres LISTEN ──
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="issue-events", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = engine.raw_connection()
+                dbapi = conn.driver_connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cur:
+                    cur.execute(f'LISTEN "{EVENTS_CHANNEL}"')
+                log.info("Listening for events", extra={"channel": EVENTS_CHANNEL})
+                while True:
+                    if select.select([dbapi], [], [], EVENTS_HEARTBEAT_SECONDS) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        note = dbapi.notifies.pop(0)
+                        try:
+                            self.dispatch(json.loads(note.payload))
+                        except ValueError:
+                            log.warning("Ignoring malformed event payload", extra={"payload": note.payload[:80]})
+            except Exception as e:
+                log.warning("Event listener connection lost; reconnecting", extra={"error": str(e)})
+                if conn is not None:
+                    try:
+                        conn.invalidate()
+                    except Exception:
+                        pass
+                time.sleep(2)
+
+
+broker = Broker()
+
+
+async def stream(sub, is_disconnected):
+    """Server-sent event frames for a subscription until the client goes away."""
+    try:
+        yield "retry: 3000\n: connected\n\n"
+        while True:
+            if sub.overflowed:
+                # Tell the page to resynchronise rather than silently dropping events.
+                yield "event: resync\ndata: {}\n\n"
+                return
+            try:
+                payload = await asyncio.wait_for(sub.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {payload['seq']}\nevent: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+    finally:
+        broker.unsubscribe(sub)
@@ -0,0 +1,266 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+log = logging.getLogger(__name__)
+
+# ── Gemini Client ──
+# Calls generateContent over REST with the image inline (base64), downscaled to
+# GEMINI_MAX_SIDE first. Every call has a deadline GEMINI_TIMEOUT_SECONDS after it
+# starts; waiting for a concurrency slot or a rate-limit token, connecting and
+# reading the reply all count against it. The reply is read in chunks and dropped
+# once the deadline passes. A single read that stalls is cut off by the socket
+# timeout (the time left when the request was sent), so a call can end at most
+# that much after its deadline: never more than twice GEMINI_TIMEOUT_SECONDS.
+# After GEMINI_BREAKER_FAILURES consecutive failures the circuit opens and calls
+# fail immediately (so callers go straight to the local detector) until
+# GEMINI_BREAKER_COOLDOWN_SECONDS have passed; then a single probe call decides
+# whether to close it again.
+#
+# Point GEMINI_API_BASE at a local server (see benchmarks/fake_gemini.py) to
+# exercise all of this without the real API.
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "10"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "60"))
+GEMINI_MAX_SIDE = int(os.getenv("GEMINI_MAX_SIDE", "768"))
+GEMINI_JPEG_QUALITY = 80
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "30"))
+_READ_CHUNK_BYTES = 16384
+
+# Statuses that say the service (or our quota/key) is in trouble, not the request
+_UNHEALTHY_STATUSES = {401, 403, 408, 429}
+
+
+class GeminiUnavailable(RuntimeError):
+    """The call was not made or did not complete; use the local detector."""
+
+
+class CircuitOpen(GeminiUnavailable):
+    """Skipped without a call because the remote has been failing."""
+
+
+class GeminiResponseError(RuntimeError):
+    """Gemini answered, but not with something usable."""
+
+
+class RateLimiter:
+    """Token bucket shared by all threads: `rate` calls per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> bool:
+        """Take a token, waiting until `deadline` (monotonic) at the latest."""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failures: int, cooldown: float, name: str = "Gemini"):
+        self.threshold = max(1, failures)
+        self.cooldown = cooldown
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. In half-open state only one probe is let through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                log.info("Circuit closed", extra={"circuit": self.name})
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                log.warning("Circuit open", extra={
+                    "circuit": self.name, "cooldown_seconds": self.cooldown, "failures": self.failures,
+                })
+
+    def release(self):
+        """The allowed call ended without telling us anything about the remote's health."""
+        with self._lock:
+            self._probing = False
+
+
+def downscale(image_bytes: bytes, max_side: int = GEMINI_MAX_SIDE) -> tuple:
+    """(bytes, mime type) of the image shrunk to max_side, or the original if it is already small."""
+    mime_type = _image_mime_type(image_bytes)
+    try:
+        import cv2
+        import numpy as np
+        import ingest
+    except ImportError:
+        return image_bytes, mime_type
+
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None or max(img.shape[:2]) <= max_side:
+        return image_bytes, mime_type
+    ok, buf = cv2.imencode(".jpg", ingest.resize_max_side(cv2, img, max_side),
+                           [int(cv2.IMWRITE_JPEG_QUALITY), GEMINI_JPEG_QUALITY])
+    return (buf.tobytes(), "image/jpeg") if ok else (image_bytes, mime_type)
+
+
+def _image_mime_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+class GeminiClient:
+    def __init__(self, api_key: str = GEMINI_API_KEY, model: str = GEMINI_MODEL, base_url: str = GEMINI_API_BASE,
+                 timeout: float = GEMINI_TIMEOUT_SECONDS, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 rate_per_minute: float = GEMINI_RATE_PER_MINUTE, max_side: int = GEMINI_MAX_SIDE,
+                 breaker: CircuitBreaker = None):
+        self.url = f"{base_url.rstrip('/')}/v1beta/models/{model}:generateContent"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_side = max_side
+        self.max_concurrency = max(1, max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.limiter = RateLimiter(rate_per_minute / 60.0, burst=max(1, max_concurrency))
+        self.breaker = breaker or CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN_SECONDS)
+
+    def generate(self, prompt: str, image_bytes: bytes, temperature: float = 0.1, max_output_tokens: int = 500) -> str:
+        """Text of the first candidate. Raises GeminiUnavailable or GeminiResponseError."""
+        if not self.breaker.allow():
+            raise CircuitOpen("circuit open")
+        deadline = time.monotonic() + self.timeout
+
+        # Whatever happens after allow(), the breaker hears about it exactly once:
+        # True/False when the remote answered (or failed to), otherwise release().
+        healthy = None
+        try:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise GeminiUnavailable(f"all {self.max_concurrency} slots busy")
+            try:
+                if not self.limiter.acquire(deadline):
+                    raise GeminiUnavailable("rate limit reached")
+                data, mime_type = downscale(image_bytes, self.max_side)
+                body = {
+                    "contents": [{"parts": [
+                        {"text": prompt},
+                        {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(data).decode("ascii")}},
+                    ]}],
+                    "generationConfig": {"temperature": temperature, "maxOutputTokens": max_output_tokens},
+                }
+                if deadline - time.monotonic() <= 0:
+                    raise GeminiUnavailable("deadline exceeded before sending")
+                try:
+                    reply = self._post(body, deadline)
+                except GeminiResponseError:
+                    # A bad request is our problem, not the service's
+                    healthy = True
+                    raise
+                except GeminiUnavailable:
+                    healthy = False
+                    raise
+                healthy = True
+            finally:
+                self._slots.release()
+        finally:
+            if healthy is True:
+                self.breaker.record_success()
+            elif healthy is False:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+
+        try:
+            return reply["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            raise GeminiResponseError(f"No text in response: {json.dumps(reply)[:200]}")
+
+    def _post(self, body: dict, deadline: float) -> dict:
+        """POST body and parse the reply, all before deadline. Does not touch the breaker."""
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=max(0.001, deadline - time.monotonic())) as res:
+                reply = json.loads(_read_until(res, deadline))
+        except urllib.error.HTTPError as e:
+            if e.code >= 500 or e.code in _UNHEALTHY_STATUSES:
+                raise GeminiUnavailable(f"HTTP {e.code}") from e
+            raise GeminiResponseError(f"HTTP {e.code}: {e.read()[:200]!r}") from e
+        except (OSError, ValueError) as e:
+            # Timeouts, refused connections and truncated bodies
+            raise GeminiUnavailable(str(e) or type(e).__name__) from e
+        return reply
+
+
+def _read_until(res, deadline: float) -> bytes:
+    chunks = []
+    while True:
+        chunk = res.read(_READ_CHUNK_BYTES)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+        if time.monotonic() > deadline:
+            raise TimeoutError("deadline exceeded while reading the response")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GeminiClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
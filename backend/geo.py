@@ -0,0 +1,63 @@
+import math
+
+# ── Tile Index ──
+# Issues carry the Web-Mercator tile (x, y) that contains them at TILE_ZOOM
+# (~1.2 km tiles at zoom 15, ~1.1 km at the city's latitude). A B-tree on
+# (tile_x, tile_y) turns bounding-box and nearest-neighbour queries into a scan
+# over a few tiles instead of the whole table.
+
+TILE_ZOOM = 15
+TILES = 2 ** TILE_ZOOM  # tiles along each axis
+EARTH_RADIUS_M = 6371008.8
+EARTH_CIRCUMFERENCE_M = 2 * math.pi * 6378137.0
+
+
+def _clamp_lat(lat):
+    return max(-85.05112878, min(85.05112878, lat))
+
+
+def tile_for(lat, lon):
+    """(tile_x, tile_y) containing the point, or None if a coordinate is not finite."""
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        return None
+    lat = _clamp_lat(lat)
+    x = int((lon + 180.0) / 360.0 * TILES)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * TILES)
+    return min(TILES - 1, max(0, x)), min(TILES - 1, max(0, y))
+
+
+def tile_columns(lat, lon) -> dict:
+    """Column values for models.Issue."""
+    tile = tile_for(lat, lon) if lat is not None and lon is not None else None
+    if tile is None:
+        return {"tile_x": None, "tile_y": None}
+    x, y = tile
+    return {"tile_x": x, "tile_y": y}
+
+
+def tile_range(min_lat, min_lon, max_lat, max_lon):
+    """Inclusive (x0, x1, y0, y1) tile ranges covering a bounding box."""
+    x0, y1 = tile_for(min_lat, min_lon)  # tile y grows southwards
+    x1, y0 = tile_for(max_lat, max_lon)
+    return x0, x1, y0, y1
+
+
+def tile_size_m(lat):
+    """Edge length of a tile in metres at a latitude."""
+    return EARTH_CIRCUMFERENCE_M * math.cos(math.radians(_clamp_lat(lat))) / TILES
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bbox_around(lat, lon, radius_m):
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(0.01, math.cos(math.radians(lat)))))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
@@ -0,0 +1,83 @@
+"""
+Gunicorn settings (render.yaml starts gunicorn with -c backend/gunicorn.conf.py).
+
+With INFERENCE_SOCKET set, the master starts one shared inference process
+(inference_server.py) before forking the web workers, so the detector model is
+imported and held in memory once instead of once per worker. A supervisor thread
+in the master restarts that process whenever it exits (crash, OOM kill), backing
+off up to INFERENCE_RESTART_MAX_SECONDS while it keeps failing. Meanwhile
+classification jobs are deferred, not guessed (see classifier.py).
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+INFERENCE_STARTUP_TIMEOUT = float(os.getenv("INFERENCE_STARTUP_TIMEOUT", "120"))
+INFERENCE_RESTART_MAX_SECONDS = float(os.getenv("INFERENCE_RESTART_MAX_SECONDS", "60"))
+
+_inference = None
+_stopping = threading.Event()
+
+
+def _spawn(server):
+    """Start the inference process and wait until its socket exists. Returns the Popen."""
+    if os.path.exists(INFERENCE_SOCKET):
+        os.unlink(INFERENCE_SOCKET)
+
+    proc = subprocess.Popen([sys.executable, "inference_server.py"], cwd=BACKEND_DIR)
+    deadline = time.monotonic() + INFERENCE_STARTUP_TIMEOUT
+    while not os.path.exists(INFERENCE_SOCKET):
+        if proc.poll() is not None:
+            server.log.warning("Inference process exited with code %s; the local detector is unavailable",
+                               proc.returncode)
+            return proc
+        if time.monotonic() > deadline:
+            server.log.warning("Inference process not ready after %.0fs; starting workers anyway",
+                               INFERENCE_STARTUP_TIMEOUT)
+            return proc
+        time.sleep(0.2)
+    server.log.info("Inference process %s listening on %s", proc.pid, INFERENCE_SOCKET)
+    return proc
+
+
+def _supervise(server):
+    global _inference
+    backoff = 1.0
+    while True:
+        started = time.monotonic()
+        code = _inference.wait()
+        if _stopping.is_set():
+            return
+        # A process that ran for a while before dying gets a quick restart; one
+        # that keeps failing at startup is retried less and less often.
+        if time.monotonic() - started > INFERENCE_RESTART_MAX_SECONDS:
+            backoff = 1.0
+        server.log.error("Inference process exited with code %s; restarting in %.0fs", code, backoff)
+        if _stopping.wait(backoff):
+            return
+        backoff = min(backoff * 2, INFERENCE_RESTART_MAX_SECONDS)
+        _inference = _spawn(server)
+
+
+def on_starting(server):
+    global _inference
+    if not INFERENCE_SOCKET:
+        return
+    _inference = _spawn(server)
+    threading.Thread(target=_supervise, args=(server,), name="inference-supervisor", daemon=True).start()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _inference is None or _inference.poll() is not None:
+        return
+    _inference.terminate()
+    try:
+        _inference.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        _inference.kill()
@@ -0,0 +1,88 @@
+"""
+Shared inference process for the local detector. Run from the backend directory:
+
+    INFERENCE_SOCKET=/tmp/civic-inference.sock DETECTOR_BACKEND=onnx-int8 python inference_server.py
+
+Loads the DETECTOR_BACKEND model once and answers every web worker over a Unix
+socket. A request is an encoded image; the reply is JSON, either
+{"labels": [...]} or {"error": "unreadable" | "failed", "detail": "..."}.
+Requests from all connections share one YoloBatcher, so concurrent uploads in
+different workers are batched together.
+
+The socket is only created once the model has loaded, so its existence means
+the process is ready (gunicorn.conf.py waits for it before forking workers).
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import ai_detector
+import telemetry
+
+log = logging.getLogger(__name__)
+
+
+def _serve_connection(conn, batcher):
+    import cv2
+    import numpy as np
+
+    with conn:
+        while True:
+            try:
+                data = conn.recv_bytes()
+            except (EOFError, OSError):
+                return
+            img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                reply = {"error": "unreadable"}
+            else:
+                try:
+                    reply = {"labels": batcher.labels(img)}
+                except ai_detector.DetectorUnavailable as e:
+                    reply = {"error": "unavailable", "detail": str(e)}
+                except Exception as e:
+                    reply = {"error": "failed", "detail": str(e)}
+            try:
+                conn.send_bytes(json.dumps(reply).encode("utf-8"))
+            except OSError:
+                return
+
+
+def serve(path: str):
+    start = time.perf_counter()
+    batcher = ai_detector.YoloBatcher(ai_detector._load_detector())
+    elapsed = time.perf_counter() - start
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with Listener(path, family="AF_UNIX") as listener:
+        os.chmod(path, 0o660)
+        log.info("Inference process ready", extra={
+            "backend": ai_detector.DETECTOR_BACKEND, "load_seconds": round(elapsed, 3), "socket": path,
+        })
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=_serve_connection, args=(conn, batcher), name="inference-conn", daemon=True).start()
+
+
+def main():
+    telemetry.configure_logging()
+    path = ai_detector.INFERENCE_SOCKET
+    if not path:
+        print("Set INFERENCE_SOCKET to the Unix socket path to listen on")
+        return 1
+    # This process is the server; never forward to itself
+    ai_detector.INFERENCE_SOCKET = ""
+    try:
+        serve(path)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import os
+from typing import NamedTuple
+
+from starlette.responses import JSONResponse
+
+# ── Image Ingestion ──
+# Uploads are read in chunks with a hard size cap, decoded once, and re-encoded as
+# a display-size JPEG (what gets stored) and an inference-size JPEG (handed to the
+# detector in memory). Card thumbnails are generated later by thumbnails.py.
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(MAX_UPLOAD_BYTES + 1024 * 1024)))
+# Offline sync uploads carry many images in one request.
+MAX_BATCH_REQUEST_BYTES = int(os.getenv("MAX_BATCH_REQUEST_BYTES", str(256 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+DISPLAY_MAX_SIDE = int(os.getenv("DISPLAY_MAX_SIDE", "1600"))
+INFERENCE_MAX_SIDE = int(os.getenv("INFERENCE_MAX_SIDE", "1024"))
+JPEG_QUALITY = 85
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeded MAX_UPLOAD_BYTES / MAX_REQUEST_BYTES."""
+
+
+class InvalidImage(ValueError):
+    """The upload could not be decoded as an image."""
+
+
+class IngestedImage(NamedTuple):
+    display: bytes
+    inference: bytes
+    extension: str
+
+
+def read_limited(fileobj, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Read a file object in chunks, refusing to buffer more than max_bytes."""
+    chunks = []
+    size = 0
+    while True:
+        chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"Image exceeds the {max_bytes // (1024 * 1024)} MB limit")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def resize_max_side(cv2, img, max_side: int):
+    height, width = img.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return img
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def resize_to_width(cv2, img, width: int):
+    """Exactly width pixels wide, keeping the aspect ratio (srcset "w" descriptors rely on it)."""
+    height, current = img.shape[:2]
+    if current == width:
+        return img
+    size = (width, max(1, round(height * width / current)))
+    interpolation = cv2.INTER_AREA if width < current else cv2.INTER_CUBIC
+    return cv2.resize(img, size, interpolation=interpolation)
+
+
+def _encode_jpeg(cv2, img, quality: int = JPEG_QUALITY) -> bytes:
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise InvalidImage("Could not encode image")
+    return buf.tobytes()
+
+
+def process_image(data: bytes) -> IngestedImage:
+    """Decode once and produce the display and inference derivatives."""
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        # Without OpenCV the original bytes are used for every derivative.
+        return IngestedImage(data, data, "")
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise InvalidImage("Uploaded file is not a readable image")
+
+    display = resize_max_side(cv2, img, DISPLAY_MAX_SIDE)
+    inference = resize_max_side(cv2, display, INFERENCE_MAX_SIDE)
+
+    return IngestedImage(
+        display=_encode_jpeg(cv2, display),
+        inference=_encode_jpeg(cv2, inference),
+        extension=".jpg",
+    )
+
+
+def inference_image(data: bytes) -> bytes:
+    """Inference derivative for an image that was stored earlier (e.g. read back by a worker)."""
+    try:
+        return process_image(data).inference
+    except InvalidImage:
+        return data
+
+
+# ── Request Body Limit ──
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies larger than max_bytes before they are spooled to disk
+    by the multipart parser. path_limits overrides the limit for exact paths.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES, path_limits: dict = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.path_limits.get(scope["path"], self.max_bytes)
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > max_bytes:
+                await self._reject(scope, receive, send, max_bytes)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise UploadTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except UploadTooLarge:
+            if response_started:
+                raise
+            await self._reject(scope, receive, send, max_bytes)
+
+    async def _reject(self, scope, receive, send, max_bytes):
+        response = JSONResponse(
+            status_code=413,
+            content={"error": f"Request body exceeds the {max_bytes // (1024 * 1024)} MB limit"},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,239 @@
+import heapq
+import itertools
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+import models
+
+log = logging.getLogger(__name__)
+
+# ── Outbound Mail Queue ──
+# Messages are queued by request handlers and delivered by one background sender
+# thread per process, which keeps an authenticated SMTP connection open between
+# messages and retries failures with exponential backoff.
+#
+# Delivery status is kept in memory by the sending process and written through to
+# the mail_deliveries table by the sender thread, so /otp-status answers correctly
+# whichever worker the poll lands on. Rows older than MAIL_STATUS_RETENTION_HOURS are pruned when idle.
+#
+# To test locally against a debugging server:
+#   python -m aiosmtpd -n -l localhost:1025
+#   SMTP_EMAIL=noreply@example.com SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false
+
+SMTP_EMAIL = os.getenv("SMTP_EMAIL", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+SMTP_MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", "4"))
+SMTP_RETRY_BASE_SECONDS = float(os.getenv("SMTP_RETRY_BASE_SECONDS", "2"))
+# Close the pooled connection after this long without traffic (servers drop idle clients anyway).
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+
+STATUS_HISTORY = 10000
+MAIL_STATUS_RETENTION_HOURS = float(os.getenv("MAIL_STATUS_RETENTION_HOURS", "24"))
+
+
+def is_configured() -> bool:
+    """A sender address plus either credentials or an explicitly configured (local) host."""
+    return bool(SMTP_EMAIL) and (bool(SMTP_PASSWORD) or "SMTP_HOST" in os.environ)
+
+
+class MailQueue:
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._status = OrderedDict()
+        self._thread = None
+        self._conn = None
+        self._last_used = 0.0
+
+    # ── Public API ──
+
+    def submit(self, message, on_failure=None) -> str:
+        """Queue an email.message.Message. Returns a message id for status()."""
+        message_id = uuid.uuid4().hex
+        # Memory only: submit() is called from async handlers, so the database write
+        # is left to the sender thread (its SENDING record). Until then other
+        # processes answer UNKNOWN, which the verify page keeps polling on.
+        self._record(message_id, "QUEUED", store=False, attempts=0)
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic(), next(self._seq), message_id, message, 1, on_failure))
+            self._ensure_thread()
+            self._cond.notify()
+        return message_id
+
+    def status(self, message_id) -> dict:
+        with self._cond:
+            entry = self._status.get(message_id)
+        if entry is not None:
+            return dict(entry)
+        # Queued by another worker process
+        return _load_status(message_id) or {"status": "UNKNOWN"}
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    # ── Sender Thread ──
+
+    def _record(self, message_id, status, store=True, **fields):
+        with self._cond:
+            entry = self._status.setdefault(message_id, {})
+            entry.update(status=status, **fields)
+            self._status.move_to_end(message_id)
+            while len(self._status) > STATUS_HISTORY:
+                self._status.popitem(last=False)
+            entry = dict(entry)
+        if store:
+            _store_status(message_id, entry)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+            self._thread.start()
+
+    def _next(self):
+        """The next due message, or None after SMTP_IDLE_SECONDS with nothing queued."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    return heapq.heappop(self._heap)
+                timeout = self._heap[0][0] - now if self._heap else SMTP_IDLE_SECONDS
+                if not self._cond.wait(timeout) and not self._heap:
+                    return None
+
+    def _connect(self):
+        conn = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            conn.starttls()
+        if SMTP_PASSWORD:
+            conn.login(SMTP_EMAIL, SMTP_PASSWORD)
+        return conn
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _close_if_idle(self):
+        if self._conn is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+            self._close()
+
+    def _send(self, message):
+        if self._conn is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+            self._close()
+        if self._conn is None:
+            self._conn = self._connect()
+        try:
+            self._conn.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Pooled connection went stale; reconnect once before counting a failure.
+            self._conn = self._connect()
+            self._conn.send_message(message)
+        self._last_used = time.monotonic()
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                self._close_if_idle()
+                _prune_statuses()
+                continue
+            _, _, message_id, message, attempt, on_failure = item
+            self._record(message_id, "SENDING", attempts=attempt)
+            try:
+                self._send(message)
+            except Exception as e:
+                self._close()
+                if attempt < SMTP_MAX_ATTEMPTS:
+                    delay = SMTP_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+                    log.warning("Mail send failed; retrying", extra={
+                        "to": message["To"], "error": str(e), "attempt": attempt, "retry_in_seconds": delay,
+                    })
+                    self._record(message_id, "RETRYING", attempts=attempt, error=str(e))
+                    with self._cond:
+                        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), message_id, message, attempt + 1, on_failure))
+                    continue
+
+                log.error("Mail send failed; giving up", extra={"to": message["To"], "attempts": attempt, "error": str(e)})
+                self._record(message_id, "FAILED", attempts=attempt, error=str(e))
+                if on_failure is not None:
+                    on_failure(e)
+                continue
+
+            self._record(message_id, "SENT", attempts=attempt, error=None)
+            log.info("Mail sent", extra={"to": message["To"]})
+
+
+# ── Shared Status ──
+
+def _store_status(message_id, entry):
+    db = SessionLocal()
+    try:
+        db.merge(models.MailDelivery(
+            message_id=message_id,
+            status=entry["status"],
+            attempts=entry.get("attempts", 0),
+            error=entry.get("error"),
+            updated_at=datetime.utcnow(),
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        log.warning("Mail status store failed", extra={"message_id": message_id, "error": str(e)})
+    finally:
+        db.close()
+
+
+def _load_status(message_id):
+    db = SessionLocal()
+    try:
+        row = db.get(models.MailDelivery, message_id)
+        if row is None:
+            return None
+        return {"status": row.status, "attempts": row.attempts, "error": row.error}
+    except Exception as e:
+        log.warning("Mail status lookup failed", extra={"message_id": message_id, "error": str(e)})
+        return None
+    finally:
+        db.close()
+
+
+def _prune_statuses():
+    cutoff = datetime.utcnow() - timedelta(hours=MAIL_STATUS_RETENTION_HOURS)
+    db = SessionLocal()
+    try:
+        db.query(models.MailDelivery).filter(models.MailDelivery.updated_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        log.warning("Mail status prune failed", extra={"error": str(e)})
+    finally:
+        db.close()
+
+
+mail_queue = MailQueue()
+
+
+def send(message, on_failure=None) -> str:
+    return mail_queue.submit(message, on_failure=on_failure)
+
+
+def delivery_status(message_id) -> str:
+    if not message_id:
+        return "UNKNOWN"
+    return mail_queue.status(message_id)["status"]
@@ -1,21 +1,28 @@
 from fastapi import FastAPI, UploadFile, Form, Depends, Request, File
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from pathlib import Path
-import shutil
 
 from starlette.middleware.sessions import SessionMiddleware
 
-from database import SessionLocal, engine
-import models, crud
-from ai_detector import detect_issue
-from auth import hash_password, verify_password, generate_otp, otp_expiry, is_otp_valid, send_otp_email
+from database import SessionLocal, engine, get_db, get_async_db
+import models, crud, classifier, detection_cache, ingest, blobstore, thumbnails, mailer, geo, dedup, events, api, report_sync, yolo_rules, telemetry, principals, pages, migrations
+from auth import (
+    hash_password_async, verify_password_async, needs_rehash, HashingBusy, hashing_stats,
+    generate_otp, otp_expiry, is_otp_valid, send_otp_email,
+)
+from starlette.concurrency import run_in_threadpool
 
-from fastapi.templating import Jinja2Templates
-from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+import hmac
+import logging
+import math
 import os
 
+telemetry.configure_logging()
+log = logging.getLogger(__name__)
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 TEMPLATE_DIR = BASE_DIR / "frontend" / "templates"
@@ -23,64 +30,127 @@ STATIC_DIR = BASE_DIR / "frontend" / "static"
 UPLOAD_DIR = STATIC_DIR / "uploads"
 
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-templates = Jinja2Templates(directory=str(TEMPLATE_DIR))
+templates = pages.build_templates(TEMPLATE_DIR)
+
+
+image_url = blobstore.url_for
+
+
+def thumb_url(name, width: int, fmt: str = "jpg"):
+    """URL for a resized copy of a blob; legacy files fall back to the original."""
+    if blobstore.is_blob_key(name):
+        return f"/thumbs/{width}/{fmt}/{name}"
+    return image_url(name)
+
 
-models.Base.metadata.create_all(bind=engine)
+def thumb_srcset(name, fmt: str = "jpg"):
+    """srcset listing every standard derivative width, or "" for legacy files."""
+    if not blobstore.is_blob_key(name):
+        return ""
+    return ", ".join(f"{thumb_url(name, w, fmt)} {w}w" for w in thumbnails.THUMBNAIL_WIDTHS)
+
+templates.env.globals["image_url"] = image_url
+templates.env.globals["thumb_url"] = thumb_url
+templates.env.globals["thumb_srcset"] = thumb_srcset
+
+migrations.migrate(engine)
 
 app = FastAPI()
+app.add_middleware(
+    ingest.BodySizeLimitMiddleware,
+    max_bytes=ingest.MAX_REQUEST_BYTES,
+    path_limits={"/report/batch": ingest.MAX_BATCH_REQUEST_BYTES},
+)
 app.add_middleware(
     SessionMiddleware,
     secret_key=os.getenv("SESSION_SECRET", "civic-monitor-secret-key-2026-change-in-prod"),
     https_only=os.getenv("RENDER") == "true",
     same_site="lax",
 )
+# Added last so it is the outermost middleware and also times rejected requests
+app.add_middleware(telemetry.MetricsMiddleware)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+app.include_router(api.router)
+
 
-def get_db():
+@app.on_event("startup")
+def start_background_workers():
     db = SessionLocal()
     try:
-        yield db
+        crud.ensure_issue_stats(db)
     finally:
         db.close()
+    # Compile the YOLO rule table now so a bad rules file fails the deploy, not the first report.
+    yolo_rules.get_rules()
+    pages.precompile(templates)
+    classifier.start_workers()
+    telemetry.start_flusher()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    classifier.stop_workers()
 
 
 # ── Auth Helpers ──
 
-def get_current_user(request: Request, db: Session):
-    """Get current logged-in user from session, or None."""
-    user_id = request.session.get("user_id")
-    if not user_id:
-        return None
-    return db.query(models.User).filter(models.User.id == user_id).first()
+# Handlers take `user=Depends(principals.current_user)`: the logged-in principal,
+# resolved once per request from the per-process principal cache.
 
-def require_login(request: Request):
+def require_login(user):
     """Redirect to login if not authenticated."""
-    if not request.session.get("user_id"):
+    if user is None:
         return RedirectResponse("/", status_code=302)
     return None
 
 
-def require_role(request: Request, *allowed_roles: str):
+def require_role(user, *allowed_roles: str):
     """Redirect to dashboard when the logged-in user lacks the required role."""
-    redirect = require_login(request)
+    redirect = require_login(user)
     if redirect:
         return redirect
 
-    if request.session.get("user_role") not in allowed_roles:
+    if user.role not in allowed_roles:
         return RedirectResponse("/dashboard", status_code=302)
     return None
 
 
-def save_upload_file(upload: UploadFile) -> str:
-    """Persist an uploaded file using a safe filename and return that filename."""
-    filename = Path(upload.filename or "").name
-    if not filename:
-        raise ValueError("No filename provided")
+def read_upload(upload: UploadFile):
+    """
+    Stream an upload through the size-bounded ingest stage (CPU-bound; call it from
+    the threadpool in async handlers). Returns ingest.IngestedImage.
+    Raises ingest.UploadTooLarge / ingest.InvalidImage.
+    """
+    return ingest.process_image(ingest.read_limited(upload.file))
+
+
+def write_image(image, filename: str) -> str:
+    """
+    Write an ingested image to the blob store and return its key (file I/O only;
+    async handlers call it in the threadpool). Take the reference with
+    blobstore.add_reference inside run_sync, then blobstore.write again after the
+    commit in case a concurrent collect() removed the file (see blobstore.put).
+    """
+    key = blobstore.key_for(image.display, image.extension or Path(filename).suffix)
+    blobstore.write(key, image.display)
+    return key
+
+
+def remember_otp_delivery(request: Request, message_id):
+    request.session["otp_email_sent"] = message_id is not None
+    request.session["otp_message_id"] = message_id
+
 
-    file_path = UPLOAD_DIR / filename
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload.file, buffer)
-    return filename
+def otp_email_sent(request: Request) -> bool:
+    """False when email is not configured or delivery has definitively failed (demo OTP is shown)."""
+    if not request.session.get("otp_email_sent", False):
+        return False
+    return mailer.delivery_status(request.session.get("otp_message_id")) != "FAILED"
+
+
+def upload_error_response(error: Exception):
+    status_code = 413 if isinstance(error, ingest.UploadTooLarge) else 400
+    return JSONResponse(status_code=status_code, content={"error": str(error)})
 
 
 # ══════════════════════════════════════
@@ -88,43 +158,56 @@ def save_upload_file(upload: UploadFile) -> str:
 # ══════════════════════════════════════
 
 @app.get("/", response_class=HTMLResponse)
-def login_page(request: Request):
+def login_page(request: Request, user=Depends(principals.current_user)):
     # If already logged in, redirect to dashboard
-    if request.session.get("user_id"):
+    if user is not None:
         return RedirectResponse("/dashboard", status_code=302)
-    return templates.TemplateResponse(request=request, name="login.html", context={"request": request, "error": None})
+    return pages.shell(templates, request, "login.html", error=None)
 
 @app.post("/login")
-def do_login(request: Request, email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == email).first()
+async def do_login(request: Request, email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+    # Handler is async so the request does not hold a threadpool thread while bcrypt
+    # runs on its own pool; the short DB steps are pushed to the threadpool.
+    user = await run_in_threadpool(lambda: db.query(models.User).filter(models.User.email == email).first())
 
     if not user:
         return templates.TemplateResponse(request=request, name="login.html", context={"request": request, "error": "No account found with this email"})
 
-    if not verify_password(password, user.password_hash):
+    try:
+        password_ok = await verify_password_async(password, user.password_hash)
+        # Transparently upgrade hashes made with a different BCRYPT_ROUNDS
+        new_hash = await hash_password_async(password) if password_ok and needs_rehash(user.password_hash) else None
+    except HashingBusy:
+        return templates.TemplateResponse(request=request, name="login.html", status_code=503, context={"request": request, "error": "Server is busy, please try again in a moment"})
+
+    if not password_ok:
         return templates.TemplateResponse(request=request, name="login.html", context={"request": request, "error": "Incorrect password"})
 
     # Generate and send OTP
     otp = generate_otp()
+    user_id = user.id
+    if new_hash:
+        user.password_hash = new_hash
     user.otp_code = otp
     user.otp_expiry = otp_expiry()
-    db.commit()
+    await run_in_threadpool(db.commit)
 
-    email_sent = send_otp_email(user.email, otp)
+    message_id = send_otp_email(email, otp)
 
     # Store pending user in session
-    request.session["pending_user_id"] = user.id
-    request.session["otp_email_sent"] = email_sent
+    request.session["pending_user_id"] = user_id
+    request.session["pending_email"] = email
+    remember_otp_delivery(request, message_id)
 
     return RedirectResponse("/verify-otp", status_code=302)
 
 
 @app.get("/register", response_class=HTMLResponse)
 def register_page(request: Request):
-    return templates.TemplateResponse(request=request, name="register.html", context={"request": request, "error": None})
+    return pages.shell(templates, request, "register.html", error=None)
 
 @app.post("/register")
-def do_register(
+async def do_register(
     request: Request,
     name: str = Form(...),
     email: str = Form(...),
@@ -134,33 +217,39 @@ def do_register(
     db: Session = Depends(get_db)
 ):
     # Check if email exists
-    existing = db.query(models.User).filter(models.User.email == email).first()
+    existing = await run_in_threadpool(lambda: db.query(models.User).filter(models.User.email == email).first())
     if existing:
         return templates.TemplateResponse(request=request, name="register.html", context={"request": request, "error": "Email already registered"})
 
-    # Create user
+    try:
+        password_hash = await hash_password_async(password)
+    except HashingBusy:
+        return templates.TemplateResponse(request=request, name="register.html", status_code=503, context={"request": request, "error": "Server is busy, please try again in a moment"})
+
+    # Create user with its first OTP
+    otp = generate_otp()
     user = models.User(
         name=name,
         email=email,
-        password_hash=hash_password(password),
+        password_hash=password_hash,
         role=role,
         ward=ward,
-        is_verified=False
+        is_verified=False,
+        otp_code=otp,
+        otp_expiry=otp_expiry(),
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    def save_user():
+        db.add(user)
+        db.commit()
+        return user.id
 
-    # Generate OTP
-    otp = generate_otp()
-    user.otp_code = otp
-    user.otp_expiry = otp_expiry()
-    db.commit()
+    user_id = await run_in_threadpool(save_user)
 
-    email_sent = send_otp_email(user.email, otp)
+    message_id = send_otp_email(email, otp)
 
-    request.session["pending_user_id"] = user.id
-    request.session["otp_email_sent"] = email_sent
+    request.session["pending_user_id"] = user_id
+    request.session["pending_email"] = email
+    remember_otp_delivery(request, message_id)
 
     return RedirectResponse("/verify-otp", status_code=302)
 
@@ -171,16 +260,19 @@ def verify_otp_page(request: Request, db: Session = Depends(get_db)):
     if not pending_id:
         return RedirectResponse("/", status_code=302)
 
-    user = db.query(models.User).filter(models.User.id == pending_id).first()
-    email_sent = request.session.get("otp_email_sent", False)
-
-    # For demo: show OTP if email not configured
-    demo_otp = user.otp_code if not email_sent else None
+    email_sent = otp_email_sent(request)
+    email = request.session.get("pending_email")
+    demo_otp = None
+    if not email_sent or not email:
+        # For demo: show OTP if email not configured
+        user = db.get(models.User, pending_id)
+        email = user.email
+        demo_otp = user.otp_code if not email_sent else None
 
     return templates.TemplateResponse(request=request, name="verify_otp.html", context={
         "request": request,
         "error": None,
-        "email": user.email,
+        "email": email,
         "email_sent": email_sent,
         "demo_otp": demo_otp
     })
@@ -191,10 +283,10 @@ def do_verify_otp(request: Request, otp: str = Form(...), db: Session = Depends(
     if not pending_id:
         return RedirectResponse("/", status_code=302)
 
-    user = db.query(models.User).filter(models.User.id == pending_id).first()
+    user = db.get(models.User, pending_id)
 
     if not user or user.otp_code != otp:
-        email_sent = request.session.get("otp_email_sent", False)
+        email_sent = otp_email_sent(request)
         demo_otp = user.otp_code if not email_sent else None
         return templates.TemplateResponse(request=request, name="verify_otp.html", context={
             "request": request,
@@ -205,7 +297,7 @@ def do_verify_otp(request: Request, otp: str = Form(...), db: Session = Depends(
         })
 
     if not is_otp_valid(user.otp_expiry):
-        email_sent = request.session.get("otp_email_sent", False)
+        email_sent = otp_email_sent(request)
         demo_otp = user.otp_code if not email_sent else None
         return templates.TemplateResponse(request=request, name="verify_otp.html", context={
             "request": request,
@@ -223,28 +315,36 @@ def do_verify_otp(request: Request, otp: str = Form(...), db: Session = Depends(
 
     # Clear pending, set logged in
     request.session.pop("pending_user_id", None)
+    request.session.pop("pending_email", None)
     request.session.pop("otp_email_sent", None)
+    request.session.pop("otp_message_id", None)
     request.session["user_id"] = user.id
-    request.session["user_role"] = user.role
-    request.session["user_name"] = user.name
+    principals.remember(principals.Principal.from_user(user))
 
     return RedirectResponse("/dashboard", status_code=302)
 
 
+@app.get("/otp-status")
+def otp_status(request: Request):
+    if not request.session.get("pending_user_id"):
+        return JSONResponse(status_code=401, content={"error": "No pending verification"})
+    return {"status": mailer.delivery_status(request.session.get("otp_message_id"))}
+
+
 @app.get("/resend-otp")
 def resend_otp(request: Request, db: Session = Depends(get_db)):
     pending_id = request.session.get("pending_user_id")
     if not pending_id:
         return RedirectResponse("/", status_code=302)
 
-    user = db.query(models.User).filter(models.User.id == pending_id).first()
+    user = db.get(models.User, pending_id)
     otp = generate_otp()
     user.otp_code = otp
     user.otp_expiry = otp_expiry()
     db.commit()
 
-    email_sent = send_otp_email(user.email, otp)
-    request.session["otp_email_sent"] = email_sent
+    message_id = send_otp_email(user.email, otp)
+    remember_otp_delivery(request, message_id)
 
     return RedirectResponse("/verify-otp", status_code=302)
 
@@ -256,10 +356,10 @@ def logout(request: Request):
 
 
 @app.get("/dashboard")
-def dashboard(request: Request):
-    role = request.session.get("user_role")
-    if not role:
+def dashboard(request: Request, user=Depends(principals.current_user)):
+    if user is None:
         return RedirectResponse("/", status_code=302)
+    role = user.role
     if role == "surveyor":
         return RedirectResponse("/surveyor", status_code=302)
     if role == "engineer":
@@ -272,217 +372,504 @@ def dashboard(request: Request):
 # ══════════════════════════════════════
 
 @app.get("/surveyor", response_class=HTMLResponse)
-def surveyor(request: Request):
-    redirect = require_role(request, "surveyor")
+def surveyor(request: Request, user=Depends(principals.current_user)):
+    redirect = require_role(user, "surveyor")
     if redirect:
         return redirect
-    return (TEMPLATE_DIR / "surveyor.html").read_text(encoding="utf-8")
+    return pages.shell(templates, request, "surveyor.html")
 
 @app.post("/report")
-def report_issue(
+async def report_issue(
     request: Request,
     latitude: str = Form(None),
     longitude: str = Form(None),
     image: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db=Depends(get_async_db),
+    user=Depends(principals.current_user),
 ):
-    redirect = require_role(request, "surveyor")
+    redirect = require_role(user, "surveyor")
     if redirect:
         return redirect
 
     if not image.filename:
         return JSONResponse(status_code=400, content={"error": "No image uploaded"})
 
-    # Ensure coords are floats or default to a fixed point if invalid
+    # Ensure coords are finite floats or default to a fixed point if invalid
     try:
         lat_f = float(latitude) if latitude else 22.30
         lon_f = float(longitude) if longitude else 70.80
+        if not (math.isfinite(lat_f) and math.isfinite(lon_f)):
+            raise ValueError("non-finite coordinates")
     except (ValueError, TypeError):
         lat_f = 22.30
         lon_f = 70.80
 
-    filename = save_upload_file(image)
-    image_path = UPLOAD_DIR / filename
+    try:
+        with telemetry.span("upload"):
+            ingested = await run_in_threadpool(read_upload, image)
+    except (ingest.UploadTooLarge, ingest.InvalidImage) as e:
+        return upload_error_response(e)
+
+    reporter_id = user.id
+
+    # An image we have already classified needs no inference, and can be matched
+    # against nearby open issues straight away.
+    with telemetry.span("detect", backend="cache"):
+        cache_key = await run_in_threadpool(detection_cache.key_for_bytes, ingested.inference)
+        cached = await run_in_threadpool(detection_cache.get, cache_key)
+
+    with telemetry.span("store_image"):
+        filename = await run_in_threadpool(write_image, ingested, image.filename)
+
+    def create(db):
+        blobstore.add_reference(db, filename, len(ingested.display))
+
+        if cached is not None:
+            canonical = dedup.find_duplicate(db, cached[0], lat_f, lon_f)
+            if canonical is not None:
+                dedup.attach_report(db, canonical, filename, lat_f, lon_f, reporter_id)
+                events.publish(db, "updated", canonical, crud.stat_key(canonical))
+                with telemetry.span("db_commit"):
+                    db.commit()
+                return {
+                    "message": "Issue already reported nearby; added as a corroborating report",
+                    "issue_id": canonical.id,
+                    "duplicate_of": canonical.id,
+                    "classification_status": canonical.classification_status,
+                }
+
+        with telemetry.span("ward_lookup"):
+            ward = crud.detect_ward(lat_f, lon_f)
+        issue = models.Issue(
+            issue_type=classifier.PENDING_ISSUE_TYPE,
+            ward=ward,
+            before_image=filename,
+            latitude=lat_f,
+            longitude=lon_f,
+            status="OPEN",
+            reporter_id=reporter_id,
+            **geo.tile_columns(lat_f, lon_f)
+        )
+
+        db.add(issue)
+        if cached is not None:
+            issue.issue_type, issue.priority, issue.ai_confidence, issue.ai_reasoning = cached
+            issue.classification_status = "DONE"
+        else:
+            # Classification runs in the background worker pool; the surveyor page polls
+            # /report/{id}/status until it completes.
+            classifier.enqueue(db, issue, str(blobstore.blob_path(filename)),
+                               image_bytes=ingested.inference, cache_key=cache_key)
+        crud.record_issue_change(db, after=crud.stat_key(issue))
+        db.flush()
+        events.publish(db, "created", issue)
+        with telemetry.span("db_commit"):
+            db.commit()
+        return {
+            "message": "Issue reported successfully",
+            "issue_id": issue.id,
+            "classification_status": issue.classification_status,
+        }
+
+    with telemetry.span("create_issue"):
+        try:
+            result = await db.run_sync(create)
+        except Exception:
+            await run_in_threadpool(blobstore.discard, filename)
+            raise
+    await run_in_threadpool(blobstore.write, filename, ingested.display)
+    classifier.notify()
+    thumbnails.pregenerate(filename)
+    return result
+
+@app.post("/report/batch")
+async def report_batch(request: Request, db: Session = Depends(get_db), user=Depends(principals.current_user)):
+    """
+    Offline sync: many reports in one request (see report_sync for the format).
+    Returns one result per manifest item so the client can resend only the failures.
+    """
+    redirect = require_role(user, "surveyor")
+    if redirect:
+        return JSONResponse(status_code=401, content={"error": "Not logged in as a surveyor"})
+    reporter_id = user.id
 
-    issue_type, priority, confidence, reasoning = detect_issue(str(image_path))
-    ward = crud.detect_ward(lat_f, lon_f)
+    form = await request.form(max_files=report_sync.BATCH_MAX_ITEMS + 1)
+    try:
+        archive = form.get("archive")
+        if archive is not None and hasattr(archive, "file"):
+            images = report_sync.ZipImages(archive.file)
+            items = report_sync.parse_manifest(images.manifest())
+            open_image = images.open
+        else:
+            items = report_sync.parse_manifest(form.get("manifest"))
+
+            def open_image(name):
+                upload = form.get(name)
+                return upload.file if hasattr(upload, "file") else None
+
+        def store():
+            results, blobs = report_sync.sync_reports(db, reporter_id, items, open_image)
+            db.commit()
+            # Files only once the references are committed; see sync_reports
+            for key, data in blobs.items():
+                blobstore.write(key, data)
+            return results, list(blobs)
+
+        try:
+            results, keys = await run_in_threadpool(store)
+        except IntegrityError:
+            # Another upload of the same batch committed first; a retry reports them as already_synced.
+            await run_in_threadpool(db.rollback)
+            return JSONResponse(status_code=409, content={"error": "These reports are being synced by another request; retry"})
+    except report_sync.BatchError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    finally:
+        await form.close()
+
+    if keys:
+        classifier.notify()
+        for key in keys:
+            thumbnails.pregenerate(key)
+
+    return {
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
+    }
+
+@app.get("/blobs/{key}")
+def serve_blob(request: Request, key: str):
+    """Serve an uploaded image. Content never changes for a key, so it is cacheable forever."""
+    if not blobstore.is_blob_key(key):
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+
+    etag = f'"{blobstore.digest_of(key)}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    if pages.etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    path = blobstore.blob_path(key)
+    if not path.exists():
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    return FileResponse(path, headers=headers)
+
+@app.get("/thumbs/{width}/{fmt}/{key}")
+async def serve_thumbnail(request: Request, width: int, fmt: str, key: str):
+    """Serve a resized copy of a blob, generating and caching it on first request."""
+    if (
+        width not in thumbnails.THUMBNAIL_WIDTHS
+        or fmt not in thumbnails.THUMBNAIL_FORMATS
+        or not blobstore.is_blob_key(key)
+    ):
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+
+    headers = {
+        "ETag": f'"{blobstore.digest_of(key)}-{width}-{fmt}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if pages.etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
 
-    issue = models.Issue(
-        issue_type=issue_type,
-        priority=priority,
-        ward=ward,
-        before_image=filename,
-        latitude=lat_f,
-        longitude=lon_f,
-        ai_confidence=confidence,
-        ai_reasoning=reasoning,
-        status="OPEN"
+    try:
+        path = await thumbnails.get_path(key, width, fmt)
+    except thumbnails.DerivativeUnavailable:
+        return RedirectResponse(f"/blobs/{key}", status_code=302)
+
+    return FileResponse(
+        path,
+        media_type="image/webp" if fmt == "webp" else "image/jpeg",
+        headers=headers,
     )
 
-    db.add(issue)
-    db.commit()
+@app.get("/report/{issue_id}/status")
+async def report_status(request: Request, issue_id: int, db=Depends(get_async_db), user=Depends(principals.current_user)):
+    redirect = require_login(user)
+    if redirect:
+        return JSONResponse(status_code=401, content={"error": "Not logged in"})
+
+    def load(db):
+        issue = db.get(models.Issue, issue_id)
+        duplicate_of = None
+        if issue is None:
+            # The report may have been merged into an earlier issue after classification.
+            duplicate_of = dedup.resolve_merged(db, issue_id)
+            issue = db.get(models.Issue, duplicate_of) if duplicate_of is not None else None
+        return issue, duplicate_of
+
+    issue, duplicate_of = await db.run_sync(load)
+    if issue is None:
+        return JSONResponse(status_code=404, content={"error": f"Issue #{issue_id} not found"})
 
-    return {"message": "Issue reported successfully"}
+    return {
+        "issue_id": issue.id,
+        "duplicate_of": duplicate_of,
+        "report_count": issue.report_count,
+        "classification_status": issue.classification_status,
+        "issue_type": issue.issue_type,
+        "priority": issue.priority,
+        "ai_confidence": issue.ai_confidence,
+        "ai_reasoning": issue.ai_reasoning,
+    }
+
+ENGINEER_PAGE_SIZE = int(os.getenv("ENGINEER_PAGE_SIZE", "24"))
 
 @app.get("/engineer", response_class=HTMLResponse)
-def engineer(request: Request, db: Session = Depends(get_db)):
-    redirect = require_role(request, "engineer")
+async def engineer(
+    request: Request,
+    ward: str = None,
+    priority: str = None,
+    cursor: str = None,
+    db=Depends(get_async_db),
+    user=Depends(principals.current_user),
+):
+    redirect = require_role(user, "engineer")
     if redirect:
         return redirect
 
-    issues = db.query(models.Issue).filter(models.Issue.status != "CLOSED").all()
-
-    html = (TEMPLATE_DIR / "engineer.html").read_text(encoding="utf-8")
-    rows = ""
+    if priority not in crud.PRIORITIES:
+        priority = None
 
-    for i in issues:
-        if i.latitude is not None and i.longitude is not None:
-            maps_link = f"https://www.google.com/maps/dir/?api=1&destination={i.latitude},{i.longitude}"
+    def load(db):
+        # Default to the engineer's own ward; "?ward=all" shows every ward.
+        if ward is None:
+            ward_filter = user.ward or None
+        elif ward.isdigit():
+            ward_filter = int(ward)
         else:
-            maps_link = "#"
-
-        if i.status == "OPEN":
-            status_badge = '<span class="badge badge-open">🔓 Open</span>'
-            action_html = f"""
-            <form action="/start/{i.id}" method="post">
-                <button class="btn btn-primary" style="width:100%;">▶ Start Work</button>
-            </form>
-            """
-        elif i.status == "IN_PROGRESS":
-            status_badge = '<span class="badge badge-progress">🔄 In Progress</span>'
-            action_html = f"""
-            <form action="/close/{i.id}" method="post" enctype="multipart/form-data">
-                <div class="file-input-wrap">
-                    <input type="file" name="image" required class="file-input">
-                    <button class="btn btn-green" style="width:100%;">✅ Mark Resolved</button>
-                </div>
-            </form>
-            """
-        else:
-            status_badge = '<span class="badge badge-closed">✅ Closed</span>'
-            action_html = ""
-
-        rows += f"""
-        <div class="issue-card glass">
-            <div class="issue-img-wrap">
-                <img src="/static/uploads/{i.before_image}" class="issue-img" alt="Issue image">
-                <div class="issue-img-overlay"></div>
-            </div>
-            <div class="issue-body">
-                <div class="issue-header">
-                    <span class="issue-type">{i.issue_type}</span>
-                    {status_badge}
-                </div>
-                <span class="issue-ward">📍 Ward {i.ward}</span>
-                <div class="issue-actions">
-                    <a href="{maps_link}" target="_blank" class="btn btn-nav">📍 Navigate</a>
-                </div>
-                {action_html}
-            </div>
-        </div>
-        """
-
-    return html.replace("{{ROWS}}", rows)
+            ward_filter = None
+
+        issues, next_cursor = crud.list_issues(
+            db,
+            statuses=crud.OPEN_STATUSES,
+            ward=ward_filter,
+            priority=priority,
+            cursor=cursor,
+            limit=ENGINEER_PAGE_SIZE,
+        )
+        return ward_filter, issues, next_cursor
+
+    ward_filter, issues, next_cursor = await db.run_sync(load)
+
+    return pages.stream(templates, request, "engineer.html", {
+        "issues": issues,
+        "ward": ward_filter,
+        "priority": priority,
+        "priorities": crud.PRIORITIES,
+        "next_cursor": next_cursor,
+        "is_first_page": cursor is None,
+    })
 
 
 @app.post("/close/{issue_id}")
-def close_issue(request: Request, issue_id: int, image: UploadFile = File(...), db: Session = Depends(get_db)):
-    redirect = require_role(request, "engineer")
+async def close_issue(request: Request, issue_id: int, image: UploadFile = File(...), db=Depends(get_async_db), user=Depends(principals.current_user)):
+    redirect = require_role(user, "engineer")
     if redirect:
         return redirect
 
     if not image.filename:
         return JSONResponse(status_code=400, content={"error": "No image uploaded"})
 
-    filename = save_upload_file(image)
-    issue = db.get(models.Issue, issue_id)
-    if issue is None:
-        return JSONResponse(status_code=404, content={"error": f"Issue #{issue_id} not found"})
+    try:
+        ingested = await run_in_threadpool(read_upload, image)
+    except (ingest.UploadTooLarge, ingest.InvalidImage) as e:
+        return upload_error_response(e)
+
+    filename = await run_in_threadpool(write_image, ingested, image.filename)
+
+    def close(db):
+        issue = db.get(models.Issue, issue_id, with_for_update=True)
+        if issue is None:
+            return False, None
+
+        blobstore.add_reference(db, filename, len(ingested.display))
+        before = crud.stat_key(issue)
+        replaced = issue.after_image
+        blobstore.release(db, replaced)
+        issue.after_image = filename
+        issue.status = "CLOSED"
+        crud.record_issue_change(db, before, crud.stat_key(issue))
+        events.publish(db, "closed", issue, before)
+        db.commit()
+        return True, replaced
 
-    issue.after_image = filename
-    issue.status = "CLOSED"
-    db.commit()
+    try:
+        found, replaced = await db.run_sync(close)
+    except Exception:
+        await run_in_threadpool(blobstore.discard, filename)
+        raise
+    if not found:
+        await run_in_threadpool(blobstore.discard, filename)
+        return JSONResponse(status_code=404, content={"error": f"Issue #{issue_id} not found"})
+    await run_in_threadpool(blobstore.write, filename, ingested.display)
+    await run_in_threadpool(blobstore.collect_keys, [replaced])
+    thumbnails.pregenerate(filename)
 
     return RedirectResponse("/engineer", 302)
 
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+
 @app.get("/admin", response_class=HTMLResponse)
-def admin(request: Request, db: Session = Depends(get_db)):
-    redirect = require_role(request, "admin")
+async def admin(request: Request, cursor: str = None, db=Depends(get_async_db), user=Depends(principals.current_user)):
+    redirect = require_role(user, "admin")
     if redirect:
         return redirect
 
-    issues = db.query(models.Issue).all()
+    def load(db):
+        stats = crud.summarize_counts(crud.rollup_counts(db))
+        issues, next_cursor = crud.list_issues(db, cursor=cursor, limit=ADMIN_PAGE_SIZE)
+        return stats, issues, next_cursor
+
+    stats, issues, next_cursor = await db.run_sync(load)
+
+    return pages.stream(templates, request, "admin.html", {
+        **stats,
+        "issues": issues,
+        "next_cursor": next_cursor,
+        "is_first_page": cursor is None,
+        "critical_types": crud.CRITICAL_TYPES,
+    }, headers={
+        "Cache-Control": "no-cache, no-store, must-revalidate",
+        "Pragma": "no-cache",
+        "Expires": "0",
+    })
+
+# ══════════════════════════════════════
+#   LIVE UPDATES
+# ══════════════════════════════════════
 
-    total = len(issues)
-    open_count = sum(1 for i in issues if i.status == "OPEN")
-    closed_count = sum(1 for i in issues if i.status == "CLOSED")
-    critical_count = sum(
-        1 for i in issues if i.issue_type in ["Stray Cattle", "Open Manhole"]
+@app.get("/events")
+async def issue_events(request: Request, ward: str = None, user=Depends(principals.current_user)):
+    """Server-sent issue events for the engineer and admin dashboards; ?ward=N filters by ward."""
+    if user is None or user.role not in ("engineer", "admin"):
+        return JSONResponse(status_code=401, content={"error": "Not logged in"})
+
+    sub = events.broker.subscribe(ward=int(ward) if ward and ward.isdigit() else None)
+    return StreamingResponse(
+        events.stream(sub, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    ward_stats = []
-    wards = set(i.ward for i in issues)
-    for w in wards:
-        ward_issues = [i for i in issues if i.ward == w]
-        ward_stats.append({
-            "ward": w,
-            "total": len(ward_issues),
-            "open": sum(1 for i in ward_issues if i.status == "OPEN"),
-            "closed": sum(1 for i in ward_issues if i.status == "CLOSED")
-        })
+@app.get("/engineer/issues/{issue_id}/card", response_class=HTMLResponse)
+def engineer_issue_card(request: Request, issue_id: int, db: Session = Depends(get_db), user=Depends(principals.current_user)):
+    """One rendered task card, fetched by the engineer page when an event arrives."""
+    redirect = require_role(user, "engineer")
+    if redirect:
+        return redirect
 
-    type_stats = {}
-    for i in issues:
-        type_stats[i.issue_type] = type_stats.get(i.issue_type, 0) + 1
+    issue = db.get(models.Issue, issue_id)
+    if issue is None or issue.status not in crud.OPEN_STATUSES:
+        return HTMLResponse(status_code=404, content="")
+    return templates.TemplateResponse(request=request, name="_issue_card.html", context={"request": request, "i": issue})
+
+@app.get("/admin/issues/{issue_id}/row", response_class=HTMLResponse)
+def admin_issue_row(request: Request, issue_id: int, db: Session = Depends(get_db), user=Depends(principals.current_user)):
+    """One rendered issue row, fetched by the admin page when an event arrives."""
+    redirect = require_role(user, "admin")
+    if redirect:
+        return redirect
 
-    type_stats_list = [
-        {"issue_type": k, "count": v} for k, v in type_stats.items()
-    ]
+    issue = db.get(models.Issue, issue_id)
+    if issue is None:
+        return HTMLResponse(status_code=404, content="")
+    return templates.TemplateResponse(request=request, name="_admin_issue_row.html", context={"request": request, "issue": issue})
 
-    response = templates.TemplateResponse(request=request, name="admin.html", context={
-            "request": request,
-            "total": total,
-            "open_count": open_count,
-            "closed_count": closed_count,
-            "critical_count": critical_count,
-            "ward_stats": ward_stats,
-            "type_stats": type_stats_list,
-            "issues": issues
-        })
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
+@app.get("/admin/events-stats")
+def events_stats(request: Request, user=Depends(principals.current_user)):
+    redirect = require_role(user, "admin")
+    if redirect:
+        return redirect
+    return events.broker.stats()
+
+@app.get("/admin/hashing-stats")
+def password_hashing_stats(request: Request, user=Depends(principals.current_user)):
+    redirect = require_role(user, "admin")
+    if redirect:
+        return redirect
+    return hashing_stats()
+
+@app.get("/admin/cache-stats")
+def cache_stats(request: Request, user=Depends(principals.current_user)):
+    redirect = require_role(user, "admin")
+    if redirect:
+        return redirect
+    return detection_cache.stats()
+
+@app.get("/admin/principal-cache-stats")
+def principal_cache_stats(request: Request, user=Depends(principals.current_user)):
+    redirect = require_role(user, "admin")
+    if redirect:
+        return redirect
+    return principals.stats()
+
+@app.get("/metrics")
+def metrics(request: Request):
+    """
+    Prometheus scrape endpoint, behind `Authorization: Bearer <METRICS_TOKEN>`.
+    Without a token it is open for local development and hidden (404) on Render.
+    """
+    if not telemetry.METRICS_TOKEN:
+        if os.getenv("RENDER") == "true":
+            return JSONResponse(status_code=404, content={"error": "Not found"})
+    elif not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {telemetry.METRICS_TOKEN}"):
+        return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+    return Response(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
 
 @app.post("/start/{issue_id}")
-def start_issue(request: Request, issue_id: int, db: Session = Depends(get_db)):
-    redirect = require_role(request, "engineer")
+async def start_issue(request: Request, issue_id: int, db=Depends(get_async_db), user=Depends(principals.current_user)):
+    redirect = require_role(user, "engineer")
     if redirect:
         return redirect
 
-    issue = db.get(models.Issue, issue_id)
-    if issue is None:
-        return JSONResponse(status_code=404, content={"error": f"Issue #{issue_id} not found"})
+    def start(db):
+        issue = db.get(models.Issue, issue_id, with_for_update=True)
+        if issue is None:
+            return False
 
-    issue.status = "IN_PROGRESS"
-    db.commit()
+        before = crud.stat_key(issue)
+        issue.status = "IN_PROGRESS"
+        crud.record_issue_change(db, before, crud.stat_key(issue))
+        events.publish(db, "started", issue, before)
+        db.commit()
+        return True
+
+    if not await db.run_sync(start):
+        return JSONResponse(status_code=404, content={"error": f"Issue #{issue_id} not found"})
     return RedirectResponse("/engineer", 302)
 
 @app.post("/delete_issue/{issue_id}")
-def delete_issue(request: Request, issue_id: int, db: Session = Depends(get_db)):
-    redirect = require_role(request, "admin")
+async def delete_issue(request: Request, issue_id: int, db=Depends(get_async_db), user=Depends(principals.current_user)):
+    redirect = require_role(user, "admin")
     if redirect:
         return redirect
 
-    user = get_current_user(request, db)
-    user_name = user.name if user else "Unknown"
-    
-    # Use direct query to ensure deletion and get affected rows
-    query = db.query(models.Issue).filter(models.Issue.id == issue_id)
-    affected_rows = query.delete(synchronize_session='fetch')
-    db.commit()
-    
-    print(f"DEBUG: Admin {user_name} (ID: {request.session.get('user_id')}) attempted to delete Issue ID {issue_id}. Affected rows: {affected_rows}")
+    def delete(db):
+        issue = db.get(models.Issue, issue_id, with_for_update=True)
+        released = []
+        if issue is not None:
+            crud.record_issue_change(db, before=crud.stat_key(issue))
+            events.publish(db, "deleted", issue, crud.stat_key(issue))
+            reports = db.query(models.IssueReport).filter(models.IssueReport.issue_id == issue_id).all()
+            released = [issue.before_image, issue.after_image] + [r.image for r in reports]
+            for key in released:
+                blobstore.release(db, key)
+            for report in reports:
+                db.delete(report)
+
+        # Use direct query to ensure deletion and get affected rows
+        query = db.query(models.Issue).filter(models.Issue.id == issue_id)
+        affected_rows = query.delete(synchronize_session='fetch')
+        db.query(models.ClassificationJob).filter(models.ClassificationJob.issue_id == issue_id).delete(synchronize_session=False)
+        db.commit()
+        return affected_rows, released
+
+    affected_rows, released = await db.run_sync(delete)
+    await run_in_threadpool(blobstore.collect_keys, released)
+
+    log.info("Issue deleted", extra={
+        "admin": user.name, "admin_id": user.id, "issue_id": issue_id, "affected_rows": affected_rows,
+    })
 
     if affected_rows > 0:
         return {"message": f"Issue #{issue_id} deleted successfully"}
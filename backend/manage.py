@@ -0,0 +1,167 @@
+"""
+Maintenance commands. Run from the backend directory:
+
+    python manage.py migrate
+    python manage.py rebuild-stats [--check]
+    python manage.py backfill-tiles
+    python manage.py eval-rules IMAGES_DIR [--rules FILE] [--detections CACHE.json]
+    python manage.py export-onnx [--int8]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from database import SessionLocal, engine
+import crud, migrations
+
+
+def migrate(args):
+    # main() has already run the migrations
+    print(f"Schema up to date ({len(args.applied)} step(s) applied)")
+    for step in args.applied:
+        print(f"  {step}")
+    return 0
+
+
+def rebuild_stats(args):
+    db = SessionLocal()
+    try:
+        drift = crud.rebuild_issue_stats(db, dry_run=args.check)
+    finally:
+        db.close()
+
+    for (ward, issue_type, status), found, expected in sorted(drift, key=str):
+        print(f"Ward {ward} / {issue_type} / {status}: rollup={found} actual={expected}")
+
+    verb = "Found" if args.check else "Repaired"
+    print(f"{verb} {len(drift)} drifted bucket(s)")
+    return 1 if args.check and drift else 0
+
+
+def backfill_tiles(args):
+    db = SessionLocal()
+    try:
+        updated = crud.backfill_tiles(db)
+    finally:
+        db.close()
+    print(f"Assigned tiles to {updated} issue(s)")
+    return 0
+
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def _labelled_images(root: Path):
+    """(expected issue_type, path) for every image under root/<issue type>/."""
+    for folder in sorted(p for p in root.iterdir() if p.is_dir()):
+        for path in sorted(folder.rglob("*")):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                yield folder.name, path
+
+
+def eval_rules(args):
+    """
+    Score a rule file against a folder of labelled images. YOLO detections are
+    cached in --detections, so after the first run rules can be tuned without
+    re-running the model.
+    """
+    import yolo_rules
+
+    root = Path(args.images)
+    cache_path = Path(args.detections) if args.detections else None
+    cache = json.loads(cache_path.read_text()) if cache_path and cache_path.exists() else {}
+
+    samples = []
+    detected = 0
+    detect_seconds = 0.0
+    for expected, path in _labelled_images(root):
+        key = str(path.relative_to(root))
+        if key not in cache:
+            from ai_detector import yolo_labels
+            start = time.perf_counter()
+            cache[key] = yolo_labels(path.read_bytes())
+            detect_seconds += time.perf_counter() - start
+            detected += 1
+        samples.append((expected, cache[key]))
+
+    if cache_path and detected:
+        cache_path.write_text(json.dumps(cache))
+    if not samples:
+        print(f"No images found under {root}/<issue type>/")
+        return 1
+
+    rules = yolo_rules.load(args.rules or yolo_rules.YOLO_RULES_FILE)
+    report = yolo_rules.evaluate(rules, samples)
+    if detected:
+        report["detections_per_sec"] = detected / detect_seconds
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"Samples:   {report['samples']}")
+    print(f"Accuracy:  {report['accuracy']:.1%}")
+    print(f"Rules:     {report['classifications_per_sec']:,.0f} classifications/sec")
+    if detected:
+        print(f"YOLO:      {report['detections_per_sec']:.1f} images/sec ({detected} new)")
+    print()
+    print(f"{'Issue type':40s} {'n':>5s} {'prec':>6s} {'recall':>6s}")
+    for issue_type, m in sorted(report["per_class"].items()):
+        print(f"{issue_type[:40]:40s} {m['support']:5d} {m['precision']:6.1%} {m['recall']:6.1%}")
+    if report["confusions"]:
+        print()
+        print("Top confusions:")
+        for c in report["confusions"][:10]:
+            print(f"  {c['count']:4d}  {c['expected']} -> {c['predicted']}")
+    print()
+    print("Rule hits:", ", ".join(f"{name}={n}" for name, n in sorted(report["rule_hits"].items(), key=str)))
+    return 0
+
+
+def export_onnx(args):
+    """Export yolov8s.pt for DETECTOR_BACKEND=onnx (and onnx-int8 with --int8)."""
+    import onnx_detector
+    from ai_detector import YOLO_MODEL_PATH
+
+    int8_path = onnx_detector.ONNX_INT8_MODEL_PATH if args.int8 else None
+    onnx_detector.export(YOLO_MODEL_PATH, onnx_detector.ONNX_MODEL_PATH, int8_path)
+    for path in filter(None, (onnx_detector.ONNX_MODEL_PATH, int8_path)):
+        print(f"Wrote {path} ({Path(path).stat().st_size / 1e6:.1f} MB)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Civic Monitoring maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="Create missing tables and add new columns and indexes")
+    p.set_defaults(func=migrate)
+
+    p = sub.add_parser("rebuild-stats", help="Recompute the issue_stats rollup from the issues table")
+    p.add_argument("--check", action="store_true", help="Report drift without repairing it")
+    p.set_defaults(func=rebuild_stats)
+
+    p = sub.add_parser("backfill-tiles", help="Fill the spatial tile columns for existing issues")
+    p.set_defaults(func=backfill_tiles)
+
+    p = sub.add_parser("eval-rules", help="Score the YOLO rule table against labelled images")
+    p.add_argument("images", help="Directory with one sub-folder of images per expected issue type")
+    p.add_argument("--rules", help="Rule file to evaluate (default: YOLO_RULES_FILE)")
+    p.add_argument("--detections", help="JSON file caching YOLO labels per image between runs")
+    p.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    p.set_defaults(func=eval_rules, needs_db=False)
+
+    p = sub.add_parser("export-onnx", help="Export the YOLO model to ONNX for the onnx detector backends")
+    p.add_argument("--int8", action="store_true", help="Also write an INT8-quantized copy")
+    p.set_defaults(func=export_onnx, needs_db=False)
+
+    args = parser.parse_args()
+    if getattr(args, "needs_db", True):
+        args.applied = migrations.migrate(engine)
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
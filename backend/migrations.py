@@ -0,0 +1,82 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+import models
+
+log = logging.getLogger(__name__)
+
+# ── Schema Migrations ──
+# create_all() creates missing tables but never alters an existing one, so columns
+# and indexes added to tables that predate them are listed here. Every step is
+# idempotent: a column is only added when the table lacks it and indexes use
+# CREATE INDEX IF NOT EXISTS, so migrate() can run on every deploy
+# (render-build.sh runs `python manage.py migrate`) and again at startup.
+#
+# On Postgres the whole run holds an advisory lock, so workers starting together
+# do not race each other's ALTER TABLE.
+
+# (table, column, column DDL). A DEFAULT here also fills the column on existing rows.
+COLUMNS = [
+    # Background classification queue: rows from before it existed are classified
+    ("issues", "classification_status", "VARCHAR(20) DEFAULT 'DONE'"),
+    # Spatial tiles; existing rows are filled by `manage.py backfill-tiles`
+    ("issues", "tile_x", "INTEGER"),
+    ("issues", "tile_y", "INTEGER"),
+    # Duplicate clustering: every existing issue stands for one report
+    ("issues", "reporter_id", "INTEGER"),
+    ("issues", "report_count", "INTEGER DEFAULT 1"),
+    # Detection cache key recorded at enqueue time; older jobs hash the image instead
+    ("classification_jobs", "cache_key", "VARCHAR(80)"),
+]
+
+# (index name, table, columns)
+INDEXES = [
+    # Engineer work queue and keyset pagination
+    ("ix_issues_status_ward_priority_created", "issues", ("status", "ward", "priority", "created_at")),
+    ("ix_issues_created_id", "issues", ("created_at", "id")),
+    ("ix_issues_tile", "issues", ("tile_x", "tile_y")),
+]
+
+_LOCK_KEY = 72_311_001
+
+
+def _add_column_sql(dialect: str, table: str, column: str, ddl: str) -> str:
+    if dialect == "postgresql":
+        return f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl}"
+    return f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"
+
+
+def migrate(engine):
+    """Create missing tables, then add missing columns and indexes. Returns the steps applied."""
+    models.Base.metadata.create_all(bind=engine)
+
+    applied = []
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+
+        inspector = inspect(conn)
+        existing = {}
+        for table, column, ddl in COLUMNS:
+            if table not in existing:
+                existing[table] = {c["name"] for c in inspector.get_columns(table)}
+            if column in existing[table]:
+                continue
+            conn.execute(text(_add_column_sql(dialect, table, column, ddl)))
+            existing[table].add(column)
+            applied.append(f"add column {table}.{column}")
+
+        indexes = {}
+        for name, table, columns in INDEXES:
+            if table not in indexes:
+                indexes[table] = {i["name"] for i in inspector.get_indexes(table)}
+            if name in indexes[table]:
+                continue
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+            applied.append(f"create index {name}")
+
+    for step in applied:
+        log.info("Schema migrated", extra={"step": step})
+    return applied
@@ -1,6 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Float, Boolean
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Float, Boolean, Index
 from database import Base
-from datetime import datetime
 from sqlalchemy import func
 class User(Base):
     __tablename__ = "users"
@@ -27,4 +26,81 @@ class Issue(Base):
     longitude = Column(Float)
     ai_confidence = Column(Float, nullable=True)
     ai_reasoning = Column(Text, nullable=True)
+    classification_status = Column(String(20), default="DONE")
+    tile_x = Column(Integer, nullable=True)
+    tile_y = Column(Integer, nullable=True)
+    reporter_id = Column(Integer, nullable=True)
+    report_count = Column(Integer, default=1)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+    __table_args__ = (
+        # Spatial lookups (see geo.py): bounding boxes and nearest-neighbour rings
+        Index("ix_issues_tile", "tile_x", "tile_y"),
+        # Serves the engineer work queue: filter by status/ward/priority, keyset on created_at
+        Index("ix_issues_status_ward_priority_created", "status", "ward", "priority", "created_at"),
+        Index("ix_issues_created_id", "created_at", "id"),
+    )
+
+class ClassificationJob(Base):
+    __tablename__ = "classification_jobs"
+    id = Column(Integer, primary_key=True)
+    issue_id = Column(Integer, nullable=False, index=True)
+    image_path = Column(Text, nullable=False)
+    # detection_cache key of the upload's inference derivative, so a worker that has
+    # to re-derive the image from the stored file still hits the same cache entry
+    cache_key = Column(String(80), nullable=True)
+    status = Column(String(20), default="PENDING", index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    locked_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+class DetectionCacheEntry(Base):
+    __tablename__ = "detection_cache"
+    key = Column(String(80), primary_key=True)
+    issue_type = Column(String(50))
+    priority = Column(String(20))
+    confidence = Column(Float)
+    reasoning = Column(Text)
+    hits = Column(Integer, default=0)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+class IssueStat(Base):
+    __tablename__ = "issue_stats"
+    ward = Column(Integer, primary_key=True)
+    issue_type = Column(String(50), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    key = Column(String(80), primary_key=True)
+    size = Column(Integer)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+class IssueReport(Base):
+    __tablename__ = "issue_reports"
+    id = Column(Integer, primary_key=True)
+    issue_id = Column(Integer, nullable=False, index=True)
+    merged_from = Column(Integer, nullable=True, index=True)
+    image = Column(Text)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    reporter_id = Column(Integer, nullable=True)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+class MailDelivery(Base):
+    __tablename__ = "mail_deliveries"
+    message_id = Column(String(32), primary_key=True)
+    status = Column(String(20), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    updated_at = Column(TIMESTAMP, index=True)  # UTC, set by mailer
+
+class ReportSubmission(Base):
+    __tablename__ = "report_submissions"
+    reporter_id = Column(Integer, primary_key=True)
+    client_key = Column(String(64), primary_key=True)
+    issue_id = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP, default=func.now())
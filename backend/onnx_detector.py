@@ -0,0 +1,105 @@
+import ast
+import os
+from pathlib import Path
+
+# ── ONNX Runtime YOLO ──
+# Runs the YOLOv8 model exported to ONNX (python manage.py export-onnx) on CPU
+# without importing torch/ultralytics. The INT8 variant is the same graph with
+# dynamically quantized weights; it is smaller and usually faster on CPU at a
+# small accuracy cost (compare with benchmarks/bench_detector_backends.py).
+
+MODEL_DIR = Path(__file__).resolve().parent
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", str(MODEL_DIR / "yolov8s.onnx"))
+ONNX_INT8_MODEL_PATH = os.getenv("ONNX_INT8_MODEL_PATH", str(MODEL_DIR / "yolov8s.int8.onnx"))
+# 0 lets ONNX Runtime pick (one thread per physical core)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+INPUT_SIZE = 640
+IOU_THRESHOLD = 0.7  # ultralytics default
+MAX_DETECTIONS = 300
+
+
+def export(pt_path, onnx_path=ONNX_MODEL_PATH, int8_path=None):
+    """Export a YOLOv8 .pt to ONNX (dynamic batch), optionally also an INT8-quantized copy."""
+    from ultralytics import YOLO
+
+    exported = YOLO(str(pt_path)).export(format="onnx", dynamic=True, imgsz=INPUT_SIZE)
+    os.replace(exported, onnx_path)
+
+    if int8_path:
+        import onnx
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QUInt8)
+        # Keep the class names ultralytics stores in the model metadata
+        source, quantized = onnx.load(str(onnx_path)), onnx.load(str(int8_path))
+        del quantized.metadata_props[:]
+        quantized.metadata_props.extend(source.metadata_props)
+        onnx.save(quantized, str(int8_path))
+    return onnx_path
+
+
+class OnnxYolo:
+    def __init__(self, path, confidence: float = 0.25):
+        import cv2
+        import numpy as np
+        import onnxruntime as ort
+
+        self.cv2, self.np = cv2, np
+        self.confidence = confidence
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        if not names:
+            raise RuntimeError(f"{path} has no class names in its metadata; re-export with manage.py export-onnx")
+        self.names = {int(k): v.lower() for k, v in ast.literal_eval(names).items()}
+
+    def _letterbox(self, img):
+        """Resize keeping aspect ratio and pad to INPUT_SIZE², as ultralytics does."""
+        cv2, np = self.cv2, self.np
+        h, w = img.shape[:2]
+        scale = INPUT_SIZE / max(h, w)
+        resized = cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((INPUT_SIZE, INPUT_SIZE, 3), 114, dtype=np.uint8)
+        top = (INPUT_SIZE - resized.shape[0]) // 2
+        left = (INPUT_SIZE - resized.shape[1]) // 2
+        canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+        return canvas
+
+    def _labels(self, prediction):
+        """Labels from one (4 + classes, anchors) prediction after confidence filtering and per-class NMS."""
+        cv2, np = self.cv2, self.np
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= self.confidence
+        if not keep.any():
+            return []
+
+        boxes = prediction[keep, :4].copy()
+        class_ids, confidences = class_ids[keep], confidences[keep]
+        boxes[:, 0] -= boxes[:, 2] / 2  # cx, cy, w, h -> x, y, w, h
+        boxes[:, 1] -= boxes[:, 3] / 2
+        # Offset boxes by class so NMS only suppresses overlaps within a class
+        boxes[:, :2] += class_ids[:, None] * (INPUT_SIZE + 1)
+
+        kept = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), self.confidence, IOU_THRESHOLD)
+        kept = np.array(kept, dtype=int).reshape(-1)[:MAX_DETECTIONS]
+        # Highest confidence first, like ultralytics' result.boxes
+        kept = kept[np.argsort(-confidences[kept])]
+        return [self.names[int(class_ids[i])] for i in kept]
+
+    def labels_batch(self, images):
+        """COCO labels for each BGR image, in one forward pass."""
+        np = self.np
+        batch = np.stack([self._letterbox(img)[:, :, ::-1] for img in images])  # BGR -> RGB
+        batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return [self._labels(prediction) for prediction in output]
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+import jinja2
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.templating import Jinja2Templates
+
+log = logging.getLogger(__name__)
+
+# ── Page Rendering ──
+# Every HTML page goes through one Jinja environment. Templates are compiled once
+# per process at startup; the compiled code is also kept in a bytecode cache on
+# disk, so workers forked or restarted later skip the compile step.
+#
+#   TEMPLATE_AUTO_RELOAD   "1" re-checks template files for edits on every render
+#                          (development). Off by default: templates are fixed per deploy.
+#   TEMPLATE_CACHE_DIR     bytecode cache directory. Unset uses Jinja's private
+#                          per-user temp directory; "off" disables the cache.
+#   STREAM_CHUNK_BYTES     streamed pages are flushed in chunks of about this size.
+#
+# stream() renders long lists incrementally so the head of the page reaches the
+# browser while the rest renders; shell() serves pages that render the same for
+# everyone (no per-request context) with an ETag and answers If-None-Match with 304.
+
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "0") == "1"
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "")
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", "16384"))
+
+
+def build_templates(directory: Path) -> Jinja2Templates:
+    if TEMPLATE_CACHE_DIR == "off":
+        bytecode_cache = None
+    elif TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    else:
+        bytecode_cache = jinja2.FileSystemBytecodeCache()
+
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(str(directory)),
+        autoescape=jinja2.select_autoescape(),
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        bytecode_cache=bytecode_cache,
+        cache_size=-1,
+    )
+    return Jinja2Templates(env=env)
+
+
+def precompile(templates: Jinja2Templates):
+    """Load every template now rather than on the first request that needs it."""
+    env = templates.env
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    log.info("Templates compiled", extra={"templates": len(names), "bytecode_cache": TEMPLATE_CACHE_DIR or "default"})
+
+
+def _chunks(parts):
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def stream(templates: Jinja2Templates, request: Request, name: str, context: dict,
+           status_code: int = 200, headers: dict = None) -> StreamingResponse:
+    """Render name chunk by chunk as the response body is sent.
+
+    Everything the template needs must already be loaded: rendering runs after the
+    handler (and its database session) has returned.
+    """
+    template = templates.get_template(name)
+    context = {"request": request, **context}
+    return StreamingResponse(
+        _chunks(template.generate(context)),
+        status_code=status_code,
+        media_type="text/html; charset=utf-8",
+        headers=headers,
+    )
+
+
+_shells = {}
+_shells_lock = threading.Lock()
+
+
+def _render_shell(templates: Jinja2Templates, request: Request, name: str, context: dict):
+    key = (name, tuple(sorted(context.items())))
+    cached = _shells.get(key)
+    if cached is not None and not TEMPLATE_AUTO_RELOAD:
+        return cached
+
+    body = templates.get_template(name).render({"request": request, **context}).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    with _shells_lock:
+        _shells[key] = (body, etag)
+    return body, etag
+
+
+_ENTITY_TAG = re.compile(r'(?:W/)?"([^"]*)"')
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header value matches etag (RFC 9110: "*" or a
+    comma-separated list of entity tags, compared weakly, so W/"x" matches "x").
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    match = _ENTITY_TAG.fullmatch(etag.strip())
+    if match is None:
+        return False
+    return match.group(1) in _ENTITY_TAG.findall(if_none_match)
+
+
+def shell(templates: Jinja2Templates, request: Request, name: str, **context) -> Response:
+    """A page that renders identically for every visitor, with ETag/304 revalidation.
+
+    Keyword arguments must be hashable and are part of the cache key, so only pass
+    the few fixed variants a page has (e.g. error=None).
+    """
+    body, etag = _render_shell(templates, request, name, context)
+    # The pages sit behind a login, so browsers may keep them but must revalidate
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(body, headers=headers)
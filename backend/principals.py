@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from fastapi import Request
+from sqlalchemy import event as sa_event, inspect
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+import models
+
+log = logging.getLogger(__name__)
+
+# ── Principal Cache ──
+# The logged-in user's identity (id, name, email, role, ward) is kept per process
+# for PRINCIPAL_CACHE_TTL_SECONDS, so protected routes do not query the users
+# table on every request. Use current_user as a FastAPI dependency; FastAPI
+# resolves it once per request however many parameters depend on it.
+#
+# ORM changes to those columns drop the entry when their transaction commits.
+# Other worker processes, and edits made in SQL or with bulk query.update(), see
+# the change once their entry expires: the TTL bounds how long a revoked role or
+# a ward reassignment can go unnoticed.
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+_TRACKED = ("name", "email", "role", "ward")
+_CHANGED = "principals_changed"
+
+
+class Principal(NamedTuple):
+    id: int
+    name: Optional[str]
+    email: str
+    role: Optional[str]
+    ward: Optional[int]
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(user.id, user.name, user.email, user.role, user.ward)
+
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+
+def _get(user_id: int) -> Optional[Principal]:
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        expires, principal = entry
+        if expires <= now:
+            del _entries[user_id]
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(user_id)
+        _stats["hits"] += 1
+        return principal
+
+
+def remember(principal: Principal):
+    """Cache a principal, e.g. right after login when the user row is already loaded."""
+    with _lock:
+        _entries[principal.id] = (time.monotonic() + PRINCIPAL_CACHE_TTL_SECONDS, principal)
+        _entries.move_to_end(principal.id)
+        while len(_entries) > PRINCIPAL_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def invalidate(user_id: int):
+    with _lock:
+        if _entries.pop(user_id, None) is not None:
+            _stats["invalidations"] += 1
+
+
+def stats():
+    with _lock:
+        return {**_stats, "size": len(_entries), "ttl_seconds": PRINCIPAL_CACHE_TTL_SECONDS}
+
+
+def _fetch(user_id: int) -> Optional[Principal]:
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(models.User.id, models.User.name, models.User.email, models.User.role, models.User.ward)
+            .filter(models.User.id == user_id)
+            .first()
+        )
+    finally:
+        db.close()
+    if row is None:
+        return None
+    principal = Principal(*row)
+    remember(principal)
+    return principal
+
+
+def load(user_id: int) -> Optional[Principal]:
+    """The principal for user_id from the cache, or one primary-key query on a miss."""
+    return _get(user_id) or _fetch(user_id)
+
+
+async def current_user(request: Request) -> Optional[Principal]:
+    """FastAPI dependency: the logged-in principal, or None."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return None
+
+    principal = _get(user_id)
+    if principal is None:
+        principal = await run_in_threadpool(_fetch, user_id)
+    if principal is None:
+        # The account was deleted; drop the stale login rather than bouncing between pages
+        log.info("Session user no longer exists", extra={"user_id": user_id})
+        request.session.clear()
+    return principal
+
+
+# ── Invalidation ──
+
+def _mark_changed(target: models.User):
+    session = inspect(target).session
+    if session is not None and target.id is not None:
+        session.info.setdefault(_CHANGED, set()).add(target.id)
+
+
+@sa_event.listens_for(models.User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in _TRACKED):
+        _mark_changed(target)
+
+
+@sa_event.listens_for(models.User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _mark_changed(target)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _invalidate_changed(session):
+    for user_id in session.info.pop(_CHANGED, ()):
+        invalidate(user_id)
+
+
+@sa_event.listens_for(Session, "after_soft_rollback")
+def _drop_changed(session, previous_transaction):
+    session.info.pop(_CHANGED, None)
@@ -0,0 +1,196 @@
+import json
+import math
+import os
+import zipfile
+from collections import Counter
+from pathlib import PurePosixPath
+
+from sqlalchemy import tuple_
+
+import models, crud, ingest, blobstore, classifier, events, geo
+
+# ── Offline Report Sync ──
+# Surveyors queue reports while offline and upload them together when they
+# reconnect. A batch is a manifest plus one image per item, sent either as
+# multipart fields or as a zip archive containing manifest.json:
+#
+#   [{"client_key": "3f1c…", "latitude": 22.30, "longitude": 70.80, "image": "img-0"}, …]
+#
+# "image" names the multipart file field (or the zip member) holding that
+# report's photo. client_key is generated once per report on the device; a
+# report whose key was already synced is not created again, so a client can
+# simply resend everything that did not come back as "created" or "already_synced".
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+MANIFEST_MEMBER = "manifest.json"
+MAX_MANIFEST_BYTES = 1024 * 1024
+
+
+class BatchError(ValueError):
+    """The batch as a whole is malformed (bad manifest, too many items)."""
+
+
+def parse_manifest(raw) -> list:
+    """Validated manifest items: dicts with client_key, latitude, longitude, image."""
+    try:
+        items = json.loads(raw)
+    except (TypeError, ValueError):
+        raise BatchError("manifest is not valid JSON")
+    if not isinstance(items, list) or not items:
+        raise BatchError("manifest must be a non-empty JSON array")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise BatchError(f"At most {BATCH_MAX_ITEMS} reports per batch")
+
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict):
+            raise BatchError("Every manifest item must be an object")
+        key = item.get("client_key")
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            raise BatchError("Every item needs a client_key of 1-64 characters")
+        if key in seen:
+            raise BatchError(f"client_key {key!r} appears more than once")
+        seen.add(key)
+        if not isinstance(item.get("image"), str):
+            raise BatchError(f"Item {key!r} has no image reference")
+    return items
+
+
+def _coords(item):
+    """
+    Item coordinates, defaulting like /report when they are missing or unparsable.
+    Raises ValueError for infinite or NaN values (JSON Infinity/NaN, "inf", "nan").
+    """
+    try:
+        lat = float(item["latitude"]) if item.get("latitude") is not None else 22.30
+        lon = float(item["longitude"]) if item.get("longitude") is not None else 70.80
+    except (ValueError, TypeError):
+        return 22.30, 70.80
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        raise ValueError("latitude and longitude must be finite numbers")
+    return lat, lon
+
+
+class ZipImages:
+    """Resolves manifest image references to members of an uploaded zip archive."""
+
+    def __init__(self, fileobj):
+        try:
+            self.archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            raise BatchError("archive is not a valid zip file")
+
+    def manifest(self):
+        try:
+            with self.archive.open(MANIFEST_MEMBER) as f:
+                return ingest.read_limited(f, MAX_MANIFEST_BYTES)
+        except KeyError:
+            raise BatchError(f"archive has no {MANIFEST_MEMBER}")
+        except ingest.UploadTooLarge:
+            raise BatchError(f"{MANIFEST_MEMBER} is too large")
+
+    def open(self, name):
+        name = str(PurePosixPath(name))
+        try:
+            return self.archive.open(name)
+        except KeyError:
+            return None
+
+
+def existing_submissions(db, reporter_id, client_keys) -> dict:
+    """client_key -> issue_id for keys this reporter has already synced."""
+    if not client_keys:
+        return {}
+    Submission = models.ReportSubmission
+    rows = (
+        db.query(Submission.client_key, Submission.issue_id)
+        .filter(tuple_(Submission.reporter_id, Submission.client_key).in_(
+            [(reporter_id, key) for key in client_keys]
+        ))
+        .all()
+    )
+    return {row.client_key: row.issue_id for row in rows}
+
+
+def sync_reports(db, reporter_id, items, open_image):
+    """
+    Store every new report in the batch in one transaction and enqueue them all for
+    classification. open_image(name) returns a readable file object or None.
+
+    Returns (results, blobs). results has one entry per manifest item in order:
+    {"client_key", "status": "created" | "already_synced" | "error", "issue_id", "error"}.
+    blobs maps the blob keys referenced by the batch to their bytes. Only the
+    references are part of the transaction: the caller commits, then writes the
+    files with blobstore.write(), so a rolled-back batch leaves nothing on disk.
+    Then it notifies the classifier and pregenerates thumbnails.
+    """
+    synced = existing_submissions(db, reporter_id, [item["client_key"] for item in items])
+    results = []
+    pending = []  # (result, ingested image, blob key, lat, lon)
+    blobs = {}
+
+    for item in items:
+        key = item["client_key"]
+        if key in synced:
+            results.append({"client_key": key, "status": "already_synced", "issue_id": synced[key]})
+            continue
+
+        result = {"client_key": key, "status": "error", "issue_id": None}
+        results.append(result)
+        try:
+            lat, lon = _coords(item)
+        except ValueError as e:
+            result["error"] = str(e)
+            continue
+        fileobj = open_image(item["image"])
+        if fileobj is None:
+            result["error"] = f"No image named {item['image']!r} in the upload"
+            continue
+        try:
+            with fileobj:
+                image = ingest.process_image(ingest.read_limited(fileobj))
+        except (ingest.UploadTooLarge, ingest.InvalidImage) as e:
+            result["error"] = str(e)
+            continue
+
+        blob_key = blobstore.key_for(image.display, image.extension or PurePosixPath(item["image"]).suffix)
+        blobstore.add_reference(db, blob_key, len(image.display))
+        blobs[blob_key] = image.display
+        pending.append((result, image, blob_key, lat, lon))
+
+    if not pending:
+        return results, {}
+
+    ward_ids = crud.detect_wards([(lat, lon) for _, _, _, lat, lon in pending])
+    issues = [
+        models.Issue(
+            issue_type=classifier.PENDING_ISSUE_TYPE,
+            ward=ward,
+            before_image=blob_key,
+            latitude=lat,
+            longitude=lon,
+            status="OPEN",
+            reporter_id=reporter_id,
+            **geo.tile_columns(lat, lon)
+        )
+        for (_, _, blob_key, lat, lon), ward in zip(pending, ward_ids)
+    ]
+    db.add_all(issues)
+    classifier.enqueue_many(db, [
+        (issue, str(blobstore.blob_path(blob_key)), image.inference)
+        for issue, (_, image, blob_key, _, _) in zip(issues, pending)
+    ])
+
+    # One rollup upsert per bucket rather than per issue
+    for stat, count in Counter(crud.stat_key(issue) for issue in issues).items():
+        crud.adjust_issue_stat(db, stat, count)
+
+    db.add_all([
+        models.ReportSubmission(reporter_id=reporter_id, client_key=result["client_key"], issue_id=issue.id)
+        for issue, (result, _, _, _, _) in zip(issues, pending)
+    ])
+    for issue, (result, _, _, _, _) in zip(issues, pending):
+        result.update(status="created", issue_id=issue.id)
+        events.publish(db, "created", issue)
+
+    return results, blobs
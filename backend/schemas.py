@@ -1,5 +1,64 @@
+from datetime import datetime
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 class IssueCreate(BaseModel):
     latitude: float
     longitude: float
+
+# ── API v1 responses ──
+
+class Issue(BaseModel):
+    id: int
+    issue_type: Optional[str] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    ward: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    ai_confidence: Optional[float] = None
+    ai_reasoning: Optional[str] = None
+    classification_status: Optional[str] = None
+    report_count: Optional[int] = None
+    before_image_url: Optional[str] = None
+    after_image_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class IssuePage(BaseModel):
+    items: List[Issue]
+    next_cursor: Optional[str] = None
+
+class MapIssue(BaseModel):
+    id: int
+    issue_type: Optional[str] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    ward: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    distance_m: Optional[float] = None
+
+class MapIssueList(BaseModel):
+    items: List[MapIssue]
+    truncated: bool = False
+
+class Ward(BaseModel):
+    ward: Optional[int] = None
+    total: int
+    open: int
+    closed: int
+
+class WardList(BaseModel):
+    items: List[Ward]
+
+class IssueTypeCount(BaseModel):
+    issue_type: str
+    count: int
+
+class Stats(BaseModel):
+    total: int
+    open_count: int
+    closed_count: int
+    critical_count: int
+    type_stats: List[IssueTypeCount]
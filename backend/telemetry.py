@@ -0,0 +1,409 @@
+import contextvars
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# ── Telemetry ──
+# Structured JSON logs plus Prometheus-style metrics, without extra dependencies.
+#
+#   log = logging.getLogger(__name__)
+#   log.info("Sent", extra={"to": address})       -> {"msg": "Sent", "to": "...", ...}
+#
+#   with telemetry.span("ward_lookup"):           -> span_duration_seconds{span="ward_lookup"}
+#       ...
+#
+# MetricsMiddleware times every request (per-route histogram, in-flight gauge,
+# error counter) and writes one access-log line carrying the request's span
+# timings. render() produces the /metrics text. Each gunicorn worker keeps its own
+# counters; with METRICS_DIR set they are written there every few seconds and
+# /metrics on any worker reports the sum over all live workers.
+#
+# /metrics requires METRICS_TOKEN as a bearer token. render.yaml generates one;
+# without it the endpoint answers 404 on Render and is open only locally.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json | text
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+log = logging.getLogger(__name__)
+
+# Per-request (or per-job) state: {"id": ..., "spans": {name: milliseconds}}
+_context = contextvars.ContextVar("telemetry_context", default=None)
+
+
+# ── Structured Logs ──
+
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        ctx = _context.get()
+        if ctx is not None:
+            entry["request_id"] = ctx["id"]
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_logging_configured = False
+
+
+def configure_logging():
+    """Send the app's logs to stdout, one JSON object per line (LOG_FORMAT=text for plain lines)."""
+    global _logging_configured
+    if _logging_configured:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    _logging_configured = True
+
+
+# ── Metrics ──
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = [[list(k), v] for k, v in self._values.items()]
+        return {"type": self.type, "help": self.help, "labelnames": list(self.labelnames), "values": values}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., count above the last bucket, sum]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        data["values"] = [[k, list(v)] for k, v in data["values"]]
+        return data
+
+
+_registry = []
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled", ("method",))
+HTTP_ERRORS = Counter("http_request_errors_total", "5xx responses and unhandled exceptions", ("method", "route", "kind"))
+SPAN_SECONDS = Histogram("span_duration_seconds", "Time spent in instrumented steps", ("span", "backend"))
+SPAN_ERRORS = Counter("span_errors_total", "Instrumented steps that raised", ("span", "backend"))
+DB_SECONDS = Histogram("db_query_duration_seconds", "Database statement latency", ("operation",))
+
+
+def _snapshot() -> dict:
+    return {m.name: m.snapshot() for m in _registry}
+
+
+def _merge(snapshots) -> dict:
+    merged = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            target = merged.setdefault(name, dict(data, values={}))
+            for key, value in data["values"]:
+                key = tuple(key)
+                if isinstance(value, list):
+                    current = target["values"].get(key) or [0] * len(value)
+                    target["values"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["values"][key] = target["values"].get(key, 0) + value
+    return merged
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush():
+    """Write this process's metrics to METRICS_DIR for the other workers to read."""
+    if not METRICS_DIR:
+        return
+    path = os.path.join(METRICS_DIR, f"metrics-{os.getpid()}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _collect() -> dict:
+    if not METRICS_DIR:
+        return _merge([_snapshot()])
+    flush()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics-*.json")):
+        pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+        if not _pid_alive(pid):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return _merge(snapshots)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, data in sorted(_collect().items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        labelnames = data["labelnames"]
+        for key, value in sorted(data["values"].items()):
+            if data["type"] != "histogram":
+                lines.append(f"{name}{_labels(labelnames, key)} {value:g}")
+                continue
+            cumulative = 0
+            for bound, count in zip(data["buckets"] + ["+Inf"], value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, key)} {value[-1]:g}")
+            lines.append(f"{name}_count{_labels(labelnames, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+_flusher = None
+
+
+def start_flusher():
+    """Flush to METRICS_DIR periodically (idempotent; no-op without METRICS_DIR)."""
+    global _flusher
+    if not METRICS_DIR or _flusher is not None:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    def loop():
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            try:
+                flush()
+            except OSError as e:
+                log.warning("Metrics flush failed", extra={"error": str(e)})
+
+    _flusher = threading.Thread(target=loop, name="metrics-flush", daemon=True)
+    _flusher.start()
+
+
+# ── Spans ──
+
+def _add_span(name: str, seconds: float):
+    ctx = _context.get()
+    if ctx is not None:
+        spans = ctx["spans"]
+        spans[name] = round(spans.get(name, 0) + seconds * 1000, 3)
+
+
+@contextmanager
+def span(name: str, backend: str = ""):
+    """Time a step into span_duration_seconds and the current request's access-log line."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SPAN_ERRORS.inc(span=name, backend=backend)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, span=name, backend=backend)
+        _add_span(f"{name}:{backend}" if backend else name, elapsed)
+
+
+@contextmanager
+def operation(message: str, **fields):
+    """Context for work outside a request (e.g. a classifier job); logs its spans when done."""
+    ctx = {"id": uuid.uuid4().hex[:16], "spans": {}}
+    token = _context.set(ctx)
+    start = time.perf_counter()
+    try:
+        yield ctx
+    finally:
+        duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        log.info(message, extra=dict(fields, duration_ms=duration_ms, spans=ctx["spans"]))
+        _context.reset(token)
+
+
+def instrument_engine(engine):
+    """Time every statement on engine into db_query_duration_seconds and the request's "db" span."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("telemetry_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("telemetry_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+            operation = "OTHER"
+        DB_SECONDS.observe(elapsed, operation=operation)
+        _add_span("db", elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("telemetry_started"):
+            conn.info["telemetry_started"].pop()
+
+
+# ── Middleware ──
+
+class MetricsMiddleware:
+    """Per-route latency, in-flight and error metrics, plus one JSON access-log line per request."""
+
+    def __init__(self, app, skip_paths=("/metrics", "/events")):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+        self.access_log = logging.getLogger("access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        ctx = {"id": request_id, "spans": {}}
+        token = _context.set(ctx)
+        status = 500
+
+        async def tracked_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        error = None
+        try:
+            await self.app(scope, receive, tracked_send)
+        except Exception as e:
+            error = e
+            self.access_log.exception("Unhandled error", extra={"method": method, "path": scope["path"]})
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method=method)
+            route = _route(scope)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_SECONDS.observe(elapsed, method=method, route=route)
+            if error is not None:
+                HTTP_ERRORS.inc(method=method, route=route, kind="exception")
+            elif status >= 500:
+                HTTP_ERRORS.inc(method=method, route=route, kind="5xx")
+            self.access_log.info("request", extra={
+                "method": method, "route": route, "path": scope["path"], "status": status,
+                "duration_ms": round(elapsed * 1000, 3), "spans": ctx["spans"],
+            })
+            _context.reset(token)
+
+
+def _route(scope) -> str:
+    """The matched route template (/report/{issue_id}/status), so labels stay low-cardinality."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "other"
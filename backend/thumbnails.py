@@ -0,0 +1,87 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import blobstore
+import ingest
+
+# ── Image Derivatives ──
+# Resized copies of blobs in a few fixed sizes, cached on disk next to the blob
+# store. Generation runs on a small thread pool, never on the event loop, and
+# concurrent requests for the same missing derivative share one generation.
+
+THUMBNAIL_WIDTHS = (160, 320, 640)
+THUMBNAIL_FORMATS = ("webp", "jpg")
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnails")
+_in_flight = {}
+_in_flight_lock = threading.RLock()
+
+
+class DerivativeUnavailable(RuntimeError):
+    """The derivative could not be generated (missing source or no image codec)."""
+
+
+def _generate(key: str, width: int, fmt: str):
+    path = blobstore.derivative_path(key, width, fmt)
+    if path.exists():
+        return path
+
+    try:
+        import cv2
+        import numpy as np
+    except ImportError as e:
+        raise DerivativeUnavailable("OpenCV is not installed") from e
+
+    source = blobstore.blob_path(key)
+    if not source.exists():
+        raise DerivativeUnavailable(f"Blob {key} not found")
+
+    img = cv2.imdecode(np.frombuffer(source.read_bytes(), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise DerivativeUnavailable(f"Blob {key} is not a readable image")
+
+    img = ingest.resize_to_width(cv2, img, width)
+    if fmt == "webp":
+        ok, buf = cv2.imencode(".webp", img, [int(cv2.IMWRITE_WEBP_QUALITY), 75])
+    else:
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 75])
+    if not ok:
+        raise DerivativeUnavailable(f"Could not encode {fmt}")
+
+    return blobstore.put_derivative(key, width, buf.tobytes(), fmt)
+
+
+def submit(key: str, width: int, fmt: str):
+    """Start (or join) generation of one derivative. Returns a concurrent Future of its path."""
+    job = (key, width, fmt)
+    with _in_flight_lock:
+        future = _in_flight.get(job)
+        if future is None:
+            future = _executor.submit(_generate, key, width, fmt)
+            _in_flight[job] = future
+            future.add_done_callback(lambda _: _forget(job))
+    return future
+
+
+def _forget(job):
+    with _in_flight_lock:
+        _in_flight.pop(job, None)
+
+
+async def get_path(key: str, width: int, fmt: str):
+    """Path of a derivative, generating it off the event loop if it is not cached yet."""
+    path = blobstore.derivative_path(key, width, fmt)
+    if path.exists():
+        return path
+    return await asyncio.wrap_future(submit(key, width, fmt))
+
+
+def pregenerate(key: str):
+    """Queue every standard size for a newly stored blob (fire and forget)."""
+    for width in THUMBNAIL_WIDTHS:
+        for fmt in THUMBNAIL_FORMATS:
+            if not blobstore.derivative_path(key, width, fmt).exists():
+                submit(key, width, fmt)
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ── Ward Boundaries ──
+# Ward polygons are loaded from a GeoJSON FeatureCollection (WARD_BOUNDARIES_FILE),
+# one Polygon/MultiPolygon feature per ward with the ward number in
+# properties.ward. A uniform grid over the city's bounding box maps each cell to
+# the polygons overlapping it, so a lookup tests only a handful of candidates.
+# The file is re-read automatically when its modification time changes.
+#
+# Without a boundary file the original latitude bands are used.
+
+WARD_BOUNDARIES_FILE = os.getenv("WARD_BOUNDARIES_FILE", "")
+WARD_RELOAD_CHECK_SECONDS = float(os.getenv("WARD_RELOAD_CHECK_SECONDS", "5"))
+WARD_GRID_SIZE = int(os.getenv("WARD_GRID_SIZE", "128"))
+# Ward assigned to points outside every polygon.
+WARD_UNASSIGNED = int(os.getenv("WARD_UNASSIGNED", "0"))
+
+
+def _legacy_ward(lat, lon):
+    if 22.28 <= lat <= 22.31:
+        return 1
+    elif 22.31 < lat <= 22.34:
+        return 2
+    else:
+        return 3
+
+
+def _point_in_ring(x, y, ring):
+    """Even-odd ray casting; ring is a list of (x, y) vertices."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+class _Part:
+    """One polygon (exterior ring plus holes) belonging to a ward."""
+    __slots__ = ("ward", "rings", "min_x", "min_y", "max_x", "max_y")
+
+    def __init__(self, ward, rings):
+        self.ward = ward
+        self.rings = rings
+        xs = [p[0] for p in rings[0]]
+        ys = [p[1] for p in rings[0]]
+        self.min_x, self.max_x = min(xs), max(xs)
+        self.min_y, self.max_y = min(ys), max(ys)
+
+    def contains(self, x, y):
+        if not (self.min_x <= x <= self.max_x and self.min_y <= y <= self.max_y):
+            return False
+        if not _point_in_ring(x, y, self.rings[0]):
+            return False
+        return not any(_point_in_ring(x, y, hole) for hole in self.rings[1:])
+
+
+class WardIndex:
+    def __init__(self, parts, grid_size: int = WARD_GRID_SIZE):
+        self.parts = parts
+        self.grid_size = grid_size
+        self.cells = {}
+        if not parts:
+            self.min_x = self.min_y = self.max_x = self.max_y = 0.0
+            return
+
+        self.min_x = min(p.min_x for p in parts)
+        self.min_y = min(p.min_y for p in parts)
+        self.max_x = max(p.max_x for p in parts)
+        self.max_y = max(p.max_y for p in parts)
+        self.cell_w = (self.max_x - self.min_x) / grid_size or 1.0
+        self.cell_h = (self.max_y - self.min_y) / grid_size or 1.0
+
+        for part in parts:
+            c0, r0 = self._cell(part.min_x, part.min_y)
+            c1, r1 = self._cell(part.max_x, part.max_y)
+            for c in range(c0, c1 + 1):
+                for r in range(r0, r1 + 1):
+                    self.cells.setdefault((c, r), []).append(part)
+
+    def _cell(self, x, y):
+        c = min(self.grid_size - 1, max(0, int((x - self.min_x) / self.cell_w)))
+        r = min(self.grid_size - 1, max(0, int((y - self.min_y) / self.cell_h)))
+        return c, r
+
+    def lookup(self, lat, lon):
+        """Ward containing the point, or None."""
+        x, y = lon, lat
+        if not (self.min_x <= x <= self.max_x and self.min_y <= y <= self.max_y):
+            return None
+        for part in self.cells.get(self._cell(x, y), ()):
+            if part.contains(x, y):
+                return part.ward
+        return None
+
+    def lookup_many(self, points):
+        return [self.lookup(lat, lon) for lat, lon in points]
+
+
+def _ward_id(properties):
+    for name in ("ward", "ward_no", "ward_id", "id"):
+        if properties.get(name) is not None:
+            return int(properties[name])
+    raise ValueError(f"Feature has no ward number in properties: {properties}")
+
+
+def load_geojson(path) -> WardIndex:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    parts = []
+    for feature in data.get("features", []):
+        ward = _ward_id(feature.get("properties") or {})
+        geometry = feature["geometry"]
+        if geometry["type"] == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            continue
+        for polygon in polygons:
+            rings = [[(float(x), float(y)) for x, y, *_ in ring] for ring in polygon]
+            parts.append(_Part(ward, rings))
+    return WardIndex(parts)
+
+
+class WardLookup:
+    """Current WardIndex for a boundary file, reloaded when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def index(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < WARD_RELOAD_CHECK_SECONDS:
+            return self._index
+
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError as e:
+                if self._index is None:
+                    log.warning("Ward boundary file unavailable; using latitude bands", extra={"error": str(e)})
+                return self._index
+
+            if mtime != self._mtime:
+                try:
+                    index = load_geojson(self.path)
+                except Exception as e:
+                    # Any malformed file (bad JSON, null coordinates, ...) must not take
+                    # down every report; retry only once the file changes again.
+                    self._mtime = mtime
+                    log.exception("Ward boundaries failed to load; keeping previous", extra={"path": str(self.path), "error": str(e)})
+                else:
+                    self._index, self._mtime = index, mtime
+                    log.info("Ward boundaries loaded", extra={"polygons": len(index.parts), "path": str(self.path)})
+            return self._index
+
+
+_lookup = WardLookup(WARD_BOUNDARIES_FILE) if WARD_BOUNDARIES_FILE else None
+
+
+def detect_ward(lat, lon):
+    index = _lookup.index() if _lookup is not None else None
+    if index is None:
+        return _legacy_ward(lat, lon)
+    ward = index.lookup(lat, lon)
+    return WARD_UNASSIGNED if ward is None else ward
+
+
+def assign_wards(points):
+    """Bulk lookup for [(lat, lon), ...]; resolves the index once for the whole batch."""
+    index = _lookup.index() if _lookup is not None else None
+    if index is None:
+        return [_legacy_ward(lat, lon) for lat, lon in points]
+    return [WARD_UNASSIGNED if w is None else w for w in index.lookup_many(points)]
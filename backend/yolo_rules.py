@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import string
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# ── YOLO Rule Table ──
+# The local fallback detector only sees COCO labels, so a rule table maps label
+# counts to a civic issue. Rules are tried in order and the first match wins:
+#
+#   {"name": "heavy_vehicles",
+#    "any": {"truck": 2, "bus": 2},        at least one label reaches its count
+#    "all": {"car": 1, "person": 1},       every label reaches its count
+#    "min_total": 1,                       at least this many detections in total
+#    "issue_type": "...", "priority": "High", "confidence": 75,
+#    "reasoning": "Saw {counts[truck]} trucks among {total} objects ({labels})."}
+#
+# Every condition is optional; a rule without any always matches. reasoning may
+# use {labels}, {top_label}, {total} and {counts[<label>]}.
+#
+# The table is compiled once into a label -> conditions index, so classifying an
+# image counts its detections in one pass and only looks at rules that mention
+# a detected label.
+
+YOLO_RULES_FILE = os.getenv("YOLO_RULES_FILE", str(Path(__file__).resolve().parent / "yolo_rules.json"))
+
+PRIORITIES = ("Critical", "High", "Medium", "Low")
+TEMPLATE_FIELDS = {"labels", "top_label", "total", "counts"}
+
+
+class Rule:
+    __slots__ = ("name", "any", "all", "min_total", "issue_type", "priority", "confidence", "reasoning", "fields")
+
+    def __init__(self, spec: dict):
+        self.name = spec.get("name") or spec.get("issue_type")
+        where = f"rule {self.name!r}"
+        self.any = _thresholds(spec.get("any", {}), where)
+        self.all = _thresholds(spec.get("all", {}), where)
+        self.min_total = int(spec.get("min_total", 0))
+        try:
+            self.issue_type = str(spec["issue_type"])
+            self.priority = spec["priority"]
+            self.confidence = spec["confidence"]
+        except KeyError as e:
+            raise ValueError(f"{where}: missing {e.args[0]}")
+        if self.priority not in PRIORITIES:
+            raise ValueError(f"{where}: priority must be one of {', '.join(PRIORITIES)}")
+        if not isinstance(self.confidence, (int, float)) or not 0 <= self.confidence <= 100:
+            raise ValueError(f"{where}: confidence must be a number from 0 to 100")
+        self.reasoning = str(spec.get("reasoning", ""))
+        self.fields = set()
+        for _, field, _, _ in string.Formatter().parse(self.reasoning):
+            if field is None:
+                continue
+            root = field.split("[")[0].split(".")[0]
+            if root not in TEMPLATE_FIELDS:
+                raise ValueError(f"{where}: unknown reasoning field {{{field}}}")
+            self.fields.add(root)
+
+
+def _thresholds(spec, where):
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: conditions must map label -> minimum count")
+    thresholds = {}
+    for label, count in spec.items():
+        if not isinstance(count, int) or count < 1:
+            raise ValueError(f"{where}: count for {label!r} must be a positive integer")
+        thresholds[str(label)] = count
+    return thresholds
+
+
+_SIMPLE, _ANY, _ALL = 0, 1, 2
+
+
+class RuleSet:
+    def __init__(self, rules):
+        if not rules:
+            raise ValueError("Rule table is empty")
+        self.rules = rules
+        # label -> [(rule index, minimum count, kind)] in rule order. _SIMPLE marks an
+        # "any" condition of a rule that has nothing else to check but min_total.
+        self._index = {}
+        # Rules with no label conditions, checked against the total only
+        self._unconditional = []
+
+        for i, rule in enumerate(rules):
+            kind = _ANY if rule.all else _SIMPLE
+            for label, count in rule.any.items():
+                self._index.setdefault(label, []).append((i, count, kind))
+            for label, count in rule.all.items():
+                self._index.setdefault(label, []).append((i, count, _ALL))
+            if not rule.any and not rule.all:
+                self._unconditional.append(i)
+
+    def match(self, detected_labels):
+        """(rule, label counts) for the first matching rule, or (None, counts)."""
+        counts = Counter(detected_labels)
+        total = len(detected_labels)
+        rules = self.rules
+        best = len(rules)
+        any_hit = all_hits = None
+
+        for label, n in counts.items():
+            for i, need, kind in self._index.get(label, ()):
+                if i >= best:
+                    break
+                if n < need:
+                    continue
+                if kind == _SIMPLE:
+                    if total >= rules[i].min_total:
+                        best = i
+                elif kind == _ANY:
+                    any_hit = any_hit or set()
+                    any_hit.add(i)
+                else:
+                    all_hits = all_hits or Counter()
+                    all_hits[i] += 1
+
+        if all_hits:
+            for i in sorted(all_hits):
+                if i >= best:
+                    break
+                rule = rules[i]
+                if (all_hits[i] == len(rule.all) and total >= rule.min_total
+                        and (not rule.any or (any_hit and i in any_hit))):
+                    best = i
+                    break
+
+        for i in self._unconditional:
+            if i >= best:
+                break
+            if total >= rules[i].min_total:
+                best = i
+                break
+
+        return (rules[best] if best < len(rules) else None), counts
+
+    def classify(self, detected_labels):
+        """(issue_type, priority, confidence, reasoning) for one image's labels."""
+        rule, counts = self.match(detected_labels)
+        if rule is None:
+            return "General Civic Issue", "Low", 30, "No rule matched the detected objects."
+        reasoning = rule.reasoning
+        if rule.fields:
+            reasoning = reasoning.format(
+                labels=", ".join(detected_labels) if "labels" in rule.fields else "",
+                top_label=max(counts, key=counts.get) if counts else "",
+                total=len(detected_labels),
+                counts=counts,
+            )
+        return rule.issue_type, rule.priority, rule.confidence, reasoning
+
+
+def load(path) -> RuleSet:
+    """Parse and compile a rule file. Raises ValueError describing the first bad rule."""
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}")
+    specs = data.get("rules") if isinstance(data, dict) else data
+    if not isinstance(specs, list):
+        raise ValueError(f"{path}: expected a list of rules")
+    return RuleSet([Rule(spec) for spec in specs])
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_rules() -> RuleSet:
+    """The compiled YOLO_RULES_FILE, loaded on first use."""
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = load(YOLO_RULES_FILE)
+                log.info("Compiled YOLO rules", extra={"rules": len(_rules.rules), "path": YOLO_RULES_FILE})
+    return _rules
+
+
+# ── Offline Evaluation ──
+
+def evaluate(rules: RuleSet, samples, min_seconds: float = 0.5) -> dict:
+    """
+    Score a rule set against labelled samples: [(expected issue_type, detected labels), ...].
+    Classification throughput is measured by re-running the whole set for at least min_seconds.
+    """
+    confusion = Counter()
+    rule_hits = Counter()
+    for expected, labels in samples:
+        rule, _ = rules.match(labels)
+        predicted = rules.classify(labels)[0]
+        confusion[expected, predicted] += 1
+        rule_hits[rule.name if rule else None] += 1
+
+    runs = 0
+    start = time.perf_counter()
+    while samples:
+        for _, labels in samples:
+            rules.classify(labels)
+        runs += 1
+        if time.perf_counter() - start >= min_seconds:
+            break
+    elapsed = time.perf_counter() - start
+
+    classes = sorted({e for e, _ in confusion} | {p for _, p in confusion})
+    per_class = {}
+    for c in classes:
+        tp = confusion[c, c]
+        support = sum(n for (e, _), n in confusion.items() if e == c)
+        predicted = sum(n for (_, p), n in confusion.items() if p == c)
+        per_class[c] = {
+            "support": support,
+            "precision": tp / predicted if predicted else 0.0,
+            "recall": tp / support if support else 0.0,
+        }
+
+    correct = sum(n for (e, p), n in confusion.items() if e == p)
+    return {
+        "samples": len(samples),
+        "accuracy": correct / len(samples) if samples else 0.0,
+        "per_class": per_class,
+        "confusions": [
+            {"expected": e, "predicted": p, "count": n}
+            for (e, p), n in confusion.most_common() if e != p
+        ],
+        "rule_hits": dict(rule_hits),
+        "classifications_per_sec": runs * len(samples) / elapsed if elapsed else 0.0,
+    }
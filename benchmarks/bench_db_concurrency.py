@@ -0,0 +1,104 @@
+"""
+Requests/sec and latency of the database-bound pages at high concurrency, against
+a running server.
+
+Compare the threadpool path with the asyncio engine by starting the server from
+the same revision with each setting:
+
+    cd backend && ASYNC_DB=false uvicorn main:app --port 8000
+    cd backend && ASYNC_DB=true  uvicorn main:app --port 8000
+    python benchmarks/bench_db_concurrency.py --url http://127.0.0.1:8000 --clients 200 --seconds 30
+
+The script signs its own session cookies with SESSION_SECRET (pass --secret if the
+server uses a non-default one), so no login/OTP round trip is needed. Report a few
+issues through the UI first so the pages have rows to render.
+
+Requires httpx and itsdangerous (see benchmarks/requirements.txt).
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+
+import httpx
+from itsdangerous import TimestampSigner
+
+DEFAULT_SECRET = "civic-monitor-secret-key-2026-change-in-prod"
+
+
+def session_cookie(secret, session):
+    """A cookie Starlette's SessionMiddleware accepts."""
+    data = base64.b64encode(json.dumps(session).encode("utf-8"))
+    return TimestampSigner(str(secret)).sign(data).decode("utf-8")
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+async def client_worker(base_url, cookies, routes, deadline, latencies, errors):
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, follow_redirects=False, timeout=60) as client:
+        while time.perf_counter() < deadline:
+            name, path = random.choice(routes)
+            start = time.perf_counter()
+            try:
+                res = await client.get(path)
+                ok = res.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+            if not ok:
+                errors[name] = errors.get(name, 0) + 1
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--secret", default=DEFAULT_SECRET)
+    parser.add_argument("--user-id", type=int, default=1)
+    args = parser.parse_args()
+
+    engineer = {"session": session_cookie(args.secret, {"user_id": args.user_id, "user_role": "engineer"})}
+    admin = {"session": session_cookie(args.secret, {"user_id": args.user_id, "user_role": "admin"})}
+
+    async with httpx.AsyncClient(base_url=args.url, cookies=engineer) as client:
+        res = await client.get("/api/v1/issues", params={"limit": 100, "fields": "id"})
+        res.raise_for_status()
+        ids = [item["id"] for item in res.json()["items"]] or [1]
+
+    engineer_routes = [("engineer", "/engineer?ward=all")] * 3 + [
+        ("status", f"/report/{random.choice(ids)}/status") for _ in range(5)
+    ]
+    admin_routes = [("admin", "/admin")]
+
+    latencies, errors = {}, {}
+    deadline = time.perf_counter() + args.seconds
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client_worker(
+            args.url,
+            admin if i % 10 == 0 else engineer,
+            admin_routes if i % 10 == 0 else engineer_routes,
+            deadline, latencies, errors,
+        )
+        for i in range(args.clients)
+    ])
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"clients:      {args.clients}, {elapsed:.1f}s")
+    print(f"requests/sec: {total / elapsed:.1f} ({total} requests, {sum(errors.values())} errors)")
+    for name, values in sorted(latencies.items()):
+        print(f"  {name:9s} n={len(values):6d}  p50={pct(values, 50):6.0f}ms  p95={pct(values, 95):6.0f}ms  "
+              f"p99={pct(values, 99):6.0f}ms  errors={errors.get(name, 0)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
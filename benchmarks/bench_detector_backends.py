@@ -0,0 +1,195 @@
+"""
+Startup time, latency and memory of the local detector backends (DETECTOR_BACKEND
+torch, onnx and onnx-int8), each measured in a fresh process.
+
+Export the ONNX models first, then run from the repository root:
+
+    cd backend && python manage.py export-onnx --int8 && cd ..
+    python benchmarks/bench_detector_backends.py [--images 64] [--workers 4] [--shared]
+
+startup is import + model load + first inference, i.e. what every gunicorn worker
+pays today before it can classify. rss is the resident memory after the run; the
+projection shows total detector memory for --workers web workers loading the
+model in-process versus one shared inference process (inference_server.py) plus
+workers that only hold the client. --shared also measures latency through a real
+inference process. agree is the share of images whose rule-table issue type
+matches the torch backend.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+START = time.perf_counter()
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / "backend"
+UPLOAD_DIR = ROOT / "frontend" / "static" / "uploads"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def rss_mb():
+    """(current, peak) resident memory of this process in MB (Linux)."""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields[key] = value.strip()
+    return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+def image_paths(n):
+    paths = sorted(p for p in UPLOAD_DIR.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    if not paths:
+        raise SystemExit(f"No images found in {UPLOAD_DIR}")
+    return [paths[i % len(paths)] for i in range(n)]
+
+
+# ── Measurement (runs in a child process) ──
+
+def measure(args):
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+    import cv2
+
+    paths = image_paths(args.images)
+    import_start = time.perf_counter()
+    import ai_detector
+    import yolo_rules
+    result = {"import_s": time.perf_counter() - import_start}
+
+    if args.mode == "client":
+        # What a web worker holds when the model lives in the inference process
+        result["rss_mb"], result["peak_rss_mb"] = rss_mb()
+        return result
+
+    if args.mode == "remote":
+        encoded = [p.read_bytes() for p in paths]
+        detect = lambda i: ai_detector.yolo_labels(encoded[i])
+        detect_batch = None
+    else:
+        images = [cv2.imread(str(p)) for p in paths]
+        load_start = time.perf_counter()
+        run_batch = ai_detector._load_detector()
+        result["load_s"] = time.perf_counter() - load_start
+        detect = lambda i: run_batch([images[i]])[0]
+        detect_batch = run_batch
+
+    first_start = time.perf_counter()
+    detect(0)
+    result["first_s"] = time.perf_counter() - first_start
+    result["startup_s"] = time.perf_counter() - START
+
+    latencies, labels = [], []
+    for i in range(len(paths)):
+        start = time.perf_counter()
+        labels.append(detect(i))
+        latencies.append(time.perf_counter() - start)
+    result["p50_ms"], result["p95_ms"] = pct(latencies, 50), pct(latencies, 95)
+    result["issue_types"] = [yolo_rules.get_rules().classify(found)[0] for found in labels]
+
+    if detect_batch is not None:
+        start = time.perf_counter()
+        for i in range(0, len(images), 8):
+            detect_batch(images[i:i + 8])
+        result["batch8_ips"] = len(images) / (time.perf_counter() - start)
+
+    result["rss_mb"], result["peak_rss_mb"] = rss_mb()
+    return result
+
+
+# ── Driver ──
+
+def run_child(backend, mode, args, socket_path=None):
+    env = dict(os.environ, DETECTOR_BACKEND=backend, INFERENCE_SOCKET=socket_path or "")
+    cmd = [sys.executable, __file__, "--measure", mode, "--images", str(args.images)]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"{backend} ({mode}) failed:\n{proc.stderr.strip()[-2000:]}")
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def start_server(backend, socket_path, timeout=180):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    env = dict(os.environ, DETECTOR_BACKEND=backend, INFERENCE_SOCKET=socket_path)
+    server = subprocess.Popen([sys.executable, "inference_server.py"], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(socket_path):
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            return None
+        time.sleep(0.2)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4, help="Web workers for the memory projection")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--shared", action="store_true", help="Also measure latency through inference_server.py")
+    parser.add_argument("--socket", default="/tmp/civic-bench-inference.sock")
+    parser.add_argument("--measure", choices=("local", "remote", "client"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        args.mode = args.measure
+        print(json.dumps(measure(args)))
+        return
+
+    results = {}
+    for backend in args.backends.split(","):
+        results[backend] = run_child(backend, "local", args)
+    client = run_child("torch", "client", args)
+    reference = (results.get("torch") or {}).get("issue_types")
+
+    print(f"{'backend':<12}{'startup':>9}{'load':>8}{'p50':>8}{'p95':>8}{'batch8':>9}{'rss':>8}{'agree':>7}")
+    for backend, r in results.items():
+        if r is None:
+            continue
+        agree = "-"
+        if reference:
+            agree = f"{sum(a == b for a, b in zip(r['issue_types'], reference)) / len(reference):.0%}"
+        print(f"{backend:<12}{r['startup_s']:>8.1f}s{r['load_s']:>7.1f}s{r['p50_ms']:>6.0f}ms{r['p95_ms']:>6.0f}ms"
+              f"{r['batch8_ips']:>6.1f}/s{r['rss_mb']:>6.0f}MB{agree:>7}")
+
+    if client:
+        print()
+        print(f"Detector memory with {args.workers} web workers (client-only worker: {client['rss_mb']:.0f}MB):")
+        for backend, r in results.items():
+            if r is None:
+                continue
+            in_process = args.workers * r["rss_mb"]
+            shared = r["rss_mb"] + args.workers * client["rss_mb"]
+            print(f"  {backend:<12} in-process {in_process:6.0f}MB   shared process {shared:6.0f}MB")
+
+    if args.shared:
+        print()
+        print(f"{'shared':<12}{'p50':>8}{'p95':>8}")
+        for backend in results:
+            server = start_server(backend, args.socket)
+            if server is None:
+                print(f"{backend:<12} inference process did not start")
+                continue
+            try:
+                r = run_child(backend, "remote", args, socket_path=args.socket)
+            finally:
+                server.terminate()
+                server.wait()
+            if r:
+                print(f"{backend:<12}{r['p50_ms']:>6.0f}ms{r['p95_ms']:>6.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
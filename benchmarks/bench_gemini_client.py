@@ -0,0 +1,95 @@
+"""
+How long classification waits on Gemini when it is healthy, slow or down, with
+and without the circuit breaker, against the local fake (fake_gemini.py).
+
+Usage (from the repository root):
+    python benchmarks/bench_gemini_client.py [--calls 200] [--callers 16] [--timeout 2]
+
+Each scenario runs --calls classifications from --callers threads. "wait" is the
+time until the caller either has Gemini's answer or knows to use the local
+detector; "remote" counts requests that actually reached the server and "peak"
+the most that were open there at once (requests the client abandoned at its
+deadline stay open on the hanging fake, so that row exceeds --concurrency).
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import gemini_client
+from fake_gemini import FakeGemini
+
+# Not a decodable image, so it is sent as-is; only the control flow is measured here
+IMAGE = b"\xff\xd8\xff\xe0" + bytes(50_000)
+
+SCENARIOS = [
+    ("healthy", {"delay": 0.2, "fail_rate": 0.0}),
+    ("errors 503", {"delay": 0.05, "fail_rate": 1.0, "status": 503}),
+    ("hanging", {"delay": 30, "fail_rate": 0.0}),
+]
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+def run(client, calls, callers):
+    def one(_):
+        start = time.perf_counter()
+        try:
+            client.generate("Classify this image.", IMAGE)
+            outcome = "ok"
+        except gemini_client.CircuitOpen:
+            outcome = "circuit open"
+        except gemini_client.GeminiUnavailable:
+            outcome = "unavailable"
+        except gemini_client.GeminiResponseError:
+            outcome = "bad response"
+        return outcome, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        results = list(pool.map(one, range(calls)))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=6000, help="Requests per minute")
+    args = parser.parse_args()
+
+    fake = FakeGemini()
+    base_url = fake.start()
+
+    print(f"{'scenario':<12}{'breaker':>8}{'total':>8}{'p50':>9}{'p95':>9}{'remote':>8}{'peak':>6}  outcomes")
+    for name, mode in SCENARIOS:
+        for breaker_on in (False, True):
+            fake.set_mode(**mode)
+            fake.peak_in_flight = fake.in_flight
+            before = fake.requests
+            breaker = gemini_client.CircuitBreaker(5 if breaker_on else 10 ** 9, cooldown=60)
+            client = gemini_client.GeminiClient(
+                api_key="fake", base_url=base_url, timeout=args.timeout, max_concurrency=args.concurrency,
+                rate_per_minute=args.rate, breaker=breaker,
+            )
+            results, elapsed = run(client, args.calls, args.callers)
+            waits = [w for _, w in results]
+            outcomes = ", ".join(f"{k}={v}" for k, v in Counter(o for o, _ in results).most_common())
+            print(f"{name:<12}{'on' if breaker_on else 'off':>8}{elapsed:>7.1f}s{pct(waits, 50):>7.0f}ms"
+                  f"{pct(waits, 95):>7.0f}ms{fake.requests - before:>8}{fake.peak_in_flight:>6}  {outcomes}")
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Login storm benchmark: logins/sec and the latency of a cheap page served
+concurrently, against a running server.
+
+Black-box over HTTP, so the same script measures any revision. To compare
+before/after, start the server from each revision with the same settings:
+
+    cd backend && uvicorn main:app --port 8000 --workers 1
+    python benchmarks/bench_logins.py --url http://127.0.0.1:8000 --clients 50 --logins 500
+
+Requires httpx (see benchmarks/requirements.txt).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+async def register(client, email, password):
+    await client.post("/register", data={
+        "name": "Bench User",
+        "email": email,
+        "password": password,
+        "role": "surveyor",
+        "ward": "1",
+    })
+
+
+async def login_worker(base_url, email, password, remaining, latencies, errors):
+    async with httpx.AsyncClient(base_url=base_url, follow_redirects=False, timeout=60) as client:
+        while remaining:
+            remaining.pop()
+            start = time.perf_counter()
+            res = await client.post("/login", data={"email": email, "password": password})
+            latencies.append(time.perf_counter() - start)
+            if res.status_code != 302:
+                errors.append(res.status_code)
+
+
+async def probe_worker(base_url, stop, latencies):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        while not stop.is_set():
+            start = time.perf_counter()
+            await client.get("/register")
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.05)
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=500)
+    args = parser.parse_args()
+
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = "bench-password"
+    async with httpx.AsyncClient(base_url=args.url) as client:
+        await register(client, email, password)
+
+    remaining = list(range(args.logins))
+    login_latencies, probe_latencies, errors = [], [], []
+    stop = asyncio.Event()
+
+    probe = asyncio.create_task(probe_worker(args.url, stop, probe_latencies))
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        login_worker(args.url, email, password, remaining, login_latencies, errors)
+        for _ in range(args.clients)
+    ])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    print(f"logins:          {len(login_latencies)} in {elapsed:.2f}s ({len(login_latencies) / elapsed:.1f}/s)")
+    print(f"errors:          {len(errors)} {sorted(set(errors))}")
+    print(f"login latency:   p50={pct(login_latencies, 50):.0f}ms p95={pct(login_latencies, 95):.0f}ms")
+    print(f"page latency:    p50={pct(probe_latencies, 50):.0f}ms p95={pct(probe_latencies, 95):.0f}ms "
+          f"(mean {statistics.mean(probe_latencies) * 1000 if probe_latencies else 0:.0f}ms)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
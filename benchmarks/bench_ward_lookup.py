@@ -0,0 +1,116 @@
+"""
+Ward lookup throughput with a synthetic city of 500 irregular ward polygons.
+
+Compares the grid index against a linear scan over every polygon, for single
+lookups and the bulk API, and checks both agree.
+
+    python benchmarks/bench_ward_lookup.py [--wards 500] [--points 100000]
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+
+import wards
+
+# Bounding box roughly around the default report location (22.30, 70.80)
+MIN_LAT, MAX_LAT = 22.20, 22.40
+MIN_LON, MAX_LON = 70.70, 70.90
+
+
+def synthetic_city(n_wards, seed=42):
+    """A jittered grid of wards whose shared edges are wavy polylines."""
+    rng = random.Random(seed)
+    cols = int(math.ceil(math.sqrt(n_wards)))
+    rows = int(math.ceil(n_wards / cols))
+    dx = (MAX_LON - MIN_LON) / cols
+    dy = (MAX_LAT - MIN_LAT) / rows
+
+    # Jittered shared vertices so neighbouring polygons tile without gaps
+    corners = {
+        (c, r): (
+            MIN_LON + c * dx + (rng.uniform(-0.3, 0.3) * dx if 0 < c < cols else 0),
+            MIN_LAT + r * dy + (rng.uniform(-0.3, 0.3) * dy if 0 < r < rows else 0),
+        )
+        for c in range(cols + 1) for r in range(rows + 1)
+    }
+
+    def edge(a, b, steps=4):
+        return [(a[0] + (b[0] - a[0]) * t / steps, a[1] + (b[1] - a[1]) * t / steps) for t in range(steps)]
+
+    features = []
+    for n in range(n_wards):
+        c, r = n % cols, n // cols
+        ring = (
+            edge(corners[c, r], corners[c + 1, r])
+            + edge(corners[c + 1, r], corners[c + 1, r + 1])
+            + edge(corners[c + 1, r + 1], corners[c, r + 1])
+            + edge(corners[c, r + 1], corners[c, r])
+        )
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "properties": {"ward": n + 1},
+            "geometry": {"type": "Polygon", "coordinates": [[list(p) for p in ring]]},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def linear_lookup(parts, lat, lon):
+    for part in parts:
+        if part.contains(lon, lat):
+            return part.ward
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wards", type=int, default=500)
+    parser.add_argument("--points", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".geojson", delete=False) as f:
+        json.dump(synthetic_city(args.wards), f)
+        path = f.name
+
+    start = time.perf_counter()
+    index = wards.load_geojson(path)
+    build = time.perf_counter() - start
+
+    rng = random.Random(7)
+    points = [(rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LON, MAX_LON)) for _ in range(args.points)]
+
+    start = time.perf_counter()
+    single = [index.lookup(lat, lon) for lat, lon in points]
+    single_rate = len(points) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    bulk = index.lookup_many(points)
+    bulk_rate = len(points) / (time.perf_counter() - start)
+
+    sample = points[: max(1, len(points) // 50)]
+    start = time.perf_counter()
+    linear = [linear_lookup(index.parts, lat, lon) for lat, lon in sample]
+    linear_rate = len(sample) / (time.perf_counter() - start)
+
+    assert single == bulk
+    assert linear == single[: len(sample)], "grid index disagrees with linear scan"
+    unassigned = sum(1 for w in single if w is None)
+
+    print(f"wards:               {args.wards} ({len(index.parts)} polygons), index built in {build * 1000:.1f} ms")
+    print(f"grid lookups/sec:    {single_rate:,.0f}")
+    print(f"bulk lookups/sec:    {bulk_rate:,.0f}")
+    print(f"linear scan/sec:     {linear_rate:,.0f}")
+    print(f"unassigned points:   {unassigned}")
+    Path(path).unlink()
+
+
+if __name__ == "__main__":
+    main()
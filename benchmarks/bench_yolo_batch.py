@@ -0,0 +1,72 @@
+"""
+Compare YOLO throughput (images/sec) on CPU at batch sizes 1, 8 and 32,
+and through the micro-batching service with concurrent callers.
+
+Usage (from the repository root):
+    python benchmarks/bench_yolo_batch.py [--images 64] [--callers 32]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+
+import cv2
+import ai_detector
+
+UPLOAD_DIR = ROOT / "frontend" / "static" / "uploads"
+
+
+def load_images(n):
+    images = []
+    for path in sorted(UPLOAD_DIR.iterdir()):
+        img = cv2.imread(str(path))
+        if img is not None:
+            images.append(img)
+    if not images:
+        raise SystemExit(f"No readable images found in {UPLOAD_DIR}")
+    return [images[i % len(images)] for i in range(n)]
+
+
+def bench_direct(model, images, batch_size):
+    # Warm-up so model fusing / allocator setup is not measured
+    ai_detector._run_yolo_batch(model, images[:batch_size])
+
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        ai_detector._run_yolo_batch(model, images[i:i + batch_size])
+    return len(images) / (time.perf_counter() - start)
+
+
+def bench_batcher(model, images, callers, max_batch):
+    batcher = ai_detector.YoloBatcher(lambda batch: ai_detector._run_yolo_batch(model, batch), max_batch=max_batch)
+    batcher.submit(images[0]).result()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(lambda img: batcher.submit(img).result(), images))
+    return len(images) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--callers", type=int, default=32)
+    args = parser.parse_args()
+
+    model = ai_detector._load_yolo()
+    images = load_images(args.images)
+
+    print(f"{'mode':<28}{'images/sec':>12}")
+    for batch_size in (1, 8, 32):
+        print(f"{f'direct batch={batch_size}':<28}{bench_direct(model, images, batch_size):>12.2f}")
+    for max_batch in (1, 8, 32):
+        rate = bench_batcher(model, images, args.callers, max_batch)
+        print(f"{f'batcher max_batch={max_batch}':<28}{rate:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
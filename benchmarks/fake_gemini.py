@@ -0,0 +1,135 @@
+"""
+A local stand-in for the Gemini generateContent REST endpoint, for exercising
+gemini_client (deadlines, rate limiting, circuit breaker) without the real API.
+
+    python benchmarks/fake_gemini.py --port 8765 [--delay 0.5] [--fail-rate 0.2] [--status 503]
+    cd backend && GEMINI_API_BASE=http://127.0.0.1:8765 GEMINI_API_KEY=fake uvicorn main:app
+
+Healthy replies carry a fixed classification. The behaviour can be changed while
+running: POST /_mode with a JSON body such as {"delay": 5} or {"status": 503,
+"fail_rate": 1}. GET /_stats returns request counts and the peak number of
+requests in flight at once.
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = {
+    "reasoning": "Fake Gemini: a deep pothole in the carriageway.",
+    "issue_type": "Pothole",
+    "priority": "High",
+    "confidence": 91,
+}
+
+
+class FakeGemini:
+    def __init__(self, delay: float = 0.2, fail_rate: float = 0.0, status: int = 503):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.status = status
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.image_bytes = 0
+        self._lock = threading.Lock()
+        self.server = None
+
+    def set_mode(self, **mode):
+        for key in ("delay", "fail_rate", "status"):
+            if key in mode:
+                setattr(self, key, type(getattr(self, key))(mode[key]))
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "failures": self.failures,
+                "peak_in_flight": self.peak_in_flight, "image_bytes": self.image_bytes}
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in a background thread. Returns the base URL."""
+        self.server = ThreadingHTTPServer((host, port), _handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-gemini", daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def _handler(fake: FakeGemini):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/_stats":
+                return self._json(200, fake.stats())
+            self._json(404, {"error": {"code": 404, "message": "Not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/_mode":
+                fake.set_mode(**body)
+                return self._json(200, fake.stats())
+            if not self.path.endswith(":generateContent"):
+                return self._json(404, {"error": {"code": 404, "message": "Not found"}})
+            if not self.headers.get("x-goog-api-key"):
+                return self._json(403, {"error": {"code": 403, "message": "API key missing"}})
+
+            parts = body.get("contents", [{}])[0].get("parts", [])
+            image = next((p["inline_data"]["data"] for p in parts if "inline_data" in p), "")
+            with fake._lock:
+                fake.requests += 1
+                fake.in_flight += 1
+                fake.peak_in_flight = max(fake.peak_in_flight, fake.in_flight)
+                fake.image_bytes += len(base64.b64decode(image))
+            try:
+                time.sleep(fake.delay)
+                if random.random() < fake.fail_rate:
+                    with fake._lock:
+                        fake.failures += 1
+                    return self._json(fake.status, {"error": {"code": fake.status, "message": "Fake failure"}})
+                text = "```json\n" + json.dumps(ANSWER) + "\n```"
+                self._json(200, {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client gave up (deadline)
+            finally:
+                with fake._lock:
+                    fake.in_flight -= 1
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds before each reply")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with --status")
+    parser.add_argument("--status", type=int, default=503)
+    args = parser.parse_args()
+
+    fake = FakeGemini(args.delay, args.fail_rate, args.status)
+    print(f"Fake Gemini listening on {fake.start(args.host, args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Replay the surveyor -> engineer -> admin workflow against a running server and
+report latency percentiles and throughput per route, as JSON that can be kept
+per commit and compared.
+
+1. Seed a scratch database (see seed_data.py) and start the server on it with
+   the stub detector. Email and Gemini must be unset, so the OTP is shown on the
+   verify page and no request leaves the machine:
+
+    DATABASE_URL=sqlite:////tmp/civic-bench.db python benchmarks/seed_data.py --issues 100000 --reset
+    cd backend && DATABASE_URL=sqlite:////tmp/civic-bench.db DETECTOR_BACKEND=stub \\
+        GEMINI_API_KEY= SMTP_EMAIL= SMTP_PASSWORD= uvicorn main:app --port 8000
+
+2. Run the mix and keep the result:
+
+    python benchmarks/load_test.py --users 60 --seconds 120 --out bench-$(git rev-parse --short HEAD).json
+    python benchmarks/load_test.py --users 60 --seconds 120 --compare bench-<previous>.json
+
+Each virtual user logs in (password + OTP), performs --actions-per-session actions
+for its role with exponential think time, logs out and starts over:
+
+    surveyor  POST /report (random image and location), then polls /report/{id}/status
+    engineer  GET /engineer; with --work-ratio also picks an open issue, POST /start, POST /close
+    admin     GET /admin, sometimes GET /api/v1/stats
+
+Every virtual user needs its own seeded account (logins from two clients at once
+would overwrite each other's OTP), so keep --users within the seeded counts.
+
+Requires httpx (see benchmarks/requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import struct
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_PASSWORD = "bench-password"
+LAT_RANGE = (22.25, 22.37)
+LON_RANGE = (70.74, 70.86)
+OTP_PATTERN = re.compile(r'class="code">\s*(\d{6})\s*<')
+
+
+def bmp_image(rng, size):
+    """A random-noise 24-bit BMP: unique content, so every report misses the detection cache."""
+    row = (size * 3 + 3) & ~3
+    pixels = rng.randbytes(row * size)
+    header = b"BM" + struct.pack("<IHHI", 54 + len(pixels), 0, 0, 54)
+    info = struct.pack("<IiiHHIIiiII", 40, size, size, 1, 24, 0, len(pixels), 2835, 2835, 0, 0)
+    return header + info + pixels
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, route, seconds, ok):
+        self.latencies.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed):
+        routes = {}
+        everything = []
+        for route, values in sorted(self.latencies.items()):
+            everything += values
+            routes[route] = _stats(values, self.errors.get(route, 0), elapsed)
+        total = _stats(everything, sum(self.errors.values()), elapsed) if everything else {}
+        return routes, total
+
+
+def _stats(values, errors, elapsed):
+    return {
+        "count": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(pct(values, 50), 2),
+        "p95_ms": round(pct(values, 95), 2),
+        "p99_ms": round(pct(values, 99), 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+class VirtualUser:
+    def __init__(self, role, email, args, recorder, rng):
+        self.role = role
+        self.email = email
+        self.args = args
+        self.recorder = recorder
+        self.rng = rng
+
+    async def request(self, client, route, method, path, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            res = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.add(route, time.perf_counter() - start, False)
+            return None
+        ok = res.status_code in expect
+        self.recorder.add(route, time.perf_counter() - start, ok)
+        return res if ok else None
+
+    async def login(self, client):
+        res = await self.request(client, "login", "POST", "/login", expect=(302,),
+                                 data={"email": self.email, "password": self.args.password})
+        if res is None or "/verify-otp" not in res.headers.get("location", ""):
+            return False
+        page = await self.request(client, "verify_otp_page", "GET", "/verify-otp")
+        match = OTP_PATTERN.search(page.text) if page is not None else None
+        if match is None:
+            # Email is configured on the server, so the OTP is not on the page
+            return False
+        res = await self.request(client, "verify_otp", "POST", "/verify-otp", expect=(302,),
+                                 data={"otp": match.group(1)})
+        return res is not None
+
+    async def surveyor(self, client):
+        res = await self.request(client, "report", "POST", "/report", files={
+            "image": ("bench.bmp", bmp_image(self.rng, self.args.image_size), "image/bmp"),
+        }, data={
+            "latitude": str(self.rng.uniform(*LAT_RANGE)),
+            "longitude": str(self.rng.uniform(*LON_RANGE)),
+        })
+        if res is None:
+            return
+        issue_id = res.json().get("issue_id")
+        for _ in range(self.args.status_polls):
+            status = await self.request(client, "report_status", "GET", f"/report/{issue_id}/status")
+            if status is None or status.json().get("classification_status") == "DONE":
+                return
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def engineer(self, client):
+        await self.request(client, "engineer", "GET", "/engineer")
+        if self.rng.random() >= self.args.work_ratio:
+            return
+        res = await self.request(client, "api_issues", "GET", "/api/v1/issues",
+                                 params={"status": "OPEN", "limit": 50, "fields": "id"})
+        items = res.json().get("items", []) if res is not None else []
+        if not items:
+            return
+        issue_id = self.rng.choice(items)["id"]
+        await self.request(client, "start", "POST", f"/start/{issue_id}", expect=(302,))
+        await self.request(client, "close", "POST", f"/close/{issue_id}", expect=(302,), files={
+            "image": ("after.bmp", bmp_image(self.rng, self.args.image_size), "image/bmp"),
+        })
+
+    async def admin(self, client):
+        await self.request(client, "admin", "GET", "/admin")
+        if self.rng.random() < 0.3:
+            await self.request(client, "api_stats", "GET", "/api/v1/stats")
+
+    async def run(self, deadline):
+        action = getattr(self, self.role)
+        async with httpx.AsyncClient(base_url=self.args.url, follow_redirects=False, timeout=60) as client:
+            while time.perf_counter() < deadline:
+                if not await self.login(client):
+                    await asyncio.sleep(1)
+                    continue
+                for _ in range(self.args.actions_per_session):
+                    if time.perf_counter() >= deadline:
+                        break
+                    await action(client)
+                    if self.args.think > 0:
+                        await asyncio.sleep(self.rng.expovariate(1 / self.args.think))
+                await self.request(client, "logout", "GET", "/logout", expect=(302,))
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        role, _, weight = part.partition("=")
+        if role not in ("surveyor", "engineer", "admin"):
+            raise SystemExit(f"Unknown role in --mix: {role!r}")
+        mix[role] = float(weight or 1)
+    return mix
+
+
+def allocate(users, mix):
+    """Split --users between roles in proportion to the mix (largest remainder)."""
+    total = sum(mix.values())
+    shares = {role: users * w / total for role, w in mix.items()}
+    counts = {role: int(s) for role, s in shares.items()}
+    for role in sorted(shares, key=lambda r: shares[r] - counts[r], reverse=True)[:users - sum(counts.values())]:
+        counts[role] += 1
+    return counts
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_report(result, baseline=None):
+    base_routes = baseline["routes"] if baseline else {}
+    print(f"{'route':<16}{'count':>8}{'err':>6}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = list(result["routes"].items()) + [("TOTAL", result["total"])]
+    for route, r in rows:
+        base = (baseline["total"] if route == "TOTAL" else base_routes.get(route)) if baseline else None
+        line = (f"{route:<16}{r['count']:>8}{r['errors']:>6}{r['rps']:>9.1f}"
+                f"{r['p50_ms']:>8.0f}ms{r['p95_ms']:>8.0f}ms{r['p99_ms']:>8.0f}ms")
+        if base:
+            deltas = [f"{k[:3]} {_delta(r[k], base[k])}" for k in ("p50_ms", "p95_ms", "p99_ms", "rps")]
+            line += "   " + "  ".join(deltas)
+        print(line)
+
+
+def _delta(value, before):
+    if not before:
+        return "   n/a"
+    return f"{(value - before) / before:+6.1%}"
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=30, help="Concurrent virtual users")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--mix", default="surveyor=5,engineer=4,admin=1", help="Relative share of each role")
+    parser.add_argument("--surveyors", type=int, default=50, help="Seeded surveyor accounts")
+    parser.add_argument("--engineers", type=int, default=20, help="Seeded engineer accounts")
+    parser.add_argument("--admins", type=int, default=3, help="Seeded admin accounts")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--actions-per-session", type=int, default=20)
+    parser.add_argument("--think", type=float, default=0.5, help="Mean seconds between actions (0 = closed loop)")
+    parser.add_argument("--work-ratio", type=float, default=0.3, help="Share of engineer actions that start/close")
+    parser.add_argument("--status-polls", type=int, default=5)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--image-size", type=int, default=64, help="Side of the generated images in pixels")
+    parser.add_argument("--seed", type=int, default=2026)
+    parser.add_argument("--out", help="Write the JSON result here")
+    parser.add_argument("--compare", help="Earlier JSON result to show deltas against")
+    args = parser.parse_args()
+
+    counts = allocate(args.users, parse_mix(args.mix))
+    accounts = {"surveyor": args.surveyors, "engineer": args.engineers, "admin": args.admins}
+    for role, n in counts.items():
+        if n > accounts[role]:
+            print(f"warning: {n} {role} users share {accounts[role]} accounts; expect OTP errors", file=sys.stderr)
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    users = [
+        VirtualUser(role, f"{role}{i % accounts[role] + 1}@bench.local", args, recorder, random.Random(rng.random()))
+        for role, n in counts.items() for i in range(n)
+    ]
+
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    start = time.perf_counter()
+    await asyncio.gather(*[u.run(start + args.seconds) for u in users])
+    elapsed = time.perf_counter() - start
+
+    routes, total = recorder.summary(elapsed)
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": started_at,
+            "url": args.url,
+            "users": counts,
+            "seconds": round(elapsed, 2),
+            "think": args.think,
+            "work_ratio": args.work_ratio,
+            "seed": args.seed,
+        },
+        "routes": routes,
+        "total": total,
+    }
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    if not total:
+        raise SystemExit("No requests completed; is the server running and seeded?")
+    print_report(result, baseline)
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2))
+    else:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
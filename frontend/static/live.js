@@ -0,0 +1,54 @@
+// ── Live Issue Events ──
+// Subscribes to /events (server-sent events) and hands each issue event to the
+// page's handler. After a dropped connection or a resync request the page is
+// reloaded, since events may have been missed in between.
+
+function subscribeIssueEvents(url, onEvent) {
+    if (!window.EventSource) return null;
+
+    var source = new EventSource(url);
+    var connectedOnce = false;
+    var types = ['created', 'classified', 'updated', 'started', 'closed', 'deleted'];
+
+    source.onopen = function () {
+        if (connectedOnce) window.location.reload();
+        connectedOnce = true;
+    };
+    types.forEach(function (type) {
+        source.addEventListener(type, function (e) {
+            onEvent(JSON.parse(e.data));
+        });
+    });
+    source.addEventListener('resync', function () {
+        window.location.reload();
+    });
+    return source;
+}
+
+// Fetch a server-rendered fragment; resolves to an element, or null when the issue is gone.
+function fetchFragment(url) {
+    return fetch(url, { credentials: 'same-origin' }).then(function (res) {
+        if (!res.ok) return null;
+        return res.text().then(function (html) {
+            var tpl = document.createElement('template');
+            tpl.innerHTML = html.trim();
+            return tpl.content.firstElementChild;
+        });
+    });
+}
+
+function replaceOrInsert(container, id, el, prepend) {
+    var existing = document.getElementById(id);
+    if (existing) {
+        existing.replaceWith(el);
+    } else if (prepend && container) {
+        container.insertBefore(el, container.firstChild);
+    }
+}
+
+function removeElement(id) {
+    var el = document.getElementById(id);
+    if (!el) return;
+    el.style.opacity = '0';
+    setTimeout(function () { el.remove(); }, 400);
+}
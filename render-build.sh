@@ -5,4 +5,7 @@ set -o errexit
 # Install python dependencies from the backend folder
 pip install -r backend/requirements-deploy.txt
 
-# Add any other build steps here (like database migrations if you used Alembic)
+# Bring an existing database up to the current schema (idempotent)
+cd backend && python manage.py migrate
+# Tile columns for issues created before the spatial index (no-op once filled)
+python manage.py backfill-tiles
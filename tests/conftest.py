@@ -0,0 +1,93 @@
+import base64
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other top-level and read their settings from the
+# environment at import time, so point them at a throwaway SQLite database and
+# storage directory before anything imports them.
+_tmp = tempfile.mkdtemp(prefix="civic-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["STORAGE_DIR"] = f"{_tmp}/storage"
+os.environ["SESSION_SECRET"] = "test-secret"
+os.environ.setdefault("CLASSIFIER_WORKERS", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from database import SessionLocal, engine  # noqa: E402
+import models  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    for directory in ("blobs", "derivatives"):
+        shutil.rmtree(Path(os.environ["STORAGE_DIR"]) / directory, ignore_errors=True)
+        (Path(os.environ["STORAGE_DIR"]) / directory).mkdir(parents=True)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_issue(db):
+    import geo
+
+    def make(lat=22.30, lon=70.80, issue_type="Pothole", status="OPEN", ward=1, **fields):
+        issue = models.Issue(
+            issue_type=issue_type, status=status, ward=ward, latitude=lat, longitude=lon,
+            **geo.tile_columns(lat, lon), **fields
+        )
+        db.add(issue)
+        db.flush()
+        return issue
+
+    return make
+
+
+@pytest.fixture
+def bmp():
+    """Factory for small 24-bit BMP images; the seed makes the content unique."""
+
+    def make(seed=0, size=8):
+        pixels = random.Random(seed).randbytes(((size * 3 + 3) & ~3) * size)
+        header = b"BM" + struct.pack("<IHHI", 54 + len(pixels), 0, 0, 54)
+        info = struct.pack("<IiiHHIIiiII", 40, size, size, 1, 24, 0, len(pixels), 2835, 2835, 0, 0)
+        return header + info + pixels
+
+    return make
+
+
+@pytest.fixture
+def client(db):
+    """TestClient over the app, without running the startup hooks (no background workers)."""
+    from fastapi.testclient import TestClient
+    from itsdangerous import TimestampSigner
+    import main
+    import principals
+
+    principals._entries.clear()
+    client = TestClient(main.app, follow_redirects=False)
+
+    def login(role, ward=1):
+        """Create a user with role and sign the client's session cookie for it."""
+        user = models.User(name=role, email=f"{role}@example.com", password_hash="x", role=role,
+                           ward=ward, is_verified=True)
+        db.add(user)
+        db.commit()
+        data = base64.b64encode(json.dumps({"user_id": user.id, "user_role": role}).encode("utf-8"))
+        client.cookies.set("session", TimestampSigner("test-secret").sign(data).decode("utf-8"))
+        return user
+
+    client.login = login
+    return client
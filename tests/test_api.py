@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def engineer(client):
+    client.login("engineer")
+    return client
+
+
+@pytest.mark.parametrize("path", [
+    "/api/v1/issues", "/api/v1/issues/1", "/api/v1/issues/nearest?lat=22.3&lon=70.8", "/api/v1/stats",
+])
+def test_requires_login(client, path):
+    assert client.get(path).status_code == 401
+
+
+@pytest.mark.parametrize("path", ["/api/v1/issues", "/api/v1/wards"])
+def test_citizens_are_forbidden(client, path):
+    client.login("citizen")
+    assert client.get(path).status_code == 403
+
+
+def test_cursor_pages_through_every_issue_once(engineer, db, make_issue):
+    # Explicit timestamps (SQLite's CURRENT_TIMESTAMP has no fractional seconds);
+    # the repeated ones exercise the id tie-break.
+    times = [datetime(2026, 1, 1, 12, 0, s) for s in (0, 0, 1, 1, 1)]
+    issues = [make_issue(created_at=t) for t in times]
+    db.commit()
+    expected = [i.id for i in sorted(issues, key=lambda i: (i.created_at, i.id), reverse=True)]
+
+    seen, cursor = [], None
+    for _ in range(5):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = engineer.get("/api/v1/issues", params=params).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+
+def test_malformed_cursor_is_rejected(engineer):
+    assert engineer.get("/api/v1/issues", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_fields_selects_the_returned_keys(engineer, db, make_issue):
+    issue = make_issue()
+    db.commit()
+
+    response = engineer.get(f"/api/v1/issues/{issue.id}", params={"fields": "id,status"})
+
+    assert response.json() == {"id": issue.id, "status": "OPEN"}
+
+
+def test_unknown_fields_are_rejected(engineer, db, make_issue):
+    issue = make_issue()
+    db.commit()
+    response = engineer.get(f"/api/v1/issues/{issue.id}", params={"fields": "id,password"})
+    assert response.status_code == 400
+    assert "password" in response.json()["error"]
+
+
+def test_missing_issue_is_404(engineer):
+    assert engineer.get("/api/v1/issues/999").status_code == 404
+
+
+def test_etag_round_trip(engineer, db, make_issue):
+    issue = make_issue()
+    db.commit()
+    path = f"/api/v1/issues/{issue.id}"
+
+    first = engineer.get(path)
+    etag = first.headers["ETag"]
+    unchanged = engineer.get(path, headers={"If-None-Match": etag})
+
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["ETag"] == etag
+
+    issue.status = "IN_PROGRESS"
+    db.commit()
+    changed = engineer.get(path, headers={"If-None-Match": etag})
+
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["status"] == "IN_PROGRESS"
+
+
+def test_bbox_rejects_inverted_box(engineer):
+    params = {"min_lat": 22.4, "min_lon": 70.7, "max_lat": 22.2, "max_lon": 70.9}
+    assert engineer.get("/api/v1/issues/bbox", params=params).status_code == 400
+
+
+def test_bbox_returns_issues_inside(engineer, db, make_issue):
+    inside = make_issue(lat=22.30, lon=70.80)
+    make_issue(lat=23.00, lon=70.80)
+    db.commit()
+
+    params = {"min_lat": 22.2, "min_lon": 70.7, "max_lat": 22.4, "max_lon": 70.9, "fields": "id"}
+    body = engineer.get("/api/v1/issues/bbox", params=params).json()
+
+    assert body == {"items": [{"id": inside.id}], "truncated": False}
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import auth
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A one-worker hashing pool with room for one queued job."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(auth, "_hash_executor", executor)
+    monkeypatch.setattr(auth, "_hash_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(auth, "_hash_stats", dict.fromkeys(auth._hash_stats, 0))
+    yield auth
+    executor.shutdown(wait=True)
+
+
+def test_async_hash_and_verify_round_trip(pool):
+    hashed = asyncio.run(pool.hash_password_async("s3cret"))
+
+    assert asyncio.run(pool.verify_password_async("s3cret", hashed))
+    assert not asyncio.run(pool.verify_password_async("wrong", hashed))
+    stats = pool.hashing_stats()
+    assert stats["completed"] == 3
+    assert stats["queued"] == stats["running"] == 0
+
+
+def test_needs_rehash_follows_the_configured_cost(pool, monkeypatch):
+    hashed = pool.hash_password("s3cret")
+    assert not pool.needs_rehash(hashed)
+
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    assert pool.needs_rehash(hashed)
+    assert pool.needs_rehash("not-a-bcrypt-hash")
+
+
+def test_full_queue_rejects_with_hashing_busy(pool):
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool._submit(release.wait, 5))
+        queued = asyncio.ensure_future(pool._submit(release.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(pool.HashingBusy):
+            await pool._submit(release.wait, 5)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+    stats = pool.hashing_stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+
+
+def test_cancelled_queued_job_gives_its_slot_back(pool):
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool._submit(release.wait, 5))
+        queued = asyncio.ensure_future(pool._submit(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await asyncio.sleep(0.05)
+        # The cancelled job's slot is free again, so this one is accepted.
+        replacement = asyncio.ensure_future(pool._submit(release.wait, 5))
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.gather(running, replacement)
+
+    asyncio.run(scenario())
+    stats = pool.hashing_stats()
+    assert stats["cancelled"] == 1
+    assert stats["rejected"] == 0
+    assert stats["queued"] == 0
@@ -0,0 +1,41 @@
+import pytest
+
+import blobstore
+import thumbnails
+
+
+@pytest.fixture
+def stored(db, bmp):
+    import cv2
+    import numpy as np
+
+    data = cv2.imencode(".jpg", cv2.imdecode(np.frombuffer(bmp(size=64), np.uint8), cv2.IMREAD_COLOR))[1].tobytes()
+    key = blobstore.put(db, data, ".jpg")
+    db.commit()
+    return key
+
+
+@pytest.mark.parametrize("header", ['"{digest}"', 'W/"{digest}"', '"other", W/"{digest}"', "*"])
+def test_blob_revalidation_matches_weak_and_listed_tags(client, stored, header):
+    digest = blobstore.digest_of(stored)
+    res = client.get(f"/blobs/{stored}", headers={"If-None-Match": header.format(digest=digest)})
+    assert res.status_code == 304
+    assert res.headers["etag"] == f'"{digest}"'
+
+
+def test_blob_with_stale_tag_is_sent(client, stored):
+    res = client.get(f"/blobs/{stored}", headers={"If-None-Match": '"stale"'})
+    assert res.status_code == 200 and res.content == blobstore.blob_path(stored).read_bytes()
+
+
+def test_thumbnail_revalidates_without_rendering(client, stored, monkeypatch):
+    width = thumbnails.THUMBNAIL_WIDTHS[0]
+    first = client.get(f"/thumbs/{width}/jpg/{stored}")
+    assert first.status_code == 200
+
+    async def no_render(*args):
+        raise AssertionError("thumbnail rendered for a conditional request")
+
+    monkeypatch.setattr(thumbnails, "get_path", no_render)
+    res = client.get(f"/thumbs/{width}/jpg/{stored}", headers={"If-None-Match": "W/" + first.headers["etag"]})
+    assert res.status_code == 304
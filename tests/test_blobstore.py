@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import blobstore
+import models
+
+
+def test_concurrent_writes_of_one_key_all_succeed():
+    data = b"\xff\xd8" + bytes(range(256)) * 4096
+    key = blobstore.key_for(data, ".jpg")
+    path = blobstore.blob_path(key)
+
+    def write(_):
+        blobstore._write_atomic(path, data)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(write, range(64)))
+
+    assert path.read_bytes() == data
+    assert [p.name for p in path.parent.iterdir()] == [key]
+
+
+def _refcount(db, key):
+    db.expire_all()
+    blob = db.get(models.Blob, key)
+    return None if blob is None else blob.refcount
+
+
+def test_put_deduplicates_content_and_counts_references(db):
+    first = blobstore.put(db, b"same bytes", ".JPG")
+    second = blobstore.put(db, b"same bytes", ".jpg")
+    db.commit()
+
+    assert first == second
+    assert first.endswith(".jpg")
+    assert blobstore.blob_path(first).read_bytes() == b"same bytes"
+    assert _refcount(db, first) == 2
+    assert db.get(models.Blob, first).size == len(b"same bytes")
+
+
+def test_collect_keeps_referenced_blobs(db):
+    key = blobstore.put(db, b"shared", ".jpg")
+    blobstore.put(db, b"shared", ".jpg")
+    db.commit()
+
+    blobstore.release(db, key)
+    db.commit()
+
+    assert blobstore.collect(db) == 0
+    assert _refcount(db, key) == 1
+    assert blobstore.blob_path(key).exists()
+
+
+def test_collect_removes_unreferenced_blob_and_its_derivatives(db):
+    key = blobstore.put(db, b"orphan", ".png")
+    db.commit()
+    derivative = blobstore.put_derivative(key, 320, b"thumb")
+    blobstore.release(db, key)
+    db.commit()
+
+    assert blobstore.collect(db) == 1
+    assert _refcount(db, key) is None
+    assert not blobstore.blob_path(key).exists()
+    assert not derivative.exists()
+
+
+def test_collect_can_be_limited_to_given_keys(db):
+    kept = blobstore.put(db, b"one", ".jpg")
+    gone = blobstore.put(db, b"two", ".jpg")
+    db.commit()
+    blobstore.release(db, kept)
+    blobstore.release(db, gone)
+    db.commit()
+
+    assert blobstore.collect_keys([gone, "legacy.jpg"]) == 1
+    assert blobstore.blob_path(kept).exists()
+    assert not blobstore.blob_path(gone).exists()
+    assert blobstore.collect_keys(["legacy.jpg"]) == 0
+
+
+def test_release_ignores_legacy_names(db):
+    blobstore.release(db, "1700000000_photo.jpg")
+    db.commit()
+    assert db.query(models.Blob).count() == 0
+
+
+def test_discard_removes_only_unreferenced_files(db):
+    orphan = blobstore.key_for(b"failed request", ".jpg")
+    blobstore.write(orphan, b"failed request")
+    referenced = blobstore.put(db, b"committed", ".jpg")
+    db.commit()
+
+    blobstore.discard(orphan)
+    blobstore.discard(referenced)
+
+    assert not blobstore.blob_path(orphan).exists()
+    assert blobstore.blob_path(referenced).exists()
+
+
+def test_url_for_distinguishes_blobs_from_legacy_uploads():
+    key = blobstore.key_for(b"x", ".webp")
+    assert blobstore.url_for(key) == f"/blobs/{key}"
+    assert blobstore.url_for("old.jpg") == "/static/uploads/old.jpg"
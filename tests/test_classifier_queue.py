@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import ai_detector
+import classifier
+import detection_cache
+import models
+
+
+def _job(db, issue_id=1, **fields):
+    job = models.ClassificationJob(issue_id=issue_id, image_path="/nonexistent.jpg", **fields)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def test_claim_marks_the_oldest_pending_job_running(db):
+    first = _job(db, status="PENDING")
+    _job(db, status="PENDING")
+
+    assert classifier._claim_job(db) == (first, 1, "/nonexistent.jpg", None)
+    job = db.get(models.ClassificationJob, first)
+    db.refresh(job)
+    assert (job.status, job.attempts) == ("RUNNING", 1)
+    assert job.locked_at is not None
+
+
+def test_claim_returns_none_when_queue_is_empty(db):
+    _job(db, status="DONE")
+    assert classifier._claim_job(db) is None
+
+
+def test_running_job_is_not_reclaimed_while_its_lease_holds(db):
+    _job(db, status="RUNNING", attempts=1, locked_at=datetime.utcnow())
+    assert classifier._claim_job(db) is None
+
+
+def test_expired_lease_is_reclaimed(db):
+    expired = datetime.utcnow() - timedelta(seconds=classifier.CLASSIFIER_LEASE_SECONDS + 1)
+    job_id = _job(db, status="RUNNING", attempts=1, locked_at=expired)
+
+    assert classifier._claim_job(db)[0] == job_id
+    job = db.get(models.ClassificationJob, job_id)
+    db.refresh(job)
+    assert (job.status, job.attempts) == ("RUNNING", 2)
+
+
+def test_claim_loses_to_a_concurrent_claim(db):
+    job_id = _job(db, status="PENDING")
+    jobs = models.ClassificationJob.__table__
+
+    raced = []
+
+    def other_worker_claims_first(state):
+        # Runs just before our conditional UPDATE, after the SELECT picked the row
+        if state.is_update and not raced:
+            raced.append(True)
+            state.session.connection().execute(
+                jobs.update().where(jobs.c.id == job_id).values(status="RUNNING", attempts=1)
+            )
+
+    event.listen(db, "do_orm_execute", other_worker_claims_first)
+    assert classifier._claim_job(db) is None
+    assert raced
+    job = db.get(models.ClassificationJob, job_id)
+    db.refresh(job)
+    assert job.attempts == 1
+
+
+def test_defer_returns_the_job_without_using_an_attempt(db):
+    job_id = _job(db, status="PENDING")
+    classifier._claim_job(db)
+
+    classifier._defer_job(db, job_id, RuntimeError("detector down"))
+    job = db.get(models.ClassificationJob, job_id)
+    db.refresh(job)
+    assert (job.status, job.attempts, job.last_error) == ("PENDING", 0, "detector down")
+
+
+def test_job_run_elsewhere_hits_the_cache_entry_of_the_original_upload(db, make_issue, bmp, tmp_path, monkeypatch):
+    # The inline derivative is gone (another process, or evicted), so the worker
+    # re-derives the image from the stored file: different bytes, same cache key.
+    inference = bmp(seed=1)
+    stored = tmp_path / "display.bmp"
+    stored.write_bytes(bmp(seed=2))
+    issue = make_issue(issue_type=classifier.PENDING_ISSUE_TYPE)
+    classifier.enqueue(db, issue, str(stored), image_bytes=inference)
+    db.commit()
+    classifier._inline_images.clear()
+
+    cached = ("Pothole", "High", 88, "cached")
+    detection_cache.put(detection_cache.key_for_bytes(inference), cached)
+    monkeypatch.setattr(ai_detector, "GEMINI_API_KEY", "")
+
+    def no_inference(image_bytes):
+        raise AssertionError("detector called despite a cached result")
+
+    monkeypatch.setattr(ai_detector, "_detect_with_yolo", no_inference)
+    assert classifier.run_once() is True
+
+    db.refresh(issue)
+    assert (issue.issue_type, issue.classification_status) == ("Pothole", "DONE")
@@ -0,0 +1,37 @@
+import dedup
+import models
+
+
+def test_merge_into_keeps_the_report_and_deletes_the_issue(db, make_issue):
+    canonical = make_issue(before_image="a.jpg", reporter_id=1)
+    duplicate = make_issue(lat=22.30001, before_image="b.jpg", reporter_id=2)
+    db.commit()
+    duplicate_id, created_at = duplicate.id, duplicate.created_at
+
+    dedup.merge_into(db, duplicate, canonical)
+    db.commit()
+
+    assert db.get(models.Issue, duplicate_id) is None
+    assert canonical.report_count == 2
+    report = db.query(models.IssueReport).one()
+    assert (report.issue_id, report.merged_from, report.image, report.reporter_id) == (
+        canonical.id, duplicate_id, "b.jpg", 2,
+    )
+    assert report.created_at == created_at
+    assert dedup.resolve_merged(db, duplicate_id) == canonical.id
+
+
+def test_find_duplicate_matches_same_type_nearby_open_issue(db, make_issue):
+    issue = make_issue()
+    make_issue(lat=22.40)  # about 11 km away
+    db.commit()
+
+    assert dedup.find_duplicate(db, "Pothole", 22.30005, 70.80).id == issue.id
+    assert dedup.find_duplicate(db, "Garbage", 22.30005, 70.80) is None
+    assert dedup.find_duplicate(db, "Pothole", 22.30005, 70.80, before_id=issue.id) is None
+
+
+def test_find_duplicate_ignores_closed_issues(db, make_issue):
+    make_issue(status="CLOSED")
+    db.commit()
+    assert dedup.find_duplicate(db, "Pothole", 22.30, 70.80) is None
@@ -0,0 +1,43 @@
+import pytest
+
+import ai_detector
+import detection_cache
+
+GEMINI = ("Pothole", "High", 90, "gemini")
+YOLO = ("Road Obstruction", "Medium", 40, "yolo")
+
+
+@pytest.fixture
+def detector(db, monkeypatch):
+    monkeypatch.setattr(detection_cache, "_memory", type(detection_cache._memory)())
+    monkeypatch.setattr(ai_detector, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(ai_detector, "_detect_with_yolo", lambda image_bytes: YOLO)
+    return monkeypatch
+
+
+def _gemini_fails(image_bytes):
+    raise RuntimeError("503 from Gemini")
+
+
+def test_gemini_result_is_cached(detector):
+    detector.setattr(ai_detector, "_detect_with_gemini", lambda image_bytes: GEMINI)
+
+    assert ai_detector.detect_issue(b"image") == GEMINI
+    assert detection_cache.get(detection_cache.key_for_bytes(b"image")) == GEMINI
+
+
+def test_fallback_after_gemini_failure_is_not_cached(detector):
+    detector.setattr(ai_detector, "_detect_with_gemini", _gemini_fails)
+    assert ai_detector.detect_issue(b"image") == YOLO
+    assert detection_cache.get(detection_cache.key_for_bytes(b"image")) is None
+
+    # Once Gemini is back, the image gets its primary answer
+    detector.setattr(ai_detector, "_detect_with_gemini", lambda image_bytes: GEMINI)
+    assert ai_detector.detect_issue(b"image") == GEMINI
+
+
+def test_yolo_result_is_cached_when_it_is_the_only_backend(detector):
+    detector.setattr(ai_detector, "GEMINI_API_KEY", "")
+
+    assert ai_detector.detect_issue(b"image") == YOLO
+    assert detection_cache.get(detection_cache.key_for_bytes(b"image")) == YOLO
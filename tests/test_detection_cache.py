@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import pytest
+
+import detection_cache
+import models
+
+RESULT = ("Pothole", "High", 90, "deep pothole")
+
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    monkeypatch.setattr(detection_cache, "_memory", OrderedDict())
+    monkeypatch.setattr(detection_cache, "_stats", dict.fromkeys(detection_cache._stats, 0))
+    return detection_cache
+
+
+def test_sha256_key_depends_only_on_content(cache):
+    assert cache.key_for_bytes(b"abc") == cache.key_for_bytes(b"abc")
+    assert cache.key_for_bytes(b"abc") != cache.key_for_bytes(b"abd")
+    assert cache.key_for_bytes(b"abc").startswith("sha256:")
+
+
+def test_miss_then_memory_hit(cache):
+    key = cache.key_for_bytes(b"image")
+    assert cache.get(key) is None
+
+    cache.put(key, RESULT)
+    assert cache.get(key) == RESULT
+    stats = cache.stats()
+    assert (stats["misses"], stats["memory_hits"], stats["stores"]) == (1, 1, 1)
+
+
+def test_database_tier_serves_other_processes(cache, db, monkeypatch):
+    key = cache.key_for_bytes(b"image")
+    cache.put(key, RESULT)
+    # A fresh process has an empty memory tier
+    monkeypatch.setattr(cache, "_memory", OrderedDict())
+
+    assert cache.get(key) == RESULT
+    assert cache.stats()["db_hits"] == 1
+    assert db.get(models.DetectionCacheEntry, key).hits == 1
+    # ...and the entry is now in memory
+    assert cache.get(key) == RESULT
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_memory_tier_is_bounded(cache, monkeypatch):
+    monkeypatch.setattr(cache, "DETECTION_CACHE_SIZE", 2)
+    for n in range(3):
+        cache._memory_put(f"sha256:{n}", RESULT)
+
+    assert list(cache._memory) == ["sha256:1", "sha256:2"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_phash_matches_near_duplicates_in_memory(cache, monkeypatch):
+    monkeypatch.setattr(cache, "DETECTION_CACHE_PHASH_DISTANCE", 2)
+    cache._memory_put("phash:00000000000000ff", RESULT)
+
+    assert cache._memory_get("phash:00000000000000fc") == RESULT  # 2 bits apart
+    assert cache._memory_get("phash:00000000000000f0") is None    # 4 bits apart
+
+
+def test_phash_survives_reencoding(cache, bmp, monkeypatch):
+    monkeypatch.setattr(cache, "DETECTION_CACHE_MODE", "phash")
+    img = cv2.resize(cv2.imdecode(np.frombuffer(bmp(size=16), np.uint8), cv2.IMREAD_COLOR), (256, 256))
+    png = cv2.imencode(".png", img)[1].tobytes()
+    jpeg = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])[1].tobytes()
+
+    assert cache.key_for_bytes(png).startswith("phash:")
+    assert cache._hamming(cache.key_for_bytes(png), cache.key_for_bytes(jpeg)) <= cache.DETECTION_CACHE_PHASH_DISTANCE
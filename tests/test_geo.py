@@ -0,0 +1,43 @@
+import math
+
+import pytest
+
+import crud
+import geo
+import models
+
+
+def test_tile_for_clamps_to_the_tile_grid():
+    assert geo.tile_for(-89.9, 179.999) == (geo.TILES - 1, geo.TILES - 1)
+    assert geo.tile_for(89.9, -180.0) == (0, 0)
+
+
+@pytest.mark.parametrize("lat, lon", [(math.inf, 70.8), (22.3, -math.inf), (math.nan, 70.8), (22.3, math.nan)])
+def test_non_finite_points_have_no_tile(lat, lon):
+    assert geo.tile_for(lat, lon) is None
+    assert geo.tile_columns(lat, lon) == {"tile_x": None, "tile_y": None}
+
+
+def test_backfill_skips_rows_it_cannot_place(db):
+    db.add_all([
+        models.Issue(status="OPEN", latitude=22.3, longitude=70.8),
+        models.Issue(status="OPEN", latitude=22.3, longitude=math.inf),
+        models.Issue(status="OPEN", latitude=22.4, longitude=70.9),
+    ])
+    db.commit()
+
+    assert crud.backfill_tiles(db, batch_size=1) == 2
+    placed = [issue.tile_x is not None for issue in db.query(models.Issue).order_by(models.Issue.id)]
+    assert placed == [True, False, True]
+
+
+@pytest.mark.parametrize("lat, lon", [("inf", "70.8"), ("22.3", "nan"), ("-inf", "-inf")])
+def test_report_with_non_finite_coordinates_uses_the_default_point(db, client, bmp, lat, lon):
+    client.login("surveyor")
+    res = client.post("/report", data={"latitude": lat, "longitude": lon},
+                      files={"image": ("a.bmp", bmp(), "image/bmp")})
+
+    assert res.status_code == 200
+    issue = db.get(models.Issue, res.json()["issue_id"])
+    assert (issue.latitude, issue.longitude) == (22.30, 70.80)
+    assert issue.tile_x is not None
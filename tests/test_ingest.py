@@ -0,0 +1,123 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import ingest
+
+
+def _jpeg(width, height):
+    img = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    return buf.tobytes()
+
+
+def _size(data):
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return img.shape[1], img.shape[0]
+
+
+# ── read_limited ──
+
+def test_read_limited_returns_everything_under_the_cap(monkeypatch):
+    monkeypatch.setattr(ingest, "UPLOAD_CHUNK_SIZE", 4)
+    assert ingest.read_limited(io.BytesIO(b"0123456789"), max_bytes=10) == b"0123456789"
+
+
+def test_read_limited_rejects_oversized_upload(monkeypatch):
+    monkeypatch.setattr(ingest, "UPLOAD_CHUNK_SIZE", 4)
+    with pytest.raises(ingest.UploadTooLarge):
+        ingest.read_limited(io.BytesIO(b"0123456789x"), max_bytes=10)
+
+
+# ── process_image ──
+
+def test_process_image_rejects_non_images():
+    with pytest.raises(ingest.InvalidImage):
+        ingest.process_image(b"not an image")
+
+
+def test_process_image_downscales_large_uploads(monkeypatch):
+    monkeypatch.setattr(ingest, "DISPLAY_MAX_SIDE", 400)
+    monkeypatch.setattr(ingest, "INFERENCE_MAX_SIDE", 200)
+
+    result = ingest.process_image(_jpeg(800, 600))
+
+    assert result.extension == ".jpg"
+    assert _size(result.display) == (400, 300)
+    assert _size(result.inference) == (200, 150)
+
+
+def test_process_image_keeps_small_uploads_at_native_size(bmp):
+    result = ingest.process_image(bmp(size=16))
+    assert _size(result.display) == (16, 16)
+    assert _size(result.inference) == (16, 16)
+
+
+def test_inference_image_passes_undecodable_bytes_through():
+    assert ingest.inference_image(b"not an image") == b"not an image"
+
+
+# ── resizing helpers ──
+
+def test_resize_max_side_never_upscales():
+    img = np.zeros((50, 100, 3), dtype=np.uint8)
+    assert ingest.resize_max_side(cv2, img, 200) is img
+    assert ingest.resize_max_side(cv2, img, 40).shape[:2] == (20, 40)
+
+
+@pytest.mark.parametrize("width", [30, 100, 250])
+def test_resize_to_width_is_exact_and_keeps_aspect(width):
+    img = np.zeros((50, 100, 3), dtype=np.uint8)
+    out = ingest.resize_to_width(cv2, img, width)
+    assert out.shape[1] == width
+    assert out.shape[0] == round(50 * width / 100)
+
+
+# ── BodySizeLimitMiddleware ──
+
+@pytest.fixture
+def limited_client():
+    async def echo(request):
+        body = await request.body()
+        return PlainTextResponse(str(len(body)))
+
+    app = Starlette(routes=[
+        Route("/upload", echo, methods=["POST"]),
+        Route("/bulk", echo, methods=["POST"]),
+    ])
+    app.add_middleware(ingest.BodySizeLimitMiddleware, max_bytes=10, path_limits={"/bulk": 100})
+    return TestClient(app)
+
+
+def test_body_under_the_limit_passes(limited_client):
+    response = limited_client.post("/upload", content=b"x" * 10)
+    assert response.status_code == 200
+    assert response.text == "10"
+
+
+def test_declared_content_length_over_the_limit_is_rejected(limited_client):
+    response = limited_client.post("/upload", content=b"x" * 11)
+    assert response.status_code == 413
+    assert "error" in response.json()
+
+
+def test_streamed_body_over_the_limit_is_rejected(limited_client):
+    def chunks():
+        for _ in range(5):
+            yield b"x" * 4
+
+    response = limited_client.post("/upload", content=chunks())
+    assert response.status_code == 413
+
+
+def test_path_limits_override_the_default(limited_client):
+    response = limited_client.post("/bulk", content=b"x" * 50)
+    assert response.status_code == 200
+    assert response.text == "50"
@@ -0,0 +1,61 @@
+import crud
+import models
+
+
+def _stats(db):
+    return {(ward, issue_type, status): count for ward, issue_type, status, count in crud.rollup_counts(db)}
+
+
+def test_record_issue_change_moves_an_issue_between_buckets(db):
+    open_key = (1, "Pothole", "OPEN")
+    closed_key = (1, "Pothole", "CLOSED")
+
+    crud.record_issue_change(db, after=open_key)
+    crud.record_issue_change(db, after=open_key)
+    crud.record_issue_change(db, open_key, closed_key)
+    db.commit()
+    assert _stats(db) == {open_key: 1, closed_key: 1}
+
+    crud.record_issue_change(db, before=closed_key)
+    db.commit()
+    assert _stats(db) == {open_key: 1}
+
+
+def test_record_issue_change_ignores_unchanged_bucket(db):
+    key = (2, "Garbage", "OPEN")
+    crud.record_issue_change(db, key, key)
+    db.commit()
+    assert _stats(db) == {}
+
+
+def test_stat_key_fills_missing_values(make_issue):
+    issue = make_issue(ward=None, issue_type=None, status=None)
+    assert crud.stat_key(issue) == (0, crud.UNKNOWN_TYPE, "OPEN")
+
+
+def test_rebuild_repairs_drift(db, make_issue):
+    make_issue(ward=1, issue_type="Pothole", status="OPEN")
+    make_issue(ward=1, issue_type="Pothole", status="OPEN")
+    make_issue(ward=2, issue_type="Garbage", status="CLOSED")
+    # Wrong count, a bucket with no issues, and a missing bucket
+    db.add(models.IssueStat(ward=1, issue_type="Pothole", status="OPEN", count=5))
+    db.add(models.IssueStat(ward=3, issue_type="Streetlight", status="OPEN", count=1))
+    db.commit()
+
+    drift = crud.rebuild_issue_stats(db)
+
+    assert sorted(drift) == [
+        ((1, "Pothole", "OPEN"), 5, 2),
+        ((2, "Garbage", "CLOSED"), 0, 1),
+        ((3, "Streetlight", "OPEN"), 1, 0),
+    ]
+    assert _stats(db) == {(1, "Pothole", "OPEN"): 2, (2, "Garbage", "CLOSED"): 1}
+    assert crud.rebuild_issue_stats(db) == []
+
+
+def test_rebuild_dry_run_reports_without_writing(db, make_issue):
+    make_issue(ward=1, issue_type="Pothole", status="OPEN")
+    db.commit()
+
+    assert crud.rebuild_issue_stats(db, dry_run=True) == [((1, "Pothole", "OPEN"), 0, 1)]
+    assert _stats(db) == {}
@@ -0,0 +1,115 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import Message
+
+import pytest
+
+import mailer
+
+
+def _message(to="user@example.com"):
+    message = Message()
+    message["To"] = to
+    return message
+
+
+def _wait_for(queue, message_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.status(message_id)["status"] != status:
+        assert time.monotonic() < deadline, queue.status(message_id)
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def queue(db, monkeypatch):
+    monkeypatch.setattr(mailer, "SMTP_RETRY_BASE_SECONDS", 0.01)
+    queue = mailer.MailQueue()
+    queue.sent = []
+    monkeypatch.setattr(queue, "_send", lambda message: queue.sent.append(message["To"]))
+    return queue
+
+
+def test_submit_does_not_touch_the_database(queue, monkeypatch):
+    stored_from = []
+    real_store = mailer._store_status
+
+    def store(message_id, entry):
+        stored_from.append(threading.current_thread().name)
+        real_store(message_id, entry)
+
+    monkeypatch.setattr(mailer, "_store_status", store)
+    message_id = queue.submit(_message())
+    caller = threading.current_thread().name
+
+    _wait_for(queue, message_id, "SENT")
+    assert stored_from and caller not in stored_from
+
+
+def test_sent_status_is_visible_to_other_processes(queue):
+    message_id = queue.submit(_message())
+    _wait_for(queue, message_id, "SENT")
+
+    assert queue.sent == ["user@example.com"]
+    other_process = mailer.MailQueue()
+    assert other_process.status(message_id) == {"status": "SENT", "attempts": 1, "error": None}
+
+
+def test_unknown_message_id(queue):
+    assert queue.status("missing")["status"] == "UNKNOWN"
+    assert mailer.delivery_status(None) == "UNKNOWN"
+
+
+def test_transient_failures_are_retried(queue, monkeypatch):
+    failures = [OSError("connection refused")] * 2
+
+    def flaky(message):
+        if failures:
+            raise failures.pop()
+        queue.sent.append(message["To"])
+
+    monkeypatch.setattr(queue, "_send", flaky)
+    message_id = queue.submit(_message())
+    _wait_for(queue, message_id, "SENT")
+
+    assert queue.status(message_id)["attempts"] == 3
+    assert queue.sent == ["user@example.com"]
+
+
+def test_gives_up_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(mailer, "SMTP_MAX_ATTEMPTS", 3)
+    attempts = []
+    failed = threading.Event()
+    errors = []
+
+    def broken(message):
+        attempts.append(time.monotonic())
+        raise OSError("mailbox unavailable")
+
+    def on_failure(error):
+        errors.append(error)
+        failed.set()
+
+    monkeypatch.setattr(queue, "_send", broken)
+    message_id = queue.submit(_message(), on_failure=on_failure)
+
+    assert failed.wait(5)
+    assert queue.status(message_id) == {"status": "FAILED", "attempts": 3, "error": "mailbox unavailable"}
+    assert len(attempts) == 3
+    assert str(errors[0]) == "mailbox unavailable"
+    # Exponential backoff: the second gap is at least the doubled base delay
+    assert attempts[2] - attempts[1] >= 2 * mailer.SMTP_RETRY_BASE_SECONDS
+
+
+def test_prune_drops_only_old_statuses(db):
+    mailer._store_status("old", {"status": "SENT", "attempts": 1})
+    mailer._store_status("new", {"status": "SENT", "attempts": 1})
+    db.query(mailer.models.MailDelivery).filter_by(message_id="old").update({
+        "updated_at": datetime.utcnow() - timedelta(hours=mailer.MAIL_STATUS_RETENTION_HOURS + 1),
+    })
+    db.commit()
+
+    mailer._prune_statuses()
+
+    assert mailer._load_status("old") is None
+    assert mailer._load_status("new")["status"] == "SENT"
@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import telemetry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(telemetry, "_registry", [])
+    monkeypatch.setattr(telemetry, "METRICS_DIR", "")
+    return telemetry
+
+
+# ── Endpoint access ──
+
+def test_metrics_open_locally_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_TOKEN", "")
+    monkeypatch.delenv("RENDER", raising=False)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == telemetry.CONTENT_TYPE
+
+
+def test_metrics_hidden_on_render_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_TOKEN", "")
+    monkeypatch.setenv("RENDER", "true")
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_require_the_bearer_token(client, monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.text
+
+
+# ── Exposition format ──
+
+def test_render_counters_and_cumulative_histograms(registry):
+    requests = registry.Counter("requests_total", "Requests", ("route",))
+    latency = registry.Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert 'requests_total{route="/a\\"b"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 4.05" in lines
+    assert "latency_seconds_count 4" in lines
+
+
+def test_render_sums_live_workers_and_drops_dead_ones(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_DIR", str(tmp_path))
+    jobs = registry.Counter("jobs_total", "Jobs")
+    jobs.inc(2)
+    other_worker = {"jobs_total": dict(jobs.snapshot(), values=[[[], 5]])}
+    (tmp_path / f"metrics-{os.getppid()}.json").write_text(json.dumps(other_worker))
+
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    stale = tmp_path / f"metrics-{dead.pid}.json"
+    stale.write_text(json.dumps({"jobs_total": dict(jobs.snapshot(), values=[[[], 100]])}))
+
+    assert "jobs_total 7" in registry.render().splitlines()
+    assert not stale.exists()
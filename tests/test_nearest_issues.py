@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+import crud
+
+
+def test_returns_k_nearest_in_distance_order(db, make_issue):
+    far = make_issue(lat=22.35)
+    near = make_issue(lat=22.301)
+    nearer = make_issue(lat=22.3001)
+    db.commit()
+
+    items = crud.nearest_issues(db, 22.30, 70.80, k=2)
+
+    assert [item["id"] for item in items] == [nearer.id, near.id]
+    assert items[0]["distance_m"] < items[1]["distance_m"]
+    assert far.id not in [item["id"] for item in items]
+
+
+def test_respects_max_radius(db, make_issue):
+    make_issue(lat=22.35)  # about 5.5 km away
+    db.commit()
+
+    assert crud.nearest_issues(db, 22.30, 70.80, max_radius_m=1000) == []
+    assert len(crud.nearest_issues(db, 22.30, 70.80, max_radius_m=10000)) == 1
+
+
+def test_filters_by_status(db, make_issue):
+    make_issue(status="CLOSED")
+    db.commit()
+    assert crud.nearest_issues(db, 22.30, 70.80, statuses=crud.OPEN_STATUSES) == []
+
+
+@pytest.mark.parametrize("lat, lon, radius", [
+    (math.inf, 70.8, 1000),
+    (22.3, math.nan, 1000),
+    (22.3, 70.8, math.inf),
+])
+def test_rejects_non_finite_input(db, lat, lon, radius):
+    with pytest.raises(ValueError):
+        crud.nearest_issues(db, lat, lon, max_radius_m=radius)
+
+
+def test_huge_radius_stops_once_every_tile_is_covered(db, make_issue):
+    make_issue()
+    db.commit()
+    assert len(crud.nearest_issues(db, -60.0, -170.0, k=5, max_radius_m=1e30)) == 1
@@ -0,0 +1,30 @@
+import pytest
+
+import pages
+
+
+@pytest.mark.parametrize("header, etag, expected", [
+    ('"abc"', '"abc"', True),
+    ('"x", "abc"', '"abc"', True),
+    ('W/"abc"', '"abc"', True),           # weak comparison
+    ('"abc"', 'W/"abc"', True),
+    ("*", '"abc"', True),
+    ('"abcd"', '"abc"', False),
+    ('"ab", "c"', '"abc"', False),
+    ("", '"abc"', False),
+    ("abc", '"abc"', False),              # unquoted tags are not entity tags
+    ('"abc"', "abc", False),
+])
+def test_etag_matches(header, etag, expected):
+    assert pages.etag_matches(header, etag) is expected
+
+
+def test_shell_pages_revalidate_with_304(client):
+    first = client.get("/register")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get("/register", headers={"If-None-Match": f'"stale", W/{etag}'})
+    assert again.status_code == 304
+    assert again.content == b""
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+import pytest
+
+import models
+import principals
+
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    monkeypatch.setattr(principals, "_entries", OrderedDict())
+    monkeypatch.setattr(principals, "_stats", dict.fromkeys(principals._stats, 0))
+    return principals
+
+
+@pytest.fixture
+def user(db):
+    user = models.User(name="Asha", email="asha@example.com", password_hash="x", role="engineer", ward=1)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def test_second_load_is_served_from_cache(cache, user):
+    assert cache.load(user.id).role == "engineer"
+    assert cache.load(user.id) == principals.Principal(user.id, "Asha", "asha@example.com", "engineer", 1)
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_the_ttl(cache, user, monkeypatch):
+    monkeypatch.setattr(principals, "PRINCIPAL_CACHE_TTL_SECONDS", 0)
+    cache.load(user.id)
+    cache.load(user.id)
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["hits"] == 0
+
+
+def test_committed_role_change_invalidates(cache, db, user):
+    cache.load(user.id)
+    user.role = "citizen"
+    db.commit()
+
+    assert cache.stats()["invalidations"] == 1
+    assert cache.load(user.id).role == "citizen"
+
+
+def test_untracked_column_change_keeps_the_entry(cache, db, user):
+    cache.load(user.id)
+    user.password_hash = "y"
+    db.commit()
+    assert cache.stats()["invalidations"] == 0
+
+
+def test_rolled_back_change_keeps_the_entry(cache, db, user):
+    cache.load(user.id)
+    user.ward = 2
+    db.flush()
+    db.rollback()
+    # The discarded change must not invalidate on a later, unrelated commit either.
+    db.add(models.User(name="B", email="b@example.com", password_hash="x", role="citizen"))
+    db.commit()
+
+    assert cache.stats()["invalidations"] == 0
+    assert cache.load(user.id).ward == 1
+
+
+def test_deleted_user_is_invalidated(cache, db, user):
+    cache.load(user.id)
+    user_id = user.id
+    db.delete(user)
+    db.commit()
+
+    assert cache.load(user_id) is None
+
+
+def test_least_recently_used_entries_are_evicted(cache, monkeypatch):
+    monkeypatch.setattr(principals, "PRINCIPAL_CACHE_SIZE", 2)
+    for user_id in (1, 2, 3):
+        cache.remember(principals.Principal(user_id, None, f"{user_id}@example.com", "citizen", None))
+    assert list(principals._entries) == [2, 3]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_session_of_a_deleted_user_is_logged_out(client, db):
+    user = client.login("engineer")
+    assert client.get("/api/v1/stats").status_code == 200
+
+    db.delete(user)
+    db.commit()
+
+    assert client.get("/api/v1/stats").status_code == 401
@@ -0,0 +1,116 @@
+import io
+import json
+import random
+import struct
+
+import pytest
+
+import blobstore
+import crud
+import models
+import report_sync
+
+
+def _bmp(seed, size=8):
+    pixels = random.Random(seed).randbytes(((size * 3 + 3) & ~3) * size)
+    header = b"BM" + struct.pack("<IHHI", 54 + len(pixels), 0, 0, 54)
+    info = struct.pack("<IiiHHIIiiII", 40, size, size, 1, 24, 0, len(pixels), 2835, 2835, 0, 0)
+    return header + info + pixels
+
+
+IMAGES = {"img-0": _bmp(0), "img-1": _bmp(1)}
+ITEMS = [
+    {"client_key": "a", "latitude": 22.30, "longitude": 70.80, "image": "img-0"},
+    {"client_key": "b", "latitude": 22.31, "longitude": 70.81, "image": "img-1"},
+]
+
+
+def _open_image(name):
+    data = IMAGES.get(name)
+    return io.BytesIO(data) if data is not None else None
+
+
+def _sync(db, items, reporter_id=7):
+    results, _ = report_sync.sync_reports(db, reporter_id, items, _open_image)
+    db.commit()
+    return results
+
+
+def test_resending_a_batch_creates_nothing_new(db):
+    first = _sync(db, ITEMS)
+    assert [r["status"] for r in first] == ["created", "created"]
+
+    second = _sync(db, ITEMS)
+
+    assert [r["status"] for r in second] == ["already_synced", "already_synced"]
+    assert [r["issue_id"] for r in second] == [r["issue_id"] for r in first]
+    assert db.query(models.Issue).count() == 2
+    assert db.query(models.ClassificationJob).count() == 2
+    assert sum(count for *_, count in crud.rollup_counts(db)) == 2
+
+
+def test_partial_resend_creates_only_the_new_reports(db):
+    _sync(db, ITEMS[:1])
+
+    results = _sync(db, ITEMS)
+
+    assert [r["status"] for r in results] == ["already_synced", "created"]
+    assert db.query(models.Issue).count() == 2
+
+
+def test_client_keys_are_scoped_to_the_reporter(db):
+    _sync(db, ITEMS, reporter_id=1)
+    results = _sync(db, ITEMS, reporter_id=2)
+    assert [r["status"] for r in results] == ["created", "created"]
+
+
+def test_missing_image_is_an_item_error_and_can_be_retried(db):
+    items = ITEMS + [{"client_key": "c", "image": "img-missing"}]
+
+    results = _sync(db, items)
+    assert results[2]["status"] == "error"
+
+    IMAGES["img-missing"] = _bmp(2)
+    try:
+        assert _sync(db, items)[2]["status"] == "created"
+    finally:
+        del IMAGES["img-missing"]
+
+
+def test_manifest_rejects_duplicate_client_keys():
+    with pytest.raises(report_sync.BatchError):
+        report_sync.parse_manifest('[{"client_key": "a", "image": "x"}, {"client_key": "a", "image": "y"}]')
+
+
+@pytest.mark.parametrize("lat, lon", [(float("inf"), 70.8), ("nan", 70.8), (22.3, "-inf")])
+def test_non_finite_coordinates_fail_only_their_item(db, lat, lon):
+    items = [{"client_key": "bad", "latitude": lat, "longitude": lon, "image": "img-0"}, ITEMS[1]]
+
+    results = _sync(db, items)
+
+    assert results[0]["status"] == "error" and "finite" in results[0]["error"]
+    assert results[1]["status"] == "created"
+    assert db.query(models.Issue).count() == 1
+
+
+def test_rolled_back_batch_leaves_no_files(db):
+    results, blobs = report_sync.sync_reports(db, 7, ITEMS, _open_image)
+    db.rollback()
+
+    assert len(blobs) == 2
+    assert not any(blobstore.blob_path(key).exists() for key in blobs)
+    assert db.query(models.Blob).count() == 0
+
+
+def test_batch_endpoint_writes_files_after_commit(db, client):
+    client.login("surveyor")
+    manifest = ITEMS + [{"client_key": "c", "latitude": "Infinity", "image": "img-0"}]
+    res = client.post("/report/batch", data={"manifest": json.dumps(manifest)}, files=[
+        ("img-0", ("0.bmp", IMAGES["img-0"], "image/bmp")),
+        ("img-1", ("1.bmp", IMAGES["img-1"], "image/bmp")),
+    ])
+
+    assert res.status_code == 200
+    assert (res.json()["created"], res.json()["failed"]) == (2, 1)
+    for issue in db.query(models.Issue):
+        assert blobstore.blob_path(issue.before_image).exists()
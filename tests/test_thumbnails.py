@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import blobstore
+import thumbnails
+
+
+def _store(width, height):
+    img = np.random.default_rng(1).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    data = buf.tobytes()
+    key = blobstore.key_for(data, ".jpg")
+    blobstore.write(key, data)
+    return key
+
+
+def _size(path):
+    img = cv2.imdecode(np.frombuffer(path.read_bytes(), dtype=np.uint8), cv2.IMREAD_COLOR)
+    return img.shape[1], img.shape[0]
+
+
+@pytest.mark.parametrize("fmt", thumbnails.THUMBNAIL_FORMATS)
+def test_derivative_is_exactly_the_requested_width(db, fmt):
+    key = _store(800, 600)
+
+    path = asyncio.run(thumbnails.get_path(key, 320, fmt))
+
+    assert path == blobstore.derivative_path(key, 320, fmt)
+    assert path.name.endswith(f"_w320.{fmt}")
+    assert _size(path) == (320, 240)
+
+
+def test_small_sources_are_upscaled_to_the_width(db):
+    key = _store(100, 50)
+    path = asyncio.run(thumbnails.get_path(key, 160, "jpg"))
+    assert _size(path) == (160, 80)
+
+
+def test_cached_derivative_is_not_regenerated(db, monkeypatch):
+    key = _store(400, 400)
+    asyncio.run(thumbnails.get_path(key, 160, "jpg"))
+
+    def fail(*args):
+        raise AssertionError("regenerated a cached derivative")
+
+    monkeypatch.setattr(thumbnails, "submit", fail)
+    assert asyncio.run(thumbnails.get_path(key, 160, "jpg")).exists()
+
+
+def test_missing_blob_is_unavailable(db):
+    key = blobstore.key_for(b"never stored", ".jpg")
+    with pytest.raises(thumbnails.DerivativeUnavailable):
+        asyncio.run(thumbnails.get_path(key, 160, "jpg"))
+
+
+def test_concurrent_requests_share_one_generation(db, monkeypatch):
+    key = _store(400, 300)
+    release = threading.Event()
+    calls = []
+    original = thumbnails._generate
+
+    def slow_generate(*args):
+        calls.append(args)
+        release.wait(5)
+        return original(*args)
+
+    monkeypatch.setattr(thumbnails, "_generate", slow_generate)
+
+    first = thumbnails.submit(key, 640, "jpg")
+    second = thumbnails.submit(key, 640, "jpg")
+    release.set()
+
+    assert first is second
+    assert first.result(5) == blobstore.derivative_path(key, 640, "jpg")
+    assert len(calls) == 1
@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+
+import wards
+
+
+def _square(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+def _feature(ward, geometry_type, coordinates):
+    return {
+        "type": "Feature",
+        "properties": {"ward": ward},
+        "geometry": {"type": geometry_type, "coordinates": coordinates},
+    }
+
+
+# Ward 1 is a square with a hole; ward 2 is two separate squares east of it.
+COLLECTION = {
+    "type": "FeatureCollection",
+    "features": [
+        _feature(1, "Polygon", [_square(70.0, 22.0, 70.1, 22.1), _square(70.04, 22.04, 70.06, 22.06)]),
+        _feature(2, "MultiPolygon", [[_square(70.1, 22.0, 70.2, 22.1)], [_square(70.3, 22.0, 70.4, 22.1)]]),
+    ],
+}
+
+
+def _write(path, collection, mtime):
+    path.write_text(json.dumps(collection), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(wards, "WARD_RELOAD_CHECK_SECONDS", 0)
+    path = tmp_path / "wards.geojson"
+    _write(path, COLLECTION, 1_000_000)
+    return path
+
+
+@pytest.mark.parametrize("lat, lon, ward", [
+    (22.01, 70.01, 1),
+    (22.05, 70.05, None),   # inside ward 1's hole
+    (22.05, 70.15, 2),
+    (22.05, 70.35, 2),      # second part of the MultiPolygon
+    (22.05, 70.25, None),   # between the parts
+    (23.00, 70.05, None),   # outside the bounding box
+])
+def test_index_lookup(boundaries, lat, lon, ward):
+    assert wards.load_geojson(boundaries).lookup(lat, lon) == ward
+
+
+def test_lookup_many_matches_lookup(boundaries):
+    index = wards.load_geojson(boundaries)
+    points = [(22.01, 70.01), (22.05, 70.15), (22.05, 70.25)]
+    assert index.lookup_many(points) == [1, 2, None]
+
+
+def test_lookup_reloads_when_the_file_changes(boundaries):
+    lookup = wards.WardLookup(boundaries)
+    assert lookup.index().lookup(22.01, 70.01) == 1
+
+    renumbered = json.loads(json.dumps(COLLECTION))
+    renumbered["features"][0]["properties"]["ward"] = 7
+    _write(boundaries, renumbered, 1_000_001)
+
+    assert lookup.index().lookup(22.01, 70.01) == 7
+
+
+def test_malformed_reload_keeps_the_previous_index(boundaries):
+    lookup = wards.WardLookup(boundaries)
+    previous = lookup.index()
+
+    boundaries.write_text("{not json", encoding="utf-8")
+    os.utime(boundaries, (1_000_001, 1_000_001))
+
+    assert lookup.index() is previous
+
+
+def test_detect_ward_uses_boundaries_or_latitude_bands(boundaries, monkeypatch):
+    monkeypatch.setattr(wards, "_lookup", None)
+    assert wards.detect_ward(22.30, 70.80) == 1
+    assert wards.assign_wards([(22.32, 70.80), (22.40, 70.80)]) == [2, 3]
+
+    monkeypatch.setattr(wards, "_lookup", wards.WardLookup(boundaries))
+    monkeypatch.setattr(wards, "WARD_UNASSIGNED", 0)
+    assert wards.detect_ward(22.05, 70.15) == 2
+    assert wards.assign_wards([(22.01, 70.01), (22.05, 70.05)]) == [1, 0]
+
+
+def test_missing_file_falls_back_to_latitude_bands(tmp_path, monkeypatch):
+    monkeypatch.setattr(wards, "_lookup", wards.WardLookup(tmp_path / "missing.geojson"))
+    assert wards.detect_ward(22.30, 70.80) == 1
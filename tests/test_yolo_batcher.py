@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+import ai_detector
+from ai_detector import YoloBatcher
+
+
+def test_labels_times_out_when_the_batch_hangs():
+    release = threading.Event()
+    calls = []
+
+    def hung_model(images):
+        calls.append(list(images))
+        release.wait(5)
+        return [["car"] for _ in images]
+
+    batcher = YoloBatcher(hung_model, window_ms=0)
+    first = batcher.submit("a")
+    with pytest.raises(ai_detector.DetectorUnavailable):
+        batcher.labels("b", timeout=0.1)
+
+    release.set()
+    assert first.result(timeout=5) == ["car"]
+    # The abandoned request was cancelled before it reached the model
+    assert batcher.labels("c", timeout=5) == ["car"]
+    assert "b" not in [image for batch in calls for image in batch]
+
+
+def test_yolo_labels_raises_detector_unavailable_on_timeout(monkeypatch):
+    never = threading.Event()
+    batcher = YoloBatcher(lambda images: never.wait() or [], window_ms=0)
+    monkeypatch.setattr(ai_detector, "_yolo_batcher", batcher)
+    monkeypatch.setattr(ai_detector, "DETECTOR_BACKEND", "stub")
+    monkeypatch.setattr(ai_detector, "INFERENCE_SOCKET", "")
+    monkeypatch.setattr(ai_detector, "YOLO_RESULT_TIMEOUT", 0.1)
+
+    with pytest.raises(ai_detector.DetectorUnavailable):
+        ai_detector.yolo_labels(b"image")
+
+
+def _recording_model(batches, gate=None):
+    def run(images):
+        if gate is not None:
+            gate.wait(5)
+        batches.append(list(images))
+        return [[f"label-{image}"] for image in images]
+
+    return run
+
+
+def test_concurrent_requests_share_one_batch():
+    batches = []
+    batcher = YoloBatcher(_recording_model(batches), window_ms=200, max_batch=16)
+
+    futures = [batcher.submit(n) for n in range(5)]
+
+    assert [f.result(timeout=5) for f in futures] == [[f"label-{n}"] for n in range(5)]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+def test_batch_is_cut_at_max_batch():
+    batches = []
+    batcher = YoloBatcher(_recording_model(batches), window_ms=200, max_batch=2)
+
+    futures = [batcher.submit(n) for n in range(5)]
+
+    assert [f.result(timeout=5) for f in futures] == [[f"label-{n}"] for n in range(5)]
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_model_error_fails_every_request_in_the_batch_and_the_batcher_keeps_going():
+    calls = []
+
+    def flaky(images):
+        calls.append(images)
+        if len(calls) == 1:
+            raise RuntimeError("CUDA out of memory")
+        return [["ok"] for _ in images]
+
+    batcher = YoloBatcher(flaky, window_ms=100)
+    futures = [batcher.submit(n) for n in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+    assert batcher.labels("next", timeout=5) == ["ok"]
+
+
+def test_stub_backend_returns_configured_labels(monkeypatch):
+    monkeypatch.setattr(ai_detector, "DETECTOR_STUB_LABELS", ["person", "car"])
+    assert ai_detector._run_stub_batch(["a", "b"]) == [["person", "car"], ["person", "car"]]
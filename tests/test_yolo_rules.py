@@ -0,0 +1,112 @@
+import json
+import random
+from collections import Counter
+
+import pytest
+
+import yolo_rules
+
+
+def _rules(*specs):
+    return yolo_rules.RuleSet([yolo_rules.Rule(spec) for spec in specs])
+
+
+def _rule(name, **fields):
+    return {"name": name, "issue_type": name, "priority": "Low", "confidence": 50, **fields}
+
+
+def _reference_match(rules, labels):
+    """The rule semantics spelled out: the first rule whose conditions all hold."""
+    counts = Counter(labels)
+    for rule in rules.rules:
+        if rule.any and not any(counts[l] >= n for l, n in rule.any.items()):
+            continue
+        if not all(counts[l] >= n for l, n in rule.all.items()):
+            continue
+        if len(labels) >= rule.min_total:
+            return rule
+    return None
+
+
+def test_first_matching_rule_wins():
+    rules = _rules(_rule("trucks", any={"truck": 2}), _rule("vehicles", any={"truck": 1, "car": 1}))
+    assert rules.classify(["truck", "truck"])[0] == "trucks"
+    assert rules.classify(["truck", "car"])[0] == "vehicles"
+
+
+def test_all_any_and_min_total_combine():
+    rules = _rules(_rule("combo", any={"bus": 1, "truck": 1}, all={"person": 2}, min_total=4))
+    assert rules.classify(["bus", "person", "person", "dog"])[0] == "combo"
+    assert rules.classify(["bus", "person", "person"])[0] == "General Civic Issue"   # min_total
+    assert rules.classify(["person", "person", "dog", "dog"])[0] == "General Civic Issue"  # no "any" label
+    assert rules.classify(["bus", "person", "dog", "dog"])[0] == "General Civic Issue"  # "all" unmet
+
+
+def test_unconditional_rule_is_a_fallback():
+    rules = _rules(_rule("dogs", any={"dog": 1}), _rule("busy", min_total=3), _rule("anything"))
+    assert rules.classify(["dog"])[0] == "dogs"
+    assert rules.classify(["cat", "cat", "cat"])[0] == "busy"
+    assert rules.classify([])[0] == "anything"
+
+
+def test_compiled_index_agrees_with_the_reference_semantics():
+    labels = ["car", "truck", "bus", "person", "dog", "cow"]
+    rng = random.Random(19)
+    specs = []
+    for i in range(12):
+        spec = _rule(f"r{i}")
+        for kind in ("any", "all"):
+            if rng.random() < 0.6:
+                spec[kind] = {l: rng.randint(1, 3) for l in rng.sample(labels, rng.randint(1, 3))}
+        if rng.random() < 0.3:
+            spec["min_total"] = rng.randint(1, 6)
+        specs.append(spec)
+    rules = _rules(*specs)
+
+    for _ in range(2000):
+        detected = [rng.choice(labels) for _ in range(rng.randint(0, 8))]
+        assert rules.match(detected)[0] is _reference_match(rules, detected), detected
+
+
+def test_reasoning_template_fields():
+    rules = _rules(_rule("cars", any={"car": 2},
+                         reasoning="{counts[car]} cars of {total} ({labels}); mostly {top_label}"))
+    assert rules.classify(["car", "car", "dog"])[3] == "2 cars of 3 (car, car, dog); mostly car"
+
+
+@pytest.mark.parametrize("spec, message", [
+    (_rule("bad", priority="Urgent"), "priority"),
+    (_rule("bad", confidence=101), "confidence"),
+    (_rule("bad", any={"car": 0}), "positive integer"),
+    (_rule("bad", reasoning="{owner}"), "unknown reasoning field"),
+    ({"name": "bad", "priority": "Low", "confidence": 5}, "missing issue_type"),
+])
+def test_invalid_rules_are_rejected(spec, message):
+    with pytest.raises(ValueError, match=message):
+        yolo_rules.Rule(spec)
+
+
+def test_load_reports_bad_files(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": []}), encoding="utf-8")
+    with pytest.raises(ValueError, match="empty"):
+        yolo_rules.load(path)
+
+    path.write_text("{", encoding="utf-8")
+    with pytest.raises(ValueError, match=str(path)):
+        yolo_rules.load(path)
+
+
+def test_shipped_rule_table_compiles():
+    rules = yolo_rules.load(yolo_rules.YOLO_RULES_FILE)
+    assert rules.classify(["cow"])[:2] == ("Stray Animal/Cattle", "Critical")
+    assert rules.classify(["car"] * 5)[3] == "Detected clustered vehicles (5) in dense sector."
+
+
+def test_evaluate_scores_predictions():
+    rules = _rules(_rule("Dog", any={"dog": 1}))
+    report = yolo_rules.evaluate(rules, [("Dog", ["dog"]), ("Dog", ["cat"])], min_seconds=0)
+
+    assert report["accuracy"] == 0.5
+    assert report["per_class"]["Dog"] == {"support": 2, "precision": 1.0, "recall": 0.5}
+    assert report["confusions"] == [{"expected": "Dog", "predicted": "General Civic Issue", "count": 1}]